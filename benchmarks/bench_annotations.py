@@ -0,0 +1,114 @@
+"""
+Fetching the annotations on screen (a window of characters) from a chapter with
+100,000 annotations, with and without the (article, highlight_start, highlight_end)
+index.
+
+Run with:
+    python manage.py test benchmarks.bench_annotations
+"""
+import random
+import time
+
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Annotation
+
+from .utils import create_book, create_user
+
+ANNOTATIONS = 100_000
+CHAPTER_LENGTH = 1_000_000
+WINDOW = 3000
+REPEAT = 20
+
+
+class AnnotationViewportBenchmark(TransactionTestCase):
+    # Not a TestCase, since indexes can't be dropped inside its transaction on SQLite.
+    def setUp(self):
+        self.user = create_user()
+        book = create_book(self.user, "Book", [1])
+        self.chapter = book.get_first_child()
+        other = create_book(self.user, "Other", [1]).get_first_child()
+        rng = random.Random(0)
+        annotations = []
+        for chapter, count in ((self.chapter, ANNOTATIONS), (other, ANNOTATIONS // 10)):
+            for _ in range(count):
+                start = rng.randrange(CHAPTER_LENGTH)
+                annotations.append(
+                    Annotation(
+                        user=self.user,
+                        article=chapter,
+                        book_id=chapter.book_id,
+                        highlight_start=start,
+                        highlight_end=start + rng.randint(1, 500),
+                        is_public=True,
+                    )
+                )
+        Annotation.objects.bulk_create(annotations, batch_size=5000)
+        self.windows = [
+            (start, start + WINDOW)
+            for start in (rng.randrange(CHAPTER_LENGTH) for _ in range(REPEAT))
+        ]
+
+    def query_windows(self):
+        rows = 0
+        start = time.perf_counter()
+        for low, high in self.windows:
+            rows += len(
+                Annotation.objects.filter(
+                    article=self.chapter,
+                    highlight_start__lt=high,
+                    highlight_end__gt=low,
+                ).values_list("pk", flat=True)
+            )
+        return rows, (time.perf_counter() - start) / REPEAT
+
+    def explain(self):
+        low, high = self.windows[0]
+        return Annotation.objects.filter(
+            article=self.chapter, highlight_start__lt=high, highlight_end__gt=low
+        ).explain()
+
+    def test_viewport_with_and_without_index(self):
+        print(f"\n{ANNOTATIONS} annotations, {WINDOW} character windows")
+        rows, with_index = self.query_windows()
+        print(f"with index: {with_index * 1000:.2f} ms/window, {rows} rows")
+        print(f"  {self.explain()}")
+
+        index = next(
+            index
+            for index in Annotation._meta.indexes
+            if index.name == "annotation_article_range_idx"
+        )
+        with connection.schema_editor() as editor:
+            editor.remove_index(Annotation, index)
+        try:
+            rows_without, without_index = self.query_windows()
+            print(f"without index: {without_index * 1000:.2f} ms/window")
+            print(f"  {self.explain()}")
+        finally:
+            with connection.schema_editor() as editor:
+                editor.add_index(Annotation, index)
+        self.assertEqual(rows, rows_without)
+        self.assertLess(with_index, without_index)
+
+    def test_viewport_request(self):
+        client = APIClient()
+        token = Token.objects.create(user=self.user)
+        client.credentials(HTTP_AUTHORIZATION="Token " + token.key)
+        url = f"/api/articles/{self.chapter.slug_full}/annotations/"
+        low, high = self.windows[0]
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.get(url, {"start": low, "end": high})
+            elapsed = time.perf_counter() - start
+        print(
+            f"\nGET {WINDOW} character window: {len(response.data)} annotations, "
+            f"{len(response.content)} bytes, {len(queries)} queries, "
+            f"{elapsed * 1000:.1f} ms"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(len(response.data), ANNOTATIONS // 100)
@@ -0,0 +1,127 @@
+"""
+Many people replying at once to the same comment, from parallel threads. Comments
+are added with Comment.add_child, which makes a path step from the time and random
+digits without reading the siblings, compared with picking the next sibling path
+the way treebeard's add_child does (read the last sibling, add one), without the
+lock that would serialize the repliers.
+
+Run with:
+    python manage.py test benchmarks.bench_comments
+
+On SQLite writes are serialized by the database anyway, so the numbers only mean
+something on PostgreSQL; the collisions show up everywhere.
+"""
+import threading
+import time
+
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import TransactionTestCase
+
+from core.models import Annotation, Comment
+
+from .utils import create_book, create_user
+
+REPLIERS = 16
+REPLIES = 25
+# Attempts at a write the database refused because another thread held the lock.
+LOCKED_ATTEMPTS = 100
+
+
+class CommentReplyBenchmark(TransactionTestCase):
+    # Not a TestCase, since the threads need to see each other's commits.
+    def setUp(self):
+        self.user = create_user()
+        chapter = create_book(self.user, "Book", [1]).get_first_child()
+        self.annotation = Annotation.objects.create(
+            user=self.user,
+            article=chapter,
+            highlight_start=0,
+            highlight_end=10,
+            is_public=True,
+        )
+        self.thread = Comment.add_root(
+            user=self.user,
+            article=chapter,
+            annotation=self.annotation,
+            comment_html="<p>Thread</p>",
+        )
+
+    def add_child(self, parent, i):
+        parent.add_child(
+            user=self.user,
+            article=parent.article,
+            annotation=parent.annotation,
+            comment_html=f"<p>Reply {i}</p>",
+        )
+
+    def add_next_sibling_path(self, parent, i):
+        with transaction.atomic():
+            last = (
+                Comment.objects.filter(parent=parent)
+                .order_by("-path")
+                .values_list("path", flat=True)
+                .first()
+            )
+            step = int(last[-4:]) + 1 if last else 1
+            # bulk_create, since Comment.save() would make a path step of its own.
+            comment = Comment(
+                user=self.user,
+                article=parent.article,
+                annotation=parent.annotation,
+                book_id=parent.book_id,
+                parent=parent,
+                thread_id=parent.thread_id,
+                path=f"{parent.path}{step:04d}",
+                depth=parent.depth + 1,
+                comment_html=f"<p>Reply {i}</p>",
+            )
+            Comment.objects.bulk_create([comment])
+
+    def reply_in_parallel(self, reply):
+        collisions = []
+        barrier = threading.Barrier(REPLIERS)
+
+        def replier(n):
+            barrier.wait()
+            try:
+                for i in range(REPLIES):
+                    for _ in range(LOCKED_ATTEMPTS):
+                        try:
+                            reply(self.thread, n * REPLIES + i)
+                            break
+                        except OperationalError:
+                            time.sleep(0.001)
+                        except IntegrityError:
+                            collisions.append(i)
+                            break
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=replier, args=(n,)) for n in range(REPLIERS)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start, len(collisions)
+
+    def test_parallel_replies(self):
+        total = REPLIERS * REPLIES
+        print(f"\n{REPLIERS} threads replying {REPLIES} times each to one comment")
+
+        elapsed, collisions = self.reply_in_parallel(self.add_next_sibling_path)
+        print(
+            f"next sibling path: {total / elapsed:.0f} replies/s, "
+            f"{collisions} replies lost to path collisions"
+        )
+        Comment.objects.filter(parent=self.thread).delete()
+
+        elapsed, collisions = self.reply_in_parallel(self.add_child)
+        print(
+            f"time-sorted path steps: {total / elapsed:.0f} replies/s, "
+            f"{collisions} replies lost to path collisions"
+        )
+        self.assertEqual(collisions, 0)
+        replies = Comment.objects.filter(parent=self.thread).order_by("path")
+        self.assertEqual(replies.count(), total)
+        self.assertTrue(all(reply.thread_id == self.thread.pk for reply in replies))
@@ -0,0 +1,63 @@
+"""
+Importing the books in raw_books/ with BookImporter, compared with what
+raw_books/load_book.py did (json.load and Article.load_bulk, i.e. one save per node).
+
+Run with:
+    python manage.py test benchmarks.bench_import
+"""
+import json
+import os
+import time
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.ingest import BookImporter, read_records
+from core.models import Article
+
+from .utils import create_user
+
+RAW_BOOKS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "raw_books"
+)
+BOOKS = ["ydkjs_1.txt", "ydkjs_2.txt", "zarathustra_mp.txt"]
+
+
+def with_user(nodes, user):
+    for node in nodes:
+        node["data"]["user"] = user
+        with_user(node.get("children", []), user)
+    return nodes
+
+
+class BookImportBenchmark(TestCase):
+    def setUp(self):
+        self.user = create_user()
+
+    def test_import_books(self):
+        for name in BOOKS:
+            path = os.path.join(RAW_BOOKS_DIR, name)
+
+            start = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                with open(path) as dump_file:
+                    importer = BookImporter(user=self.user)
+                    importer.import_book(read_records(dump_file))
+            elapsed = time.perf_counter() - start
+            nodes = importer.count
+
+            start = time.perf_counter()
+            with CaptureQueriesContext(connection) as old_queries:
+                with open(path) as dump_file:
+                    Article.load_bulk(with_user(json.load(dump_file), self.user.pk))
+            old_elapsed = time.perf_counter() - start
+
+            print(
+                f"\n{name} ({nodes} nodes):"
+                f"\n  import_book: {len(queries)} queries, {elapsed * 1000:.0f} ms, "
+                f"{nodes / elapsed:.0f} nodes/s"
+                f"\n  load_bulk:   {len(old_queries)} queries, "
+                f"{old_elapsed * 1000:.0f} ms, {nodes / old_elapsed:.0f} nodes/s"
+            )
+            self.assertLess(len(queries), len(old_queries))
@@ -0,0 +1,73 @@
+"""
+Inserting chapters at the head of a 1,000-chapter book, with Article.create_sibling
+compared with treebeard's add_sibling (which shifts every later chapter).
+
+Run with:
+    python manage.py test benchmarks.bench_siblings
+"""
+import time
+
+from django.db import connection
+from django.test import TestCase
+
+from core.models import Article
+
+from .utils import create_book, create_user
+
+CHAPTERS = 1000
+INSERTS = 50
+
+
+def count_queries(counter):
+    # CaptureQueriesContext stops counting once its 9,000 query log is full.
+    def wrapper(execute, sql, params, many, context):
+        counter[0] += 1
+        return execute(sql, params, many, context)
+
+    return connection.execute_wrapper(wrapper)
+
+
+class SiblingInsertBenchmark(TestCase):
+    def insert_at_head(self, book, insert):
+        per_insert = []
+        start = time.perf_counter()
+        for i in range(INSERTS):
+            first = book.get_first_child()
+            queries = [0]
+            with count_queries(queries):
+                insert(first, f"Head {i}")
+            per_insert.append(queries[0])
+        elapsed = time.perf_counter() - start
+        book.refresh_from_db()
+        self.assertEqual(book.get_children_count(), CHAPTERS + INSERTS)
+        return per_insert, elapsed
+
+    def report(self, name, per_insert, elapsed):
+        print(
+            f"\n{name}: {sum(per_insert)} queries for {INSERTS} inserts "
+            f"(median {sorted(per_insert)[INSERTS // 2]}, max {max(per_insert)}), "
+            f"{elapsed / INSERTS * 1000:.1f} ms per insert"
+        )
+
+    def test_insert_at_head_of_large_book(self):
+        user = create_user()
+        data = {"user": user, "article_html": "<p></p>"}
+
+        book = create_book(user, "Gaps", [CHAPTERS])
+        gaps, gaps_elapsed = self.insert_at_head(
+            book,
+            lambda first, title: Article.create_sibling(
+                first.slug_full, "before", title=title, **data
+            ),
+        )
+        self.report("create_sibling", gaps, gaps_elapsed)
+
+        book = create_book(user, "Shifts", [CHAPTERS])
+        shifts, shifts_elapsed = self.insert_at_head(
+            book,
+            lambda first, title: first.add_sibling("left", title=title, **data),
+        )
+        self.report("add_sibling", shifts, shifts_elapsed)
+
+        self.assertLess(sorted(gaps)[INSERTS // 2], sorted(shifts)[INSERTS // 2])
+        self.assertEqual(Article.find_problems(), ([], [], [], [], []))
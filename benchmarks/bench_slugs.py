@@ -0,0 +1,43 @@
+"""
+Renaming a section rewrites the slugs of all its descendants.
+
+Run with:
+    python manage.py test benchmarks.bench_slugs
+"""
+import time
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Article
+
+from .utils import create_book, create_user
+
+
+class SlugRewriteBenchmark(TestCase):
+    def rename(self, part):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            part.title = "Renamed Part"
+            part.save()
+            elapsed = time.perf_counter() - start
+        return len(queries), elapsed
+
+    def test_rename_of_node_with_many_descendants(self):
+        user = create_user()
+        results = {}
+        for descendants, fanout in ((10, [1, 2, 4]), (1000, [1, 50, 19])):
+            book = create_book(user, f"Book {descendants}", fanout)
+            part = book.get_first_child()
+            queries, elapsed = self.rename(part)
+            results[descendants] = queries
+            print(
+                f"\nrename with {descendants} descendants: "
+                f"{queries} queries, {elapsed * 1000:.1f} ms"
+            )
+            renamed = Article.objects.filter(
+                slug_full__startswith=f"{book.slug_full}/renamed-part/"
+            )
+            self.assertEqual(renamed.count(), descendants)
+        self.assertEqual(results[10], results[1000])
@@ -0,0 +1,48 @@
+from django.contrib.auth import get_user_model
+
+from core.models import Article
+
+
+def create_user(username="benchmark"):
+    return get_user_model().objects.create_user(
+        username=username, email=f"{username}@email.com", password="benchmark"
+    )
+
+
+def create_book(user, title, fanout):
+    """
+    Create a book directly with bulk_create, bypassing Article.save.
+    `fanout` is the number of children per node at each level, e.g. [2, 3] gives a
+    root with 2 children that have 3 children each. Returns the root.
+    """
+    root = Article.add_root(user=user, title=title, article_html="<p></p>")
+    nodes = []
+    level = [root]
+    for depth, children_per_node in enumerate(fanout, start=2):
+        next_level = []
+        for parent in level:
+            parent.numchild = children_per_node
+            for i in range(1, children_per_node + 1):
+                slug_section = f"section-{i}"
+                next_level.append(
+                    Article(
+                        user=user,
+                        title=f"Section {i}",
+                        article_html=f"<p>Section {i}</p>",
+                        path=Article._get_path(parent.path, depth, i),
+                        depth=depth,
+                        slug_section=slug_section,
+                        slug_full=f"{parent.slug_full}/{slug_section}",
+                    )
+                )
+        nodes.extend(next_level)
+        level = next_level
+    Article.objects.bulk_create(nodes, batch_size=500)
+    Article.objects.bulk_update(
+        [node for node in nodes if node.numchild], ["numchild"], batch_size=500
+    )
+    Article.objects.filter(pk=root.pk).update(numchild=fanout[0] if fanout else 0)
+    Article.objects.filter(path__startswith=root.path).update(book=root)
+    Article.rebuild_navigation(root.path)
+    root.refresh_from_db()
+    return root
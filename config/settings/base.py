@@ -140,6 +140,51 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+# How long a serialized table of contents is kept. Entries are invalidated through
+# per-book versions (see core/cache.py), so this only bounds memory use.
+TOC_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Most sections a book created in one request (articles/add-book/) can have.
+BOOK_CREATE_MAX_SECTIONS = 5000
+# And how many levels deep. treebeard's paths have room for 63.
+BOOK_CREATE_MAX_DEPTH = 20
+
+# Deleted books are hidden at once and purged in batches of this many rows, in a
+# thread after the request (see core/deletion.py). Without the thread, run the
+# purge_book_deletions command, e.g. from cron.
+BOOK_PURGE_BATCH_SIZE = 1000
+BOOK_PURGE_IN_BACKGROUND = True
+
+# Comment threads are sent a few replies at a time (see core/threads.py): at most
+# COMMENT_THREAD_REPLIES comments per level, COMMENT_THREAD_MAX_DEPTH levels deep,
+# with a link to page through the rest. Pages of those are COMMENT_THREAD_PAGE_SIZE
+# threads by default, up to COMMENT_THREAD_MAX_PAGE_SIZE.
+COMMENT_THREAD_REPLIES = 5
+COMMENT_THREAD_MAX_DEPTH = 3
+COMMENT_THREAD_PAGE_SIZE = 20
+COMMENT_THREAD_MAX_PAGE_SIZE = 100
+
+# With BOOKMARK_WRITE_BEHIND, new positions of bookmarks are kept in the cache and
+# written to the database every BOOKMARK_FLUSH_INTERVAL seconds, at most
+# BOOKMARK_FLUSH_BATCH_SIZE per UPDATE (see core/bookmarks.py). Positions the cache
+# loses before they are flushed are lost, so this is only on with a shared cache that
+# never evicts (see production.py). Positions not flushed within BOOKMARK_BUFFER_TIMEOUT
+# seconds are dropped. Without the flush thread (BOOKMARK_FLUSH_IN_BACKGROUND), run the
+# flush_bookmarks command, e.g. from cron.
+BOOKMARK_WRITE_BEHIND = False
+BOOKMARK_FLUSH_IN_BACKGROUND = True
+BOOKMARK_FLUSH_INTERVAL = 5
+BOOKMARK_FLUSH_BATCH_SIZE = 500
+BOOKMARK_BUFFER_TIMEOUT = 60 * 60 * 24
+
 # Change user model
 AUTH_USER_MODEL = "accounts.User"
 
@@ -1,3 +1,5 @@
+import os
+
 import dj_database_url
 
 from config.settings.base import *
@@ -21,3 +23,17 @@ CORS_ALLOWED_ORIGINS = [
 
 DATABASES = {}
 DATABASES["default"] = dj_database_url.config(conn_max_age=600, ssl_require=True)
+
+# Share the cache between dynos when Redis is provisioned.
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+    # Buffer bookmark positions in Redis, see core/bookmarks.py. Redis must not evict
+    # anything (maxmemory-policy noeviction): buffered positions have a timeout, so
+    # volatile-* policies would evict them first.
+    BOOKMARK_WRITE_BEHIND = os.environ.get("BOOKMARK_WRITE_BEHIND", "1") == "1"
+    BOOKMARK_FLUSH_INTERVAL = int(os.environ.get("BOOKMARK_FLUSH_INTERVAL", "5"))
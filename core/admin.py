@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Article, Annotation, Bookmark, Comment
+from .models import Article, Annotation, BookDeletion, Bookmark, Comment
 
 from treebeard.admin import TreeAdmin
 from treebeard.forms import movenodeform_factory
@@ -67,9 +67,9 @@ class AnnotationAdmin(admin.ModelAdmin):
     readonly_fields = ["id", "uuid", "created_on"]
 
 
-class CommentAdmin(TreeAdmin):
-    form = movenodeform_factory(Comment)
-    list_display = ("comment_text", "uuid", "user")
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ("comment_text", "uuid", "user", "depth")
+    readonly_fields = ["uuid", "parent", "thread", "path", "depth"]
 
 
 class BookmarkAdmin(admin.ModelAdmin):
@@ -83,7 +83,20 @@ class BookmarkAdmin(admin.ModelAdmin):
     )
 
 
+class BookDeletionAdmin(admin.ModelAdmin):
+    list_display = (
+        "title",
+        "user",
+        "created_on",
+        "finished_on",
+        "deleted_rows",
+        "total_rows",
+    )
+    readonly_fields = ["uuid", "created_on"]
+
+
 admin.site.register(Article, ArticleAdmin)
 admin.site.register(Annotation, AnnotationAdmin)
+admin.site.register(BookDeletion, BookDeletionAdmin)
 admin.site.register(Bookmark, BookmarkAdmin)
 admin.site.register(Comment, CommentAdmin)
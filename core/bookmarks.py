@@ -0,0 +1,315 @@
+"""
+Saving bookmarks (reading positions).
+
+Every user has one bookmark per book (a unique constraint), and PUT bookmark/<book>/
+creates or moves it with save_bookmark(): a single INSERT ... ON CONFLICT DO UPDATE
+that returns the row. So two devices saving at once can't create two bookmarks, and
+nothing is read before the write or after it.
+
+Clients save the reader's position every few seconds while they scroll, which made
+bookmark UPDATEs a large share of our writes. With BOOKMARK_WRITE_BEHIND, a new
+position of a bookmark is only written to the cache (shared between processes when
+Redis is configured, see config/settings/production.py), under a key per (user,
+book), and reads of the bookmark are answered from there. A bookmark that isn't in
+the cache yet is saved to the database right away, with save_bookmark(), and put in
+the cache, so the set of bookmarks is always in the database and only their
+positions can be behind.
+
+Every buffered write also appends (user, book) to a log in the cache, numbered by an
+incremented counter, and flush_bookmarks() writes the latest position of everything
+logged since the last flush to the database, BOOKMARK_FLUSH_BATCH_SIZE bookmarks per
+UPDATE. It runs every BOOKMARK_FLUSH_INTERVAL seconds in a thread of every process
+that buffers bookmarks, when that process exits, and from the flush_bookmarks
+command.
+
+Durability: once a PUT is answered, the position is in the cache. It reaches the
+database within BOOKMARK_FLUSH_INTERVAL seconds, as long as some process keeps
+flushing; a process that is killed leaves its positions in the cache for the others
+(or the command) to flush. What can be lost is what the cache loses before a flush:
+positions not flushed when the cache restarts or evicts them, and those not flushed
+within BOOKMARK_BUFFER_TIMEOUT seconds. Buffered positions and the log are stored
+with that timeout, and Redis' volatile-* policies evict exactly such keys, so the
+only safe policy is noeviction (writes fail instead when Redis is full). Without
+BOOKMARK_WRITE_BEHIND every position is written to the database before the
+response.
+"""
+import atexit
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from .models import Article, Bookmark
+
+logger = logging.getLogger(__name__)
+
+LOG_LAST_KEY = "bookmark:log:last"
+LOG_FLUSHED_KEY = "bookmark:log:flushed"
+LOG_SEEN_KEY = "bookmark:log:seen"
+FLUSH_LOCK_KEY = "bookmark:flush:lock"
+# Longer than any flush should take, so that a flusher that died can't hold the lock.
+FLUSH_LOCK_TIMEOUT = 5 * 60
+
+FLUSHED_FIELDS = ["article", "highlight_start", "highlight_end", "updated_on"]
+# The (user, book) unique constraint first, see save_bookmark().
+UPSERT_FIELDS = ["user", "book", "uuid", "created_on", *FLUSHED_FIELDS]
+UPSERT_SQL = """
+    INSERT INTO {table} ({columns}) VALUES ({values})
+    ON CONFLICT ({conflict}) DO UPDATE SET {updates}
+    RETURNING id, uuid, created_on
+"""
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def _buffer_key(user_id, book_id):
+    return f"bookmark:{user_id}:{book_id}"
+
+
+def _log_key(number):
+    return f"bookmark:log:{number}"
+
+
+def save_bookmark(user, book, article, highlight_start, highlight_end):
+    """
+    Create or move the bookmark of `user` in `book`, in one INSERT ... ON CONFLICT DO
+    UPDATE. Returns the bookmark, with `book` and `article` set to the ones given so
+    that it can be serialized without queries, and whether it was created.
+    """
+    bookmark = Bookmark(
+        uuid=uuid.uuid4(),
+        user=user,
+        book=book,
+        article=article,
+        highlight_start=highlight_start,
+        highlight_end=highlight_end,
+    )
+    bookmark.created_on = bookmark.updated_on = timezone.now()
+    fields = [Bookmark._meta.get_field(name) for name in UPSERT_FIELDS]
+    quote = connection.ops.quote_name
+    sql = UPSERT_SQL.format(
+        table=quote(Bookmark._meta.db_table),
+        columns=", ".join(quote(field.column) for field in fields),
+        values=", ".join(["%s"] * len(fields)),
+        conflict=", ".join(quote(field.column) for field in fields[:2]),
+        updates=", ".join(
+            f"{quote(field.column)} = EXCLUDED.{quote(field.column)}"
+            for field in fields
+            if field.name in FLUSHED_FIELDS
+        ),
+    )
+    params = [
+        field.get_db_prep_save(getattr(bookmark, field.attname), connection)
+        for field in fields
+    ]
+    # A raw queryset, for the database's values to be converted to Python ones.
+    saved = next(iter(Bookmark.objects.raw(sql, params)))
+    created = saved.uuid == bookmark.uuid
+    bookmark.pk, bookmark.uuid, bookmark.created_on = (
+        saved.pk,
+        saved.uuid,
+        saved.created_on,
+    )
+    return bookmark, created
+
+
+def remember_bookmark(bookmark):
+    """Put `bookmark`, as it is in the database, in the cache."""
+    cache.set(
+        _buffer_key(bookmark.user_id, bookmark.book_id),
+        _to_entry(bookmark),
+        settings.BOOKMARK_BUFFER_TIMEOUT,
+    )
+
+
+def buffer_bookmark(bookmark, article, highlight_start, highlight_end):
+    """Move `bookmark` (an existing one) to a new position, in the cache only."""
+    bookmark.article = article
+    bookmark.highlight_start = highlight_start
+    bookmark.highlight_end = highlight_end
+    bookmark.updated_on = timezone.now()
+    remember_bookmark(bookmark)
+    # Logged after the position is set, so that a flush that reads the log reads the
+    # position too.
+    number = _next_log_number()
+    cache.set(
+        _log_key(number),
+        (bookmark.user_id, bookmark.book_id),
+        settings.BOOKMARK_BUFFER_TIMEOUT,
+    )
+    if settings.BOOKMARK_FLUSH_IN_BACKGROUND:
+        start_flusher()
+    return bookmark
+
+
+def _to_entry(bookmark):
+    return {
+        "pk": bookmark.pk,
+        "uuid": bookmark.uuid,
+        "book_id": bookmark.book_id,
+        "book": bookmark.book.slug_full,
+        "article_id": bookmark.article_id,
+        "article": bookmark.article.slug_full,
+        "highlight_start": bookmark.highlight_start,
+        "highlight_end": bookmark.highlight_end,
+        "created_on": bookmark.created_on,
+        "updated_on": bookmark.updated_on,
+    }
+
+
+def _next_log_number():
+    try:
+        return cache.incr(LOG_LAST_KEY)
+    except ValueError:
+        # The counter doesn't exist (yet, or anymore).
+        cache.add(LOG_LAST_KEY, 0, timeout=None)
+        return cache.incr(LOG_LAST_KEY)
+
+
+def _from_entry(entry, user):
+    return Bookmark(
+        pk=entry["pk"],
+        uuid=entry["uuid"],
+        user=user,
+        book=Article(pk=entry["book_id"], slug_full=entry["book"]),
+        article=Article(pk=entry["article_id"], slug_full=entry["article"]),
+        highlight_start=entry["highlight_start"],
+        highlight_end=entry["highlight_end"],
+        created_on=entry["created_on"],
+        updated_on=entry["updated_on"],
+    )
+
+
+def get_buffered_bookmark(user, book_id):
+    """The bookmark of `user` in book `book_id` from the cache, or None."""
+    entry = cache.get(_buffer_key(user.pk, book_id))
+    if entry is None:
+        return None
+    return _from_entry(entry, user)
+
+
+def with_buffered_positions(bookmarks):
+    """`bookmarks` (of the same user), with the positions in the cache applied."""
+    bookmarks = list(bookmarks)
+    keys = [_buffer_key(b.user_id, b.book_id) for b in bookmarks]
+    entries = cache.get_many(keys)
+    return [
+        _from_entry(entries[key], bookmark.user) if key in entries else bookmark
+        for key, bookmark in zip(keys, bookmarks)
+    ]
+
+
+def with_buffered_paths(user, books):
+    """
+    `books` (root articles annotated with `bookmark_slug_full`), with the bookmarked
+    paths of `user` in the cache applied.
+    """
+    keys = {book.pk: _buffer_key(user.pk, book.pk) for book in books}
+    entries = cache.get_many(keys.values())
+    for book in books:
+        if keys[book.pk] in entries:
+            book.bookmark_slug_full = entries[keys[book.pk]]["article"]
+    return books
+
+
+def flush_bookmarks(batch_size=None):
+    """
+    Write the positions buffered since the last flush to the database. Returns how
+    many bookmarks were written, or None if another flush is running.
+    """
+    if not cache.add(FLUSH_LOCK_KEY, True, timeout=FLUSH_LOCK_TIMEOUT):
+        return None
+    try:
+        return _flush(batch_size or settings.BOOKMARK_FLUSH_BATCH_SIZE)
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
+
+
+def _flush(batch_size):
+    last = cache.get(LOG_LAST_KEY, 0)
+    # How far the log went at the last flush. A log entry numbered up to there that
+    # is missing isn't coming anymore (it expired, or its writer died between taking
+    # the number and writing it); past there it could still be being written.
+    seen = cache.get(LOG_SEEN_KEY)
+    flushed_to = cache.get(LOG_FLUSHED_KEY, 0)
+    if flushed_to > last:
+        # The counter was lost and started over.
+        flushed_to, seen = 0, None
+    flushed = 0
+    while flushed_to < last:
+        numbers = range(flushed_to + 1, min(flushed_to + batch_size, last) + 1)
+        logged = cache.get_many([_log_key(number) for number in numbers])
+        pairs = set()
+        done = flushed_to
+        for number in numbers:
+            pair = logged.get(_log_key(number))
+            if pair is None and (seen is None or number > seen):
+                break
+            if pair is not None:
+                pairs.add(pair)
+            done = number
+        flushed += _write_positions(pairs, batch_size)
+        cache.delete_many(
+            [_log_key(number) for number in range(flushed_to + 1, done + 1)]
+        )
+        cache.set(LOG_FLUSHED_KEY, done, timeout=None)
+        if done < numbers[-1]:
+            break
+        flushed_to = done
+    cache.set(LOG_SEEN_KEY, last, timeout=None)
+    return flushed
+
+
+def _write_positions(pairs, batch_size):
+    entries = cache.get_many([_buffer_key(*pair) for pair in pairs]).values()
+    bookmarks = [
+        Bookmark(
+            pk=entry["pk"],
+            article_id=entry["article_id"],
+            highlight_start=entry["highlight_start"],
+            highlight_end=entry["highlight_end"],
+            updated_on=entry["updated_on"],
+        )
+        for entry in entries
+    ]
+    # Bookmarks deleted since (with their book) are just not updated.
+    Bookmark.objects.bulk_update(bookmarks, FLUSHED_FIELDS, batch_size=batch_size)
+    return len(bookmarks)
+
+
+def start_flusher():
+    """Flush every BOOKMARK_FLUSH_INTERVAL seconds and at exit, once per process."""
+    global _flusher
+    with _flusher_lock:
+        if _flusher is not None:
+            return _flusher
+        _flusher = threading.Thread(target=_flush_periodically, daemon=True)
+        _flusher.start()
+        atexit.register(_flush_at_exit)
+        return _flusher
+
+
+def _flush_periodically():
+    while True:
+        time.sleep(settings.BOOKMARK_FLUSH_INTERVAL)
+        try:
+            flush_bookmarks()
+        except Exception:
+            # Keep going: what wasn't flushed is still logged.
+            logger.exception("Flushing buffered bookmarks failed")
+        finally:
+            # Every thread has its own connection.
+            connection.close()
+
+
+def _flush_at_exit():
+    try:
+        flush_bookmarks()
+    except Exception:
+        logger.exception("Flushing buffered bookmarks at exit failed")
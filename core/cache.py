@@ -0,0 +1,79 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+"""
+Cache for serialized tables of contents.
+
+Every book (root article, identified by its path) has a version number in the cache
+and cached TOCs are keyed by that version. Anything that changes a book's tree bumps
+its version, so stale entries are never read again (they just expire) and other books
+keep their entries.
+"""
+
+TOC_HITS_KEY = "toc:stats:hits"
+TOC_MISSES_KEY = "toc:stats:misses"
+
+
+def _version_key(root_path):
+    return f"toc:version:{root_path}"
+
+
+def _new_version():
+    # Versions start from the current time rather than 0, so that if a version is
+    # evicted it can't restart at a number that old entries were stored under.
+    return time.time_ns()
+
+
+def _incr(key, initial):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Key doesn't exist (yet, or anymore).
+        cache.add(key, initial, timeout=None)
+        return cache.get(key, initial)
+
+
+def get_book_version(root_path):
+    version = cache.get(_version_key(root_path))
+    if version is None:
+        cache.add(_version_key(root_path), _new_version(), timeout=None)
+        version = cache.get(_version_key(root_path))
+    return version
+
+
+def bump_book_version(root_path):
+    """Invalidate every cached TOC of a book."""
+    _incr(_version_key(root_path), _new_version())
+    # A request running alongside this transaction could still read the old tree and
+    # cache it under the new version, so bump once more when the change is visible.
+    transaction.on_commit(lambda: _incr(_version_key(root_path), _new_version()))
+
+
+def get_cached_toc(node, exclude_hidden, build):
+    """Return the TOC of `node` from the cache, or call `build()` and cache it."""
+    root_path = node.path[: node.steplen]
+    key = "toc:{}:{}:{}:{}".format(
+        root_path,
+        get_book_version(root_path),
+        node.path,
+        "visible" if exclude_hidden else "all",
+    )
+    toc = cache.get(key)
+    if toc is not None:
+        _incr(TOC_HITS_KEY, 1)
+        return toc
+    _incr(TOC_MISSES_KEY, 1)
+    toc = build()
+    cache.set(key, toc, timeout=settings.TOC_CACHE_TIMEOUT)
+    return toc
+
+
+def get_toc_cache_stats():
+    return {
+        "hits": cache.get(TOC_HITS_KEY, 0),
+        "misses": cache.get(TOC_MISSES_KEY, 0),
+    }
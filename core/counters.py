@@ -0,0 +1,136 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Annotation, Comment, CommentCountDelta
+
+
+"""
+Comment counters.
+
+Annotations keep how many comments they have (comment_count) and how many of those
+start a thread (thread_count), and comments how many direct replies they have
+(reply_count), so that a "12 comments" badge doesn't take counting rows.
+
+Updating a counter on every new comment would make everyone replying to the same
+popular thread wait on the same row. Instead, adding or deleting a comment inserts a
+CommentCountDelta in the same transaction, and reading a counter adds the deltas
+that are still pending to it. compact_comment_counts() folds the pending deltas
+into the counters, a batch at a time, and is run by the update_comment_counts
+command (e.g. from cron, so that there are never many pending). If the counters are
+ever off, repair_comment_counts() recomputes them from the comments.
+"""
+
+
+def _pending(deltas, field):
+    return Coalesce(Subquery(deltas.annotate(total=Sum(field)).values("total")), 0)
+
+
+def annotate_comment_counts(queryset):
+    """
+    Annotate annotations with `pending_comments` and `pending_threads`, to be added to
+    comment_count and thread_count.
+    """
+    deltas = (
+        CommentCountDelta.objects.filter(annotation=OuterRef("pk"))
+        .order_by()
+        .values("annotation")
+    )
+    return queryset.annotate(
+        pending_comments=_pending(deltas, "comments"),
+        pending_threads=_pending(deltas.filter(parent__isnull=True), "replies"),
+    )
+
+
+def comment_counts(annotation):
+    """(comment_count, thread_count) of `annotation`, pending deltas included."""
+    if not hasattr(annotation, "pending_comments"):
+        pending = CommentCountDelta.objects.filter(annotation=annotation).aggregate(
+            comments=Coalesce(Sum("comments"), 0),
+            threads=Coalesce(Sum("replies", filter=Q(parent__isnull=True)), 0),
+        )
+        annotation.pending_comments = pending["comments"]
+        annotation.pending_threads = pending["threads"]
+    return (
+        annotation.comment_count + annotation.pending_comments,
+        annotation.thread_count + annotation.pending_threads,
+    )
+
+
+def add_pending_replies(comments):
+    """
+    Set `pending_replies` on those of `comments` that don't have it yet, in one query.
+    Returns `comments`.
+    """
+    uncounted = [c for c in comments if not hasattr(c, "pending_replies")]
+    if uncounted:
+        pending = dict(
+            CommentCountDelta.objects.filter(parent__in=uncounted)
+            .order_by()
+            .values("parent")
+            .annotate(total=Sum("replies"))
+            .values_list("parent", "total")
+        )
+        for comment in uncounted:
+            comment.pending_replies = pending.get(comment.pk, 0)
+    return comments
+
+
+def reply_count(comment):
+    """reply_count of `comment`, pending deltas included."""
+    add_pending_replies([comment])
+    return comment.reply_count + comment.pending_replies
+
+
+def compact_comment_counts(batch_size=1000):
+    """
+    Add the pending deltas to the counters and delete them, `batch_size` at a time,
+    each batch in a transaction of its own. Returns how many deltas were added.
+    """
+    compacted = 0
+    while True:
+        with transaction.atomic():
+            # Locked, so that two compactions at once don't add the same deltas.
+            pks = list(
+                CommentCountDelta.objects.select_for_update(skip_locked=True)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not pks:
+                return compacted
+            deltas = CommentCountDelta.objects.filter(pk__in=pks).order_by()
+            per_annotation = deltas.filter(annotation=OuterRef("pk")).values(
+                "annotation"
+            )
+            Annotation.objects.filter(pk__in=deltas.values("annotation")).update(
+                comment_count=F("comment_count") + _pending(per_annotation, "comments"),
+                thread_count=F("thread_count")
+                + _pending(per_annotation.filter(parent__isnull=True), "replies"),
+            )
+            per_parent = deltas.filter(parent=OuterRef("pk")).values("parent")
+            Comment.objects.filter(pk__in=deltas.values("parent")).update(
+                reply_count=F("reply_count") + _pending(per_parent, "replies")
+            )
+            deltas.delete()
+            compacted += len(pks)
+
+
+def repair_comment_counts():
+    """
+    Recompute every counter from the comments, in two UPDATEs, and drop the pending
+    deltas. A comment made while this runs can be counted twice, so run it when
+    things are quiet.
+    """
+    with transaction.atomic():
+        CommentCountDelta.objects.all().delete()
+        comments = Comment.objects.filter(annotation=OuterRef("pk")).order_by()
+        Annotation.objects.update(
+            comment_count=_count(comments.values("annotation")),
+            thread_count=_count(comments.filter(depth=1).values("annotation")),
+        )
+        replies = Comment.objects.filter(parent=OuterRef("pk")).order_by()
+        Comment.objects.update(reply_count=_count(replies.values("parent")))
+
+
+def _count(rows):
+    return Coalesce(Subquery(rows.annotate(count=Count("pk")).values("count")), 0)
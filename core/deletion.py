@@ -0,0 +1,125 @@
+"""
+Deleting a book in the background.
+
+Deleting a root Article the usual way goes through treebeard and Django's collector,
+which loads every annotation, comment and bookmark of the book into memory (to send
+signals and cascade) and deletes it all in one transaction. For a popular book that
+is hundreds of thousands of rows in a single request.
+
+Instead, mark_for_deletion() only flags the book's articles as pending_deletion, which
+every view filters out, and records a BookDeletion. purge_book() then deletes the rows
+in batches of BOOK_PURGE_BATCH_SIZE, each batch a plain DELETE in its own transaction,
+and keeps count on the BookDeletion. It runs in a thread once the request commits, and
+the purge_book_deletions command finishes whatever a thread didn't (e.g. because the
+process was restarted).
+"""
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .cache import bump_book_version
+from .models import Annotation, Article, BookDeletion, Bookmark, Comment
+
+DELETE_SQL = "DELETE FROM {table} WHERE {pk} IN ({pks})"
+
+
+def mark_for_deletion(book, user):
+    """Hide `book` (a root Article) right away and schedule it to be purged."""
+    with transaction.atomic():
+        Article.objects.filter(book=book).update(pending_deletion=True)
+        deletion = BookDeletion.objects.create(
+            user=user, book_uuid=book.uuid, book_path=book.path, title=book.title
+        )
+        if settings.BOOK_PURGE_IN_BACKGROUND:
+            transaction.on_commit(lambda: start_purge(deletion))
+    bump_book_version(book.path)
+    return deletion
+
+
+def start_purge(deletion):
+    thread = threading.Thread(target=_purge_in_thread, args=(deletion,), daemon=True)
+    thread.start()
+    return thread
+
+
+def _purge_in_thread(deletion):
+    try:
+        purge_book(deletion)
+    finally:
+        # Every thread has its own connection.
+        connection.close()
+
+
+def purge_book(deletion, batch_size=None):
+    """Delete everything of the book of `deletion`, one batch at a time."""
+    batch_size = batch_size or settings.BOOK_PURGE_BATCH_SIZE
+    # None if an earlier purge got as far as deleting the book itself.
+    book_id = (
+        Article.objects.filter(uuid=deletion.book_uuid, pending_deletion=True)
+        .values_list("pk", flat=True)
+        .first()
+    )
+    if book_id is None:
+        # The book is deleted last, so the rest is gone too. Filtering on book_id=None
+        # would match articles that are being created, see Article.save().
+        _finish(deletion)
+        return
+    articles = Article.objects.filter(book_id=book_id)
+    # Whatever points at the articles goes first, so that no batch breaks a foreign key.
+    # Replies go before what they reply to, for the same reason.
+    dependents = [
+        Comment.objects.filter(book_id=book_id).order_by("-depth"),
+        Annotation.objects.filter(book_id=book_id),
+        Bookmark.objects.filter(book_id=book_id),
+    ]
+    if deletion.started_on is None:
+        deletion.started_on = timezone.now()
+        deletion.total_rows = articles.count() + sum(qs.count() for qs in dependents)
+        deletion.save(update_fields=["started_on", "total_rows"])
+
+    for queryset in dependents:
+        _delete_in_batches(deletion, queryset, batch_size)
+    # prev/next only link articles of the same book.
+    linked = articles.filter(Q(prev_node__isnull=False) | Q(next_node__isnull=False))
+    while True:
+        pks = list(linked.values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            break
+        Article.objects.filter(pk__in=pks).update(prev_node=None, next_node=None)
+    # The root goes last, so its path isn't handed out again while this is running.
+    _delete_in_batches(deletion, articles.order_by("-path"), batch_size)
+
+    _finish(deletion)
+
+
+def _finish(deletion):
+    deletion.finished_on = timezone.now()
+    deletion.save(update_fields=["finished_on"])
+    deletion.refresh_from_db(fields=["deleted_rows"])
+
+
+def _delete_in_batches(deletion, queryset, batch_size):
+    model = queryset.model
+    quote = connection.ops.quote_name
+    while True:
+        with transaction.atomic():
+            pks = list(queryset.values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                return
+            # A plain DELETE: no signals and no collector loading related rows.
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    DELETE_SQL.format(
+                        table=quote(model._meta.db_table),
+                        pk=quote(model._meta.pk.column),
+                        pks=", ".join(["%s"] * len(pks)),
+                    ),
+                    pks,
+                )
+                deleted = cursor.rowcount
+            BookDeletion.objects.filter(pk=deletion.pk).update(
+                deleted_rows=F("deleted_rows") + deleted
+            )
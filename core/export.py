@@ -0,0 +1,142 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from .models import Annotation, Article, Bookmark, Comment
+
+
+"""
+Streaming export of a book as newline-delimited JSON (NDJSON).
+
+Every line is one record, `{"type": ..., "data": {...}}`. Articles come first, in
+depth-first (path) order, each with its `depth` relative to the book (the book itself
+is 1), which is enough to rebuild the tree. Annotations, comments and bookmarks
+optionally follow and refer to articles by uuid. Comments are in path order too, with
+their depth in the comment tree.
+
+Rows are read with `.iterator()` (a server-side cursor on Postgres) and encoded one at
+a time, so memory stays flat no matter how big the book is.
+"""
+
+FORMAT_VERSION = 1
+INCLUDE_CHOICES = ("annotations", "comments", "bookmarks")
+
+ARTICLE_FIELDS = [
+    "uuid",
+    "user__username",
+    "title",
+    "slug_section",
+    "author",
+    "hidden",
+    "created_on",
+    "updated_on",
+    "article_html",
+    "article_json",
+    "article_text",
+]
+ANNOTATION_FIELDS = [
+    "uuid",
+    "user__username",
+    "article__uuid",
+    "created_on",
+    "updated_on",
+    "highlight_start",
+    "highlight_end",
+    "highlight_backward",
+    "is_public",
+]
+COMMENT_FIELDS = [
+    "uuid",
+    "user__username",
+    "article__uuid",
+    "annotation__uuid",
+    "created_on",
+    "updated_on",
+    "comment_html",
+    "comment_json",
+    "comment_text",
+]
+BOOKMARK_FIELDS = [
+    "uuid",
+    "user__username",
+    "article__uuid",
+    "created_on",
+    "updated_on",
+    "highlight_start",
+    "highlight_end",
+]
+
+CHUNK_SIZE = 2000
+
+encoder = DjangoJSONEncoder()
+
+
+def _record(type_, row, **extra):
+    # "user__username" -> "user", "article__uuid" -> "article"
+    data = {key.split("__")[0]: value for key, value in row.items()}
+    return encoder.encode({"type": type_, **extra, "data": data}) + "\n"
+
+
+def export_book(book, include=(), user=None):
+    """
+    Yield the book (a root Article) as NDJSON lines.
+
+    `include` can have any of INCLUDE_CHOICES. If `user` is given, only what they are
+    allowed to see is exported: hidden sections only if they own the book, public and
+    their own annotations (and their comments), and only their own bookmarks.
+    """
+    yield _record("book", {"format": FORMAT_VERSION, "uuid": book.uuid})
+
+    articles = Article.objects.filter(path__startswith=book.path).order_by("path")
+    show_hidden = user is None or user.pk == book.user_id
+    # Paths of hidden sections that are left out, with everything under them.
+    skipped = []
+    for row in articles.values("path", "depth", *ARTICLE_FIELDS).iterator(
+        chunk_size=CHUNK_SIZE
+    ):
+        path = row.pop("path")
+        depth = row.pop("depth") - book.depth + 1
+        if skipped and path.startswith(skipped[-1]):
+            continue
+        if row["hidden"] and not show_hidden and depth > 1:
+            skipped.append(path)
+            continue
+        yield _record("article", row, depth=depth)
+
+    visible_annotations = Annotation.objects.filter(book=book)
+    for path in skipped:
+        visible_annotations = visible_annotations.exclude(
+            article__path__startswith=path
+        )
+    if user is not None:
+        visible_annotations = visible_annotations.filter(
+            Q(is_public=True) | Q(user=user)
+        )
+
+    if "annotations" in include:
+        for row in (
+            visible_annotations.order_by("article__path", "id")
+            .values(*ANNOTATION_FIELDS)
+            .iterator(chunk_size=CHUNK_SIZE)
+        ):
+            yield _record("annotation", row)
+
+    if "comments" in include:
+        comments = Comment.objects.filter(annotation__in=visible_annotations)
+        for row in (
+            comments.order_by("path")
+            .values("depth", *COMMENT_FIELDS)
+            .iterator(chunk_size=CHUNK_SIZE)
+        ):
+            depth = row.pop("depth")
+            yield _record("comment", row, depth=depth)
+
+    if "bookmarks" in include:
+        bookmarks = Bookmark.objects.filter(book=book)
+        if user is not None:
+            bookmarks = bookmarks.filter(user=user)
+        for row in (
+            bookmarks.order_by("id")
+            .values(*BOOKMARK_FIELDS)
+            .iterator(chunk_size=CHUNK_SIZE)
+        ):
+            yield _record("bookmark", row)
@@ -0,0 +1,351 @@
+import json
+import re
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils.html import strip_tags
+from slugify import slugify
+
+from .cache import bump_book_version
+from .models import Article, next_free_slug
+from .sanitization import (
+    ALLOWLIST_VERSION,
+    hash_html,
+    sanitize_html,
+    update_sanitized_html,
+)
+
+
+"""
+Bulk import of books.
+
+Two formats are read, both incrementally so a whole file is never held in memory:
+- The nested JSON of `Article.dump_bulk` (what raw_books/*.txt contain), i.e.
+  `[{"data": {...}, "children": [...]}]`. Only the `data` objects are decoded as a
+  whole; the nesting around them is walked by hand.
+- The newline-delimited JSON written by core/export.py. Only article records are
+  imported.
+
+Either way the reader yields `(depth, data)` in depth-first order, and BookImporter
+works out path, depth, numchild and slugs in memory and writes the nodes with
+bulk_create, instead of one Article.save (and its slug and path queries) per node.
+
+When many books are imported at once (see the ingest_books command), prepare_book does
+the CPU-heavy part (parsing, sanitizing, extracting text) in worker processes and
+several BookImporters write at the same time, sharing a RootAllocator.
+"""
+
+WHITESPACE = re.compile(r"\s*")
+DECODER = json.JSONDecoder()
+
+
+class _Reader:
+    """Decode JSON values from a file one at a time, reading it in chunks."""
+
+    def __init__(self, file, chunk_size=1 << 16):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+
+    def _fill(self):
+        # Read at least as much as is still pending, so that a value spanning many
+        # chunks is retried a logarithmic rather than linear number of times.
+        chunk = self.file.read(max(self.chunk_size, len(self.buffer) - self.pos))
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character, or "" at the end of the file."""
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Expected one of {chars!r}, found {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # Most likely cut off at the end of the buffer.
+                if not self._fill():
+                    raise
+                continue
+            # A number at the very end of the buffer might continue in the next chunk.
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def _read_nodes(reader, depth):
+    """Read the nodes of a dump_bulk list, after its opening bracket."""
+    if reader.peek() == "]":
+        reader.pos += 1
+        return
+    while True:
+        yield from _read_node(reader, depth)
+        if reader.expect(",]") == "]":
+            return
+
+
+def _read_node(reader, depth):
+    reader.expect("{")
+    data = None
+    while reader.peek() != "}":
+        key = reader.value()
+        reader.expect(":")
+        if key == "data":
+            data = reader.value()
+            yield depth, data
+        elif key == "children":
+            if data is None:
+                raise ValueError("Node has children before its data")
+            reader.expect("[")
+            yield from _read_nodes(reader, depth + 1)
+        else:
+            reader.value()
+        if reader.peek() == ",":
+            reader.pos += 1
+    reader.pos += 1
+    if data is None:
+        raise ValueError("Node without data")
+
+
+def read_records(file, chunk_size=1 << 16):
+    """Yield `(depth, data)` of each article in `file`, in depth-first order."""
+    reader = _Reader(file, chunk_size)
+    first = reader.peek()
+    if first == "[":
+        reader.pos += 1
+        yield from _read_nodes(reader, 1)
+    elif first == "{":
+        while reader.peek():
+            record = reader.value()
+            if record.get("type") == "article":
+                yield record["depth"], record["data"]
+    else:
+        raise ValueError("Not a book dump or export")
+
+
+def walk_tree(section):
+    """
+    Yield the depth of every section of a nested `{..., "children": [...]}` section
+    as sent, before it is validated: without recursion, and skipping what isn't a
+    section.
+    """
+    stack = [(section, 1)]
+    while stack:
+        section, depth = stack.pop()
+        yield depth
+        children = section.get("children") if isinstance(section, dict) else None
+        if isinstance(children, list):
+            stack.extend((child, depth + 1) for child in children)
+
+
+def read_tree(section, depth=1):
+    """Yield `(depth, data)` of a nested `{..., "children": [...]}` section."""
+    children = section.pop("children", [])
+    yield depth, section
+    for child in children:
+        yield from read_tree(child, depth + 1)
+
+
+def prepare_book(filename):
+    """
+    Read a book and sanitize it, e.g. in a worker process (no database access here).
+    Returns `(depth, data, sanitized_html)` records for BookImporter and the time it
+    took.
+    """
+    start = time.perf_counter()
+    records = []
+    with open(filename) as input_file:
+        for depth, data in read_records(input_file):
+            html = data.get("article_html", "")
+            if not data.get("article_text"):
+                data["article_text"] = strip_tags(html)
+            records.append((depth, data, sanitize_html(html)))
+    return records, time.perf_counter() - start
+
+
+class RootAllocator:
+    """
+    Pick the path and slug of new books. Books that are being imported at the same
+    time aren't visible to each other until they commit, so the paths and slugs
+    handed out are remembered too.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_path = ""
+        self._slugs = set()
+
+    def __call__(self, article):
+        with self._lock:
+            last_root = Article.get_last_root_node()
+            last_path = max(last_root.path if last_root else "", self._last_path)
+            article.path = (
+                Article(path=last_path)._inc_path()
+                if last_path
+                else Article._get_path(None, 1, 1)
+            )
+            self._last_path = article.path
+            slug = slugify(article.title, max_length=50)
+            taken = self._slugs | set(
+                Article.get_root_nodes()
+                .filter(Q(slug_section=slug) | Q(slug_section__startswith=f"{slug}-"))
+                .values_list("slug_section", flat=True)
+            )
+            article.slug_section = next_free_slug(slug, taken)
+            self._slugs.add(article.slug_section)
+
+
+class BookImporter:
+    """
+    Build a book from `(depth, data)` records and write it with bulk_create.
+
+    A node is written once all of its children have been seen, so that its numchild
+    is known; only the current branch is kept in memory. `data` is what dump_bulk or
+    core/export.py produce. Its `user` is an id or a username, unless `user` is given,
+    which then owns the whole book. Records can carry the sanitized HTML as a third
+    item (see prepare_book), otherwise it's done here. With `dry_run`, everything is
+    validated but nothing is written.
+    """
+
+    def __init__(
+        self,
+        user=None,
+        batch_size=500,
+        dry_run=False,
+        keep_uuids=False,
+        progress=None,
+        root_allocator=None,
+    ):
+        self.user = user
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.keep_uuids = keep_uuids
+        # Called with the number of nodes processed so far, after each batch.
+        self.progress = progress
+        self.root_allocator = root_allocator or RootAllocator()
+        self.count = 0
+        self._users = {}
+        self._batch = []
+        # Current branch as (article, slugs taken by its children) pairs.
+        self._stack = []
+
+    def import_book(self, records):
+        """Import the book and return its root."""
+        with transaction.atomic():
+            root = None
+            for depth, data, *sanitized in records:
+                if depth == 1 and root is not None:
+                    raise ValidationError("Only one book can be imported at a time.")
+                if depth > len(self._stack) + 1:
+                    raise ValidationError(
+                        f"Node {self.count + 1} ({data.get('title')!r}) skips a level."
+                    )
+                while len(self._stack) >= depth:
+                    self._finish_node()
+                article = self._build(depth, data, *sanitized)
+                root = root or article
+                self._stack.append((article, set()))
+            if root is None:
+                raise ValidationError("No articles to import.")
+            while self._stack:
+                self._finish_node()
+            self._flush()
+            if not self.dry_run:
+                # Nodes are written before their book is, so point them at it now.
+                root.pk = Article.objects.values_list("pk", flat=True).get(
+                    path=root.path
+                )
+                root.book_id = root.pk
+                Article.objects.filter(path__startswith=root.path).update(book=root.pk)
+                Article.rebuild_navigation(root.path)
+                bump_book_version(root.path)
+        return root
+
+    def _get_user(self, value):
+        if self.user is not None:
+            return self.user
+        if value not in self._users:
+            lookup = {"username": value} if isinstance(value, str) else {"pk": value}
+            try:
+                self._users[value] = get_user_model().objects.get(**lookup)
+            except get_user_model().DoesNotExist:
+                raise ValidationError(f"User {value!r} does not exist.")
+        return self._users[value]
+
+    def _build(self, depth, data, sanitized_html=None):
+        article = Article(
+            user=self._get_user(data.get("user")),
+            title=data.get("title", ""),
+            author=data.get("author", ""),
+            hidden=data.get("hidden", False),
+            article_html=data.get("article_html", ""),
+            article_json=data.get("article_json"),
+            article_text=data.get("article_text", ""),
+            depth=depth,
+            numchild=0,
+        )
+        if self.keep_uuids and data.get("uuid"):
+            article.uuid = data["uuid"]
+        if depth == 1:
+            # The only path and slug that can clash with existing rows.
+            self.root_allocator(article)
+            article.slug_full = article.slug_section
+        else:
+            parent, taken = self._stack[-1]
+            parent.numchild += 1
+            article.path = Article._get_path(parent.path, depth, parent.numchild)
+            article.slug_section = next_free_slug(
+                slugify(article.title, max_length=50), taken
+            )
+            taken.add(article.slug_section)
+            article.slug_full = f"{parent.slug_full}/{article.slug_section}"
+        try:
+            # The user was looked up already; validating it would query per node.
+            article.clean_fields(exclude=["user"])
+        except ValidationError as e:
+            raise ValidationError(
+                f"Node {self.count + 1} ({article.title!r}): {'; '.join(e.messages)}"
+            )
+        if sanitized_html is not None:
+            article.article_html_sanitized = sanitized_html
+            article.article_html_hash = hash_html(article.article_html)
+            article.sanitizer_version = ALLOWLIST_VERSION
+        else:
+            update_sanitized_html(article, "article_html")
+        self.count += 1
+        return article
+
+    def _finish_node(self):
+        article, _ = self._stack.pop()
+        self._batch.append(article)
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self._batch and not self.dry_run:
+            Article.objects.bulk_create(self._batch)
+        self._batch = []
+        if self.progress:
+            self.progress(self.count)
@@ -0,0 +1,47 @@
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from core.export import INCLUDE_CHOICES, export_book
+from core.models import Article
+
+
+class Command(BaseCommand):
+    help = (
+        "Export a book, i.e. a root article and everything under it, as "
+        "newline-delimited JSON. Replaces raw_books/dump_book.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("book", help="slug_full or uuid of the book.")
+        parser.add_argument(
+            "-o", "--output", help="File to write to. Defaults to stdout."
+        )
+        parser.add_argument(
+            "--include",
+            nargs="+",
+            choices=INCLUDE_CHOICES,
+            default=[],
+            help="Also export these.",
+        )
+
+    def handle(self, *args, **options):
+        lookup = Q(slug_full=options["book"])
+        try:
+            lookup |= Q(uuid=uuid.UUID(options["book"]))
+        except ValueError:
+            pass
+        try:
+            book = Article.objects.get(lookup, depth=1, pending_deletion=False)
+        except Article.DoesNotExist:
+            raise CommandError(f"Book '{options['book']}' does not exist.")
+
+        lines = export_book(book, include=options["include"])
+        if options["output"]:
+            with open(options["output"], "w") as output_file:
+                output_file.writelines(lines)
+            self.stderr.write(f"Exported '{book.slug_full}' to {options['output']}")
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.bookmarks import flush_bookmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the bookmark positions buffered in the cache to the database. Safe to "
+        "run at any time, e.g. every minute from cron, or before taking the cache down."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.BOOKMARK_FLUSH_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        flushed = flush_bookmarks(batch_size=options["batch_size"])
+        if flushed is None:
+            self.stdout.write("Another flush is running")
+        elif flushed:
+            self.stdout.write(f"Flushed {flushed} bookmarks")
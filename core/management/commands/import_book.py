@@ -0,0 +1,69 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from core.ingest import BookImporter, read_records
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a book from a dump_bulk JSON file (e.g. raw_books/*.txt) or an "
+        "export_book NDJSON file. Replaces raw_books/load_book.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("file")
+        parser.add_argument(
+            "--user",
+            help="Username of the owner. Defaults to the users recorded in the file.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Validate the file without writing anything.",
+        )
+        parser.add_argument(
+            "--keep-uuids",
+            action="store_true",
+            help="Keep the uuids in the file instead of generating new ones.",
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options["user"]:
+            try:
+                user = get_user_model().objects.get(username=options["user"])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        start = time.perf_counter()
+
+        def progress(count):
+            elapsed = time.perf_counter() - start
+            self.stderr.write(
+                f"{count} nodes, {count / elapsed if elapsed else 0:.0f} nodes/s"
+            )
+
+        importer = BookImporter(
+            user=user,
+            batch_size=options["batch_size"],
+            dry_run=options["dry_run"],
+            keep_uuids=options["keep_uuids"],
+            progress=progress,
+        )
+        try:
+            with open(options["file"]) as input_file:
+                book = importer.import_book(read_records(input_file))
+        except OSError as e:
+            raise CommandError(f"Could not read '{options['file']}': {e}")
+        except (ValueError, ValidationError) as e:
+            raise CommandError(f"Invalid book in '{options['file']}': {e}")
+
+        elapsed = time.perf_counter() - start
+        verb = "Validated" if options["dry_run"] else "Imported"
+        self.stdout.write(
+            f"{verb} '{book.slug_full}' ({importer.count} nodes) in {elapsed:.2f}s"
+        )
@@ -0,0 +1,179 @@
+import glob
+import json
+import os
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection, connections
+
+from core.ingest import BookImporter, RootAllocator, prepare_book
+from core.models import SLUG_ATTEMPTS
+
+
+def write_book(records, user, batch_size, root_allocator):
+    """Runs in a writer thread, each of which has its own database connection."""
+    start = time.perf_counter()
+    try:
+        for attempt in range(1, SLUG_ATTEMPTS + 1):
+            importer = BookImporter(
+                user=user, batch_size=batch_size, root_allocator=root_allocator
+            )
+            try:
+                book = importer.import_book(records)
+                break
+            except IntegrityError:
+                # A book created outside of this run took our path or slug.
+                if attempt == SLUG_ATTEMPTS:
+                    raise
+    finally:
+        connection.close()
+    return book.slug_full, importer.count, time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = (
+        "Import many books at once: files are read and sanitized in a process pool "
+        "and written by a few writer threads. Books that were imported already (per "
+        "the state file) are skipped, so an interrupted run can simply be restarted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "files", nargs="+", help="Book files, directories or glob patterns."
+        )
+        parser.add_argument(
+            "--user",
+            help="Username of the owner. Defaults to the users recorded in the files.",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=None, help="Defaults to the number of CPUs."
+        )
+        parser.add_argument(
+            "--writers",
+            type=int,
+            default=2,
+            help="Number of database connections used for writing.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--state-file", default="ingest_state.json")
+
+    def handle(self, *args, **options):
+        user = None
+        if options["user"]:
+            try:
+                user = get_user_model().objects.get(username=options["user"])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        self.state_file = options["state_file"]
+        self.state = self.load_state()
+        filenames = self.find_files(options["files"])
+        pending = [name for name in filenames if not self.is_done(name)]
+        skipped = len(filenames) - len(pending)
+        if skipped:
+            self.stdout.write(f"Skipping {skipped} books imported by an earlier run")
+
+        start = time.perf_counter()
+        nodes = 0
+        failed = []
+        root_allocator = RootAllocator()
+        workers = options["workers"] or os.cpu_count() or 1
+        # Worker processes must not inherit an open database connection.
+        connections.close_all()
+        with ProcessPoolExecutor(workers) as readers, ThreadPoolExecutor(
+            options["writers"]
+        ) as writers:
+            # Read ahead only so far, so that prepared books don't pile up in memory.
+            max_reading = 2 * workers
+            reading = {}
+            writing = {}
+            while pending or reading or writing:
+                while pending and len(reading) + len(writing) < max_reading:
+                    filename = pending.pop(0)
+                    reading[readers.submit(prepare_book, filename)] = filename
+                done, _ = wait([*reading, *writing], return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in reading:
+                        filename = reading.pop(future)
+                        try:
+                            records, read_time = future.result()
+                        except (OSError, ValueError) as e:
+                            failed.append(filename)
+                            self.stderr.write(f"{filename}: could not read: {e}")
+                            continue
+                        write_future = writers.submit(
+                            write_book,
+                            records,
+                            user,
+                            options["batch_size"],
+                            root_allocator,
+                        )
+                        writing[write_future] = (filename, read_time)
+                    else:
+                        filename, read_time = writing.pop(future)
+                        try:
+                            slug_full, count, write_time = future.result()
+                        except (ValidationError, IntegrityError) as e:
+                            failed.append(filename)
+                            self.stderr.write(f"{filename}: could not import: {e}")
+                            continue
+                        nodes += count
+                        self.mark_done(filename, slug_full, count)
+                        self.stdout.write(
+                            f"{filename}: '{slug_full}', {count} nodes, "
+                            f"read {read_time:.2f}s, write {write_time:.2f}s"
+                        )
+
+        elapsed = time.perf_counter() - start
+        imported = len(filenames) - skipped - len(failed)
+        self.stdout.write(
+            f"Imported {imported} books ({nodes} nodes) in {elapsed:.2f}s, "
+            f"{nodes / elapsed if elapsed else 0:.0f} nodes/s"
+        )
+        if failed:
+            raise CommandError(f"{len(failed)} books failed, run again to retry them")
+
+    def find_files(self, patterns):
+        filenames = []
+        for pattern in patterns:
+            if os.path.isdir(pattern):
+                pattern = os.path.join(pattern, "*")
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                raise CommandError(f"No files match '{pattern}'.")
+            filenames.extend(os.path.abspath(name) for name in matches)
+        return [name for name in dict.fromkeys(filenames) if os.path.isfile(name)]
+
+    def load_state(self):
+        if not os.path.exists(self.state_file):
+            return {}
+        with open(self.state_file) as state_file:
+            return json.load(state_file)
+
+    def file_signature(self, filename):
+        stat = os.stat(filename)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def is_done(self, filename):
+        # A file that changed since it was imported is imported again.
+        entry = self.state.get(filename)
+        return entry is not None and entry["file"] == self.file_signature(filename)
+
+    def mark_done(self, filename, slug_full, count):
+        self.state[filename] = {
+            "file": self.file_signature(filename),
+            "book": slug_full,
+            "nodes": count,
+        }
+        # Write to a temporary file first so that an interruption can't corrupt it.
+        with open(self.state_file + ".tmp", "w") as state_file:
+            json.dump(self.state, state_file, indent=2)
+        os.replace(self.state_file + ".tmp", self.state_file)
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.deletion import purge_book
+from core.models import BookDeletion
+
+
+class Command(BaseCommand):
+    help = (
+        "Purge deleted books that haven't been purged yet, e.g. because the process "
+        "purging them in the background was restarted. Safe to run at any time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.BOOK_PURGE_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        deletions = BookDeletion.objects.filter(finished_on__isnull=True)
+        for deletion in deletions.order_by("created_on"):
+            purge_book(deletion, batch_size=options["batch_size"])
+            self.stdout.write(
+                f"Purged '{deletion.title}': {deletion.deleted_rows} rows"
+            )
@@ -0,0 +1,98 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Q
+
+from core.models import Article, Comment
+from core.sanitization import ALLOWLIST_VERSION, hash_html, sanitize_html
+
+# Model and the HTML field that has a sanitized copy.
+SOURCES = {
+    "article": (Article, "article_html"),
+    "comment": (Comment, "comment_html"),
+}
+
+
+def sanitize_batch(rows):
+    """Runs in a worker process: no database access here."""
+    return [(pk, sanitize_html(html), hash_html(html)) for pk, html in rows]
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill sanitized copies of article and comment HTML that are missing or "
+        "were sanitized with an older allow-list."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--model",
+            choices=[*SOURCES, "all"],
+            default="all",
+            help="What to backfill.",
+        )
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument(
+            "--workers", type=int, default=None, help="Defaults to the number of CPUs."
+        )
+
+    def handle(self, *args, **options):
+        names = SOURCES if options["model"] == "all" else [options["model"]]
+        for name in names:
+            model, field = SOURCES[name]
+            count = self.backfill(
+                model, field, options["batch_size"], options["workers"]
+            )
+            self.stdout.write(f"{name}: sanitized {count} rows")
+
+    def get_batches(self, model, field, batch_size):
+        """Yield (pk, html) batches of stale rows, paging by primary key."""
+        stale = model.objects.filter(
+            ~Q(sanitizer_version=ALLOWLIST_VERSION) | Q(**{f"{field}_hash": ""})
+        ).order_by("pk")
+        last_pk = 0
+        while True:
+            rows = list(
+                stale.filter(pk__gt=last_pk).values_list("pk", field)[:batch_size]
+            )
+            if not rows:
+                return
+            last_pk = rows[-1][0]
+            yield rows
+
+    def backfill(self, model, field, batch_size, workers):
+        count = 0
+        workers = workers or os.cpu_count() or 1
+        batches = self.get_batches(model, field, batch_size)
+        # Worker processes must not inherit an open database connection.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Keep a bounded number of batches in flight so memory stays flat.
+            in_flight = set()
+            max_in_flight = 2 * workers
+            for rows in batches:
+                in_flight.add(pool.submit(sanitize_batch, rows))
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    count += self.save_results(model, field, done)
+            count += self.save_results(model, field, in_flight)
+        return count
+
+    def save_results(self, model, field, futures):
+        count = 0
+        for future in futures:
+            objs = [
+                model(
+                    pk=pk,
+                    sanitizer_version=ALLOWLIST_VERSION,
+                    **{f"{field}_sanitized": sanitized, f"{field}_hash": html_hash},
+                )
+                for pk, sanitized, html_hash in future.result()
+            ]
+            model.objects.bulk_update(
+                objs, [f"{field}_sanitized", f"{field}_hash", "sanitizer_version"]
+            )
+            count += len(objs)
+        return count
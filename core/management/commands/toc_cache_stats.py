@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.cache import get_toc_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counters of the table of contents cache."
+
+    def handle(self, *args, **options):
+        stats = get_toc_cache_stats()
+        total = stats["hits"] + stats["misses"]
+        ratio = stats["hits"] / total if total else 0
+        self.stdout.write(
+            f"hits: {stats['hits']}, misses: {stats['misses']}, hit ratio: {ratio:.1%}"
+        )
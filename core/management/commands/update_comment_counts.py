@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from core.counters import compact_comment_counts, repair_comment_counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Add pending changes to the comment counters of annotations and comments. "
+        "Safe to run at any time, e.g. every minute from cron. With --repair, "
+        "recompute all of them from the comments instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--repair", action="store_true")
+
+    def handle(self, *args, **options):
+        if options["repair"]:
+            repair_comment_counts()
+            self.stdout.write("Recomputed comment counts")
+            return
+        compacted = compact_comment_counts(batch_size=options["batch_size"])
+        if compacted:
+            self.stdout.write(f"Added {compacted} pending changes to comment counts")
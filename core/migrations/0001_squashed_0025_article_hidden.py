@@ -28,16 +28,19 @@ def initialize_slug_section(apps, schema_editor):
         article.save()
 
 
-from core.models import Article
-
-
 def initialize_slug_full(apps, schema_editor):
-    """Initialize slug_full field by looping through ancestors."""
+    """
+    Initialize slug_full field by looping through ancestors.
+    Uses the historical model (ancestors are path prefixes, steplen 4) since the
+    current model may have columns that don't exist yet at this point.
+    """
+    Article = apps.get_model("core", "Article")
+    slug_sections = dict(Article.objects.values_list("path", "slug_section"))
     for article in Article.objects.all():
-        slugs = []
-        for ancestor in article.get_ancestors():
-            slugs.append(ancestor.slug_section)
-        slugs.append(article.slug_section)
+        slugs = [
+            slug_sections[article.path[:end]]
+            for end in range(4, len(article.path) + 1, 4)
+        ]
         article.slug_full = "/".join(slugs)
         article.save()
 
@@ -0,0 +1,55 @@
+# Generated by Django 4.2 on 2026-10-17 20:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+STEPLEN = 4
+
+
+def build_navigation(apps, schema_editor):
+    """Link every article to its neighbours in depth-first (path) order."""
+    Article = apps.get_model("core", "Article")
+    changed = []
+    previous = None
+    for article in Article.objects.order_by("path").only("pk", "path").iterator():
+        if previous and previous.path[:STEPLEN] == article.path[:STEPLEN]:
+            previous.next_node_id = article.pk
+            article.prev_node_id = previous.pk
+        changed.append(article)
+        previous = article
+    Article.objects.bulk_update(changed, ["prev_node", "next_node"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0028_alter_bookmark_book"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="article",
+            name="next_node",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="core.article",
+            ),
+        ),
+        migrations.AddField(
+            model_name="article",
+            name="prev_node",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="core.article",
+            ),
+        ),
+        migrations.RunPython(build_navigation, migrations.RunPython.noop),
+    ]
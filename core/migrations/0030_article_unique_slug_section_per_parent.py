@@ -0,0 +1,99 @@
+# Generated by Django 4.2 on 2026-10-17 20:59
+
+from django.db import migrations, models
+from django.db.models import Count, Value
+from django.db.models.functions import Concat, Length, Substr
+import django.db.models.expressions
+import django.db.models.functions.text
+
+STEPLEN = 4
+
+
+def dedupe_sibling_slugs(apps, schema_editor):
+    """
+    Give all but the first of siblings that share a slug the next free one
+    ("chapter-2", ...), along with the slug_full of their subtrees, so that the
+    constraint can be added. (slug_full is unique, so this only finds siblings whose
+    slug_full had gone stale.)
+    """
+    Article = apps.get_model("core", "Article")
+    groups = (
+        Article.objects.annotate(parent=Substr("path", 1, Length("path") - STEPLEN))
+        .values("parent", "slug_section")
+        .annotate(count=Count("pk"))
+        .filter(count__gt=1)
+    )
+    duplicates = []
+    for group in groups:
+        siblings = Article.objects.filter(
+            path__startswith=group["parent"],
+            depth=len(group["parent"]) // STEPLEN + 1,
+            slug_section=group["slug_section"],
+        )
+        duplicates += siblings.order_by("path").values_list("pk", flat=True)[1:]
+    for pk in duplicates:
+        article = Article.objects.get(pk=pk)
+        parent_slug_full = (
+            Article.objects.filter(path=article.path[:-STEPLEN])
+            .values_list("slug_full", flat=True)
+            .first()
+        )
+        slug = article.slug_section
+        taken = set(
+            Article.objects.filter(
+                path__startswith=article.path[:-STEPLEN],
+                depth=article.depth,
+                slug_section__startswith=f"{slug}-",
+            ).values_list("slug_section", flat=True)
+        )
+        count = 1
+        while True:
+            count += 1
+            slug_section = f"{slug}-{count}"
+            slug_full = (
+                f"{parent_slug_full}/{slug_section}"
+                if parent_slug_full
+                else slug_section
+            )
+            if (
+                slug_section not in taken
+                and not Article.objects.filter(slug_full=slug_full).exists()
+            ):
+                break
+        old_slug_full = article.slug_full
+        Article.objects.filter(pk=pk).update(
+            slug_section=slug_section, slug_full=slug_full
+        )
+        Article.objects.filter(
+            path__startswith=article.path, depth__gt=article.depth
+        ).update(
+            slug_full=Concat(
+                Value(slug_full + "/"), Substr("slug_full", len(old_slug_full) + 2)
+            )
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0029_article_navigation"),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_sibling_slugs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="article",
+            constraint=models.UniqueConstraint(
+                django.db.models.functions.text.Substr(
+                    "path",
+                    1,
+                    django.db.models.expressions.CombinedExpression(
+                        django.db.models.functions.text.Length("path"),
+                        "-",
+                        models.Value(4),
+                    ),
+                ),
+                models.F("slug_section"),
+                name="unique_slug_section_per_parent",
+            ),
+        ),
+    ]
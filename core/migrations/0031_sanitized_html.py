@@ -0,0 +1,42 @@
+# Generated by Django 4.2 on 2026-10-17 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0030_article_unique_slug_section_per_parent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="article",
+            name="article_html_hash",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="article",
+            name="article_html_sanitized",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name="article",
+            name="sanitizer_version",
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="comment_html_hash",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="comment_html_sanitized",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="sanitizer_version",
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-17 21:08
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0031_sanitized_html"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                models.OrderBy(models.F("updated_on"), descending=True),
+                models.OrderBy(models.F("id"), descending=True),
+                condition=models.Q(("depth", 1)),
+                name="article_book_updated_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                fields=["author"],
+                condition=models.Q(("depth", 1)),
+                name="article_book_author_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                django.db.models.functions.text.Upper("title"),
+                condition=models.Q(("depth", 1)),
+                name="article_book_title_idx",
+            ),
+        ),
+    ]
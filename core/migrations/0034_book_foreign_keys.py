@@ -0,0 +1,85 @@
+# Generated by Django 4.2 on 2026-10-17 21:42
+
+from django.db import migrations, models, transaction
+import django.db.models.deletion
+
+
+BATCH_SIZE = 1000
+
+
+def backfill_books(apps, schema_editor):
+    """
+    Point articles, annotations and comments at their book. Each batch is committed
+    on its own (the migration isn't atomic), so that a big table isn't locked in one
+    long transaction, and a migration that was interrupted picks up where it stopped.
+    """
+    Article = apps.get_model("core", "Article")
+    Annotation = apps.get_model("core", "Annotation")
+    Comment = apps.get_model("core", "Comment")
+    books = list(Article.objects.filter(depth=1).values_list("pk", "path"))
+    for book_id, path in books:
+        _update_in_batches(
+            Article.objects.filter(path__startswith=path, book__isnull=True), book_id
+        )
+        for model in (Annotation, Comment):
+            _update_in_batches(
+                model.objects.filter(article__path__startswith=path, book__isnull=True),
+                book_id,
+            )
+
+
+def _update_in_batches(queryset, book_id):
+    while True:
+        pks = list(queryset.values_list("pk", flat=True)[:BATCH_SIZE])
+        if not pks:
+            return
+        with transaction.atomic():
+            queryset.model.objects.filter(pk__in=pks).update(book_id=book_id)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("core", "0033_book_deletion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="annotation",
+            name="book",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="core.article",
+            ),
+        ),
+        migrations.AddField(
+            model_name="article",
+            name="book",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="core.article",
+            ),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="book",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="core.article",
+            ),
+        ),
+        migrations.RunPython(backfill_books, migrations.RunPython.noop),
+    ]
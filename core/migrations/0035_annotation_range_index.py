@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-17 21:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0034_book_foreign_keys"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="annotation",
+            index=models.Index(
+                fields=["article", "highlight_start", "highlight_end"],
+                name="annotation_article_range_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,112 @@
+# Generated by Django 4.2 on 2026-10-17 22:06
+
+from django.db import migrations, models, transaction
+import django.db.models.deletion
+
+
+ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+OLD_STEPLEN = 4
+TIME_DIGITS = 10
+RANDOM_DIGITS = 5
+
+
+def path_step(microseconds):
+    """A step of a new comment path, as Comment.save() makes them, minus the random."""
+    value = microseconds * len(ALPHABET) ** RANDOM_DIGITS
+    digits = []
+    for _ in range(TIME_DIGITS + RANDOM_DIGITS):
+        value, digit = divmod(value, len(ALPHABET))
+        digits.append(ALPHABET[digit])
+    return "".join(reversed(digits))
+
+
+def thread_comments(apps, schema_editor):
+    """
+    Point every comment at its parent and thread, and give it a path of the new kind,
+    in which siblings keep the order treebeard gave them. Each thread is rewritten
+    in a transaction of its own (the migration isn't atomic), and a migration that
+    was interrupted picks up with the threads that are left.
+    """
+    Comment = apps.get_model("core", "Comment")
+    while True:
+        root = (
+            Comment.objects.filter(depth=1, thread__isnull=True)
+            .order_by("path")
+            .first()
+        )
+        if root is None:
+            return
+        with transaction.atomic():
+            comments = list(
+                Comment.objects.filter(
+                    path__startswith=root.path, thread__isnull=True
+                ).order_by("path")
+            )
+            # Old path -> the comment, and the last step given to one of its replies.
+            rewritten = {}
+            last_step = {}
+            for comment in comments:
+                old_path = comment.path
+                parent = rewritten.get(old_path[:-OLD_STEPLEN])
+                parent_path = parent.path if parent else ""
+                # created_on is the time of the last edit, so it is only a hint.
+                step = int(comment.created_on.timestamp() * 1_000_000)
+                step = max(step, last_step.get(parent_path, -1) + 1)
+                last_step[parent_path] = step
+                comment.parent = parent
+                comment.thread = root
+                comment.path = parent_path + path_step(step)
+                rewritten[old_path] = comment
+            Comment.objects.bulk_update(
+                comments, ["parent", "thread", "path"], batch_size=1000
+            )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("core", "0035_annotation_range_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="parent",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="replies",
+                to="core.comment",
+            ),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="thread",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="core.comment",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="comment",
+            name="path",
+            field=models.CharField(editable=False, max_length=1020, unique=True),
+        ),
+        migrations.RunPython(thread_comments, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="comment",
+            name="numchild",
+        ),
+        migrations.AlterField(
+            model_name="comment",
+            name="depth",
+            field=models.PositiveIntegerField(editable=False),
+        ),
+    ]
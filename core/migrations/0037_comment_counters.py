@@ -0,0 +1,85 @@
+# Generated by Django 4.2 on 2026-10-17 22:15
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def count_comments(apps, schema_editor):
+    """Fill in the counters, as repair_comment_counts() does."""
+    Annotation = apps.get_model("core", "Annotation")
+    Comment = apps.get_model("core", "Comment")
+
+    def count(rows):
+        rows = rows.annotate(count=Count("pk")).values("count")
+        return Coalesce(Subquery(rows), 0)
+
+    comments = Comment.objects.filter(annotation=OuterRef("pk")).order_by()
+    Annotation.objects.update(
+        comment_count=count(comments.values("annotation")),
+        thread_count=count(comments.filter(depth=1).values("annotation")),
+    )
+    replies = Comment.objects.filter(parent=OuterRef("pk")).order_by()
+    Comment.objects.update(reply_count=count(replies.values("parent")))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0036_comment_threads"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="annotation",
+            name="comment_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="annotation",
+            name="thread_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="reply_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name="CommentCountDelta",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("comments", models.IntegerField()),
+                ("replies", models.IntegerField()),
+                (
+                    "annotation",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="core.annotation",
+                    ),
+                ),
+                (
+                    "parent",
+                    models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="core.comment",
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(count_comments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2 on 2026-10-17 22:26
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef, Q
+
+
+def remove_duplicate_bookmarks(apps, schema_editor):
+    """Keep only the most recently updated bookmark of every user in every book."""
+    Bookmark = apps.get_model("core", "Bookmark")
+    newer = Bookmark.objects.filter(
+        Q(updated_on__gt=OuterRef("updated_on"))
+        | Q(updated_on=OuterRef("updated_on"), pk__gt=OuterRef("pk")),
+        user=OuterRef("user"),
+        book=OuterRef("book"),
+    )
+    Bookmark.objects.filter(Exists(newer)).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0037_comment_counters"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_bookmarks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="bookmark",
+            constraint=models.UniqueConstraint(
+                fields=("user", "book"), name="unique_bookmark_per_user_book"
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-17 22:43
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0038_bookmark_per_user_book"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="article",
+            name="article_book_title_idx",
+        ),
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("title"),
+                    name="text_pattern_ops",
+                ),
+                condition=models.Q(("depth", 1)),
+                name="article_book_title_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
+
+STEPLEN = 4
+SLUG = "move"
+
+
+def rename_move_sections(apps, schema_editor):
+    """
+    Sections slugged "move" were hidden by the move route. Give them the next
+    free slug ("move-2", ...) and rewrite the slug_full of their subtrees.
+    """
+    Article = apps.get_model("core", "Article")
+    sections = Article.objects.filter(depth__gt=1, slug_section=SLUG)
+    for pk in sections.order_by("depth").values_list("pk", flat=True):
+        # Renaming an ancestor may have changed slug_full since.
+        article = Article.objects.get(pk=pk)
+        taken = set(
+            Article.objects.filter(
+                path__startswith=article.path[:-STEPLEN],
+                depth=article.depth,
+                slug_section__startswith=f"{SLUG}-",
+            ).values_list("slug_section", flat=True)
+        )
+        count = 2
+        while f"{SLUG}-{count}" in taken:
+            count += 1
+        slug_section = f"{SLUG}-{count}"
+        old_slug_full = article.slug_full
+        slug_full = old_slug_full[: -len(SLUG)] + slug_section
+        Article.objects.filter(pk=pk).update(
+            slug_section=slug_section, slug_full=slug_full
+        )
+        Article.objects.filter(slug_full__startswith=old_slug_full + "/").update(
+            slug_full=Concat(
+                Value(slug_full + "/"), Substr("slug_full", len(old_slug_full) + 2)
+            )
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0040_reserve_annotations_slug"),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_move_sections, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,8 @@
+import hashlib
+
 from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers, quote_etag
 
 from rest_framework import status
 from rest_framework.response import Response
@@ -76,3 +79,39 @@ class MultipleFieldLookupMixin:
         obj = get_object_or_404(queryset, **filter)  # Lookup the object
         self.check_object_permissions(self.request, obj)
         return obj
+
+
+class ConditionalGetMixin:
+    """
+    Answer GET requests with a strong ETag, and with 304 Not Modified when the
+    client's If-None-Match already matches.
+
+    Views implement `get_etag_parts()`, which should be a cheap query (no full
+    objects, no serializers) returning everything the response depends on, or None if
+    there's nothing to tag (e.g. not found, which then goes through the normal path).
+    Anything that depends on the user has to be part of the tag.
+    """
+
+    # Request headers that change the response, e.g. Authorization if it depends on
+    # who the user is.
+    etag_vary = ()
+
+    def get_etag_parts(self):
+        raise NotImplementedError
+
+    def get_etag(self):
+        parts = self.get_etag_parts()
+        if parts is None:
+            return None
+        digest = hashlib.sha256(repr(parts).encode()).hexdigest()
+        return quote_etag(digest[:32])
+
+    def get(self, request, *args, **kwargs):
+        etag = self.get_etag()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+            if etag is not None and response.status_code == 200:
+                response["ETag"] = etag
+        patch_vary_headers(response, self.etag_vary)
+        return response
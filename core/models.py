@@ -1,12 +1,24 @@
 from slugify import slugify
+import secrets
+import time
 import uuid
 
 from django.conf import settings
-from django.core.exceptions import ObjectDoesNotExist
-from django.db import models
+from django.contrib.postgres.indexes import OpClass
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Concat, Length, Substr, Upper
 from django.utils.timezone import make_aware
 
-from treebeard.mp_tree import MP_Node
+from treebeard.exceptions import (
+    InvalidMoveToDescendant,
+    InvalidPosition,
+    PathOverflow,
+)
+from treebeard.mp_tree import MP_Node, MP_NodeManager, MP_NodeQuerySet
+
+from .cache import bump_book_version
+from .sanitization import update_sanitized_html
 
 
 """
@@ -17,6 +29,86 @@ Decision to use MP_Node is as follows:
 4) We want a path field to uniquely identify the resource.
 """
 
+# How many times to pick a new slug when a concurrent save took ours.
+SLUG_ATTEMPTS = 3
+# Slugs that sections can't have, since articles/<path>/<slug>/ is another route
+# (see core/urls.py).
+RESERVED_SLUGS = {"annotations", "move"}
+
+# A step of a comment path is the time in microseconds and then random digits, see
+# comment_path_step(). 10 digits of time last until 2084.
+COMMENT_TIME_DIGITS = 10
+COMMENT_RANDOM_DIGITS = 5
+# How many times to pick a new path step when a concurrent reply took ours.
+COMMENT_PATH_ATTEMPTS = 3
+
+# Largest value of one step of a path, e.g. "ZZZZ".
+MAX_STEP = len(MP_Node.alphabet) ** MP_Node.steplen - 1
+# Space left between siblings placed with add-sibling or by rebalancing, so that
+# nodes can later be inserted between them without moving anything.
+SIBLING_GAP = len(MP_Node.alphabet) ** (MP_Node.steplen // 2)
+
+
+def comment_path_step():
+    """
+    A step of a comment path, in treebeard's alphabet so that it sorts the same way:
+    when the comment was made, so that replies sort oldest first, and random digits
+    so that replies made at the same time by other processes don't collide. Nothing
+    is read to make one.
+    """
+    alphabet = MP_Node.alphabet
+    base = len(alphabet)
+    value = time.time_ns() // 1000 * base**COMMENT_RANDOM_DIGITS
+    value += secrets.randbelow(base**COMMENT_RANDOM_DIGITS)
+    digits = []
+    for _ in range(COMMENT_TIME_DIGITS + COMMENT_RANDOM_DIGITS):
+        value, digit = divmod(value, base)
+        digits.append(alphabet[digit])
+    return "".join(reversed(digits))
+
+
+def fields_except(instance, excluded):
+    """Names of the fields save() writes, less `excluded`, for its update_fields."""
+    return [
+        field.name
+        for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name not in excluded
+    ]
+
+
+def next_free_slug(slug, taken):
+    """
+    Return `slug`, or `slug-N` with the smallest N >= 2 that isn't in `taken`.
+    Reserved slugs always get a number.
+    """
+    if slug not in taken and slug not in RESERVED_SLUGS:
+        return slug
+    count = 2
+    while f"{slug}-{count}" in taken:
+        count += 1
+    return f"{slug}-{count}"
+
+
+class ArticleQuerySet(MP_NodeQuerySet):
+    def delete(self, *args, **kwargs):
+        """Deleting nodes changes the reading order and TOC of their books."""
+        root_paths = {
+            path[: Article.steplen] for path in self.values_list("path", flat=True)
+        }
+        result = super().delete(*args, **kwargs)
+        for root_path in root_paths:
+            Article.rebuild_navigation(root_path)
+            bump_book_version(root_path)
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class ArticleManager(MP_NodeManager):
+    def get_queryset(self):
+        return ArticleQuerySet(self.model).order_by("path")
+
 
 class Article(MP_Node):
     """Text: Anything that can be read by a user."""
@@ -39,6 +131,84 @@ class Article(MP_Node):
         blank=True, help_text="Text output from WYSIWYG editor."
     )
     hidden = models.BooleanField(default=False)
+    # Sanitized copy of article_html, see core/sanitization.py
+    article_html_sanitized = models.TextField(blank=True, editable=False)
+    article_html_hash = models.CharField(max_length=64, blank=True, editable=False)
+    sanitizer_version = models.CharField(max_length=16, blank=True, editable=False)
+    # Reading order (depth-first) within a book, so that prev/next are a single
+    # lookup instead of a walk up and down the tree.
+    prev_node = models.ForeignKey(
+        "self",
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.SET_NULL,
+        related_name="+",
+    )
+    next_node = models.ForeignKey(
+        "self",
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.SET_NULL,
+        related_name="+",
+    )
+    # Root of the node's book (a book is its own), so that book-wide lookups are an
+    # equality filter instead of a path prefix or get_root().
+    book = models.ForeignKey(
+        "self",
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    # Set on every node of a book that is being deleted in the background (see
+    # core/deletion.py). Such rows are left out of every query until they are gone.
+    pending_deletion = models.BooleanField(default=False, editable=False)
+
+    objects = ArticleManager()
+
+    class Meta:
+        constraints = [
+            # Slugs are unique among siblings, i.e. per parent path.
+            models.UniqueConstraint(
+                Substr("path", 1, Length("path") - MP_Node.steplen),
+                "slug_section",
+                name="unique_slug_section_per_parent",
+            ),
+        ]
+        # Library listing: books (root articles) only, newest first.
+        indexes = [
+            models.Index(
+                F("updated_on").desc(),
+                F("id").desc(),
+                condition=Q(depth=1),
+                name="article_book_updated_idx",
+            ),
+            models.Index(
+                fields=["author"],
+                condition=Q(depth=1),
+                name="article_book_author_idx",
+            ),
+            # Title prefix search is case-insensitive, i.e. UPPER(title) LIKE 'X%'.
+            # The operator class lets it use the index whatever the collation.
+            models.Index(
+                OpClass(Upper("title"), name="text_pattern_ops"),
+                condition=Q(depth=1),
+                name="article_book_title_idx",
+            ),
+        ]
+
+    # The title as loaded from (or last saved to) the database, see update_slug().
+    _saved_title = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if "title" in field_names:
+            instance._saved_title = values[field_names.index("title")]
+        return instance
 
     @property
     def children(self):
@@ -52,46 +222,13 @@ class Article(MP_Node):
 
     @property
     def next(self):
-        """Get next node (excluding root nodes)."""
-        try:
-            if self.get_first_child():
-                return self.get_first_child()
-            if self.get_next_sibling():
-                return self.get_next_sibling()
-            current_node = self
-            while current_node:
-                parent = current_node.get_parent()
-                if not parent or parent.is_root():
-                    # Don't want to jump to another book.
-                    return None
-                if parent and parent.get_next_sibling():
-                    return parent.get_next_sibling()
-                current_node = parent
-            return None
-        except ObjectDoesNotExist:
-            return None
+        """Get next node in reading order (never crosses into another book)."""
+        return self.next_node
 
     @property
     def prev(self):
-        """Get previous node (excluding root nodes)."""
-        try:
-            if self.is_root():
-                # Don't want it linking to a previous book
-                return None
-            if self.get_prev_sibling():
-                current_node = self.get_prev_sibling()
-                while current_node:
-                    child = current_node.get_last_child()
-                    if child and child.get_children().count() == 0:
-                        return child
-                    if child is None:
-                        return current_node
-                    current_node = child.get_last_child()
-            if self.get_parent():
-                return self.get_parent()
-            return None
-        except ObjectDoesNotExist:
-            return None
+        """Get previous node in reading order (never crosses into another book)."""
+        return self.prev_node
 
     # Don't think this is used anywhere except in migrations.
     # So maybe keep until we've pushed migrations to production.
@@ -107,33 +244,77 @@ class Article(MP_Node):
             return parent_slugs
         return [str(self.uuid)]
 
-    def update_slug(self):
+    def update_slug(self, keep_current=False):
         """
         Most of the logic here is to verify that slug is unique among siblings.
         For example, if slug is "chapter", and there already exists another "chapter",
         then we'll append a number to it. So the new slug will be "chapter-2".
+
+        All sibling slugs that could clash ("chapter" and "chapter-N") are fetched in
+        one query and the suffix is picked in memory. With `keep_current`, the slug is
+        left alone as long as the title is the one in the database, so that saving
+        content doesn't query the siblings or change the URL.
         """
+        if keep_current and self.slug_section and self.title == self._saved_title:
+            return
         slug = slugify(self.title, max_length=50)
-        siblings = self.get_siblings().exclude(uuid=self.uuid)
-        count = 2
-        while True:
-            filtered_siblings = siblings.filter(slug_section=slug)
-            # Don't use `if filtered_siblings is not None:` because that will check
-            # for None explicitly, which an empty queryset is not.
-            # on the other hand, an empty queryset is falsey.
-            if not filtered_siblings:
-                break
-            slug = f"{slug}-{count}"
-            count += 1
-        self.slug_section = slug
+        taken = set(
+            self.get_siblings()
+            .exclude(uuid=self.uuid)
+            .filter(Q(slug_section=slug) | Q(slug_section__startswith=f"{slug}-"))
+            .values_list("slug_section", flat=True)
+        )
+        self.slug_section = next_free_slug(slug, taken)
 
     def update_path(self):
         """Update path of node."""
         if self.is_root():
             self.slug_full = self.slug_section
+            # Still None for a new book, see _save_node().
+            self.book_id = self.pk
             return
         parent = self.get_parent()
         self.slug_full = parent.slug_full + "/" + self.slug_section
+        self.book_id = parent.book_id
+
+    def link_navigation(self):
+        """
+        Set prev/next of a node that is about to be inserted and return its neighbours.
+        Since the node has no descendants yet, its predecessor is the last node of the
+        book that comes before it in path order, and its successor is whatever that
+        predecessor used to point to.
+        """
+        root_path = self.path[: self.steplen]
+        predecessor = (
+            Article.objects.filter(path__startswith=root_path, path__lt=self.path)
+            .order_by("-path")
+            .values_list("pk", "next_node_id")
+            .first()
+        )
+        self.prev_node_id, self.next_node_id = predecessor or (None, None)
+        return self.prev_node_id, self.next_node_id
+
+    @classmethod
+    def rebuild_navigation(cls, root_path):
+        """
+        Recompute prev/next for every node of the book rooted at `root_path`.
+        Depth-first order is simply `path` order for MP_Node, so this is one ordered
+        scan followed by an update of the nodes whose neighbours changed.
+        """
+        nodes = list(
+            cls.objects.filter(path__startswith=root_path)
+            .order_by("path")
+            .values_list("pk", "prev_node_id", "next_node_id")
+        )
+        changed = []
+        for i, (pk, prev_id, next_id) in enumerate(nodes):
+            new_prev_id = nodes[i - 1][0] if i > 0 else None
+            new_next_id = nodes[i + 1][0] if i + 1 < len(nodes) else None
+            if (prev_id, next_id) != (new_prev_id, new_next_id):
+                changed.append(
+                    cls(pk=pk, prev_node_id=new_prev_id, next_node_id=new_next_id)
+                )
+        cls.objects.bulk_update(changed, ["prev_node", "next_node"], batch_size=500)
 
     @classmethod
     def create_root(cls, **data):
@@ -145,23 +326,333 @@ class Article(MP_Node):
         parent = Article.objects.get(slug_full=parent_path)
         return parent.add_child(**data)
 
+    @classmethod
+    def create_sibling(cls, sibling_path, position, **data):
+        """
+        Insert a node right "before" or "after" the node at `sibling_path`.
+
+        Unlike treebeard's add_sibling, which shifts the paths of every later sibling
+        and their descendants, the new node takes a free step between its neighbours.
+        Only when there is none are the siblings spread out again, see
+        rebalance_siblings().
+        """
+        if position not in ("before", "after"):
+            raise InvalidPosition(f"Invalid position: {position}")
+        sibling = Article.objects.get(slug_full=sibling_path)
+        if sibling.is_root():
+            raise InvalidPosition("Books can't have siblings.")
+        with transaction.atomic():
+            # Inserts (and rebalancing) under the same parent take turns.
+            parent = (
+                Article.objects.select_for_update()
+                .filter(path=sibling.path[: -cls.steplen])
+                .get()
+            )
+            sibling.refresh_from_db(fields=["path"])
+            node = cls(
+                path=sibling.get_free_sibling_path(position),
+                depth=sibling.depth,
+                numchild=0,
+                **data,
+            )
+            node.save()
+            Article.objects.filter(pk=parent.pk).update(numchild=F("numchild") + 1)
+        return node
+
+    def _free_sibling_step(self, position):
+        """Return a free step right before or after this node, or None."""
+        siblings = Article.objects.filter(
+            depth=self.depth, path__startswith=self.path[: -self.steplen]
+        )
+        step = self._str2int(self.path[-self.steplen :])
+        if position == "before":
+            neighbour = siblings.filter(path__lt=self.path).order_by("-path")
+        else:
+            neighbour = siblings.filter(path__gt=self.path).order_by("path")
+        neighbour = neighbour.values_list("path", flat=True).first()
+        if neighbour is not None:
+            bound = self._str2int(neighbour[-self.steplen :])
+        # At either end, leave a gap too rather than taking half of what's left.
+        elif position == "before":
+            bound = max(step - 2 * SIBLING_GAP, -1)
+        else:
+            bound = min(step + 2 * SIBLING_GAP, MAX_STEP + 1)
+        if abs(bound - step) < 2:
+            return None
+        return (step + bound) // 2
+
+    def get_free_sibling_path(self, position):
+        """Path for a new node right "before" or "after" this one."""
+        step = self._free_sibling_step(position)
+        if step is None:
+            self.rebalance_siblings()
+            self.refresh_from_db(fields=["path"])
+            step = self._free_sibling_step(position)
+            if step is None:
+                raise PathOverflow(f"No room next to '{self.slug_full}'")
+        return self._get_path(self.path, self.depth, step)
+
+    def rebalance_siblings(self):
+        """
+        Make room around this node by spreading out the smallest window of siblings
+        around it (doubling in size) that can be spaced at least SIBLING_GAP // 16
+        apart, or if none can, all of the siblings. Their subtrees move along, with one
+        UPDATE per node in the window.
+        """
+        paths = list(
+            Article.objects.filter(
+                depth=self.depth, path__startswith=self.path[: -self.steplen]
+            )
+            .order_by("path")
+            .values_list("path", flat=True)
+        )
+        steps = [self._str2int(path[-self.steplen :]) for path in paths]
+        index = paths.index(self.path)
+        size = 1
+        while True:
+            size *= 2
+            lo = max(index - size // 2, 0)
+            hi = min(lo + size, len(paths))
+            # Steps the window can use, excluding the nodes on either side of it.
+            low = steps[lo - 1] if lo > 0 else -1
+            high = steps[hi] if hi < len(paths) else MAX_STEP + 1
+            gap = (high - low) // (hi - lo + 1)
+            if gap >= SIBLING_GAP // 16 or (lo == 0 and hi == len(paths)):
+                break
+        if gap < 2:
+            raise PathOverflow(f"No room among the siblings of '{self.slug_full}'")
+        moves = [
+            (old, self._get_path(old, self.depth, low + gap * (i + 1)))
+            for i, old in enumerate(paths[lo:hi])
+        ]
+        # Paths are unique, so move the nodes that go right starting from the last
+        # one, then the ones that go left starting from the first one. That way no
+        # node is ever moved onto a path that is still taken.
+        right = [(old, new) for old, new in reversed(moves) if new > old]
+        left = [(old, new) for old, new in moves if new < old]
+        for old, new in right + left:
+            Article.objects.filter(path__startswith=old).update(
+                path=Concat(Value(new), Substr("path", len(old) + 1))
+            )
+
+    def rewrite_descendant_slugs(self, old_slug_full):
+        """
+        Replace the `old_slug_full` prefix of every descendant's slug_full with this
+        node's current slug_full, in a single UPDATE over the subtree.
+        """
+        old_prefix = old_slug_full + "/"
+        Article.objects.filter(
+            path__startswith=self.path,
+            depth__gt=self.depth,
+            slug_full__startswith=old_prefix,
+        ).update(
+            slug_full=Concat(
+                Value(self.slug_full + "/"),
+                Substr("slug_full", len(old_prefix) + 1),
+            )
+        )
+
     def save(self, *args, **kwargs):
         """
         This method is called by .add_root(), .add_child(), and .update().
         We override this method so that slugs are properly updated whenever we save a node.
         """
+        old_slug_full = self.slug_full
+        adding = self._state.adding
+        for attempt in range(1, SLUG_ATTEMPTS + 1):
+            try:
+                with transaction.atomic():
+                    self._save_node(old_slug_full, adding, attempt, *args, **kwargs)
+                break
+            except IntegrityError:
+                # A concurrent request can take the same slug between update_slug()
+                # and our write. The unique constraints catch it; pick another slug.
+                if attempt == SLUG_ATTEMPTS or not self._slug_is_taken():
+                    raise
+        self._saved_title = self.title
+        bump_book_version(self.path[: self.steplen])
+
+    def _save_node(self, old_slug_full, adding, attempt, *args, **kwargs):
         # Update and save this node.
-        self.update_slug()
+        self.update_slug(keep_current=not adding and attempt == 1)
         self.update_path()
+        update_sanitized_html(self, "article_html")
+        if adding:
+            prev_id, next_id = self.link_navigation()
         super().save(*args, **kwargs)
+        if adding and self.book_id is None:
+            # A new book needs its primary key before it can point at itself.
+            self.book_id = self.pk
+            Article.objects.filter(pk=self.pk).update(book=self.pk)
+        if adding:
+            if prev_id:
+                Article.objects.filter(pk=prev_id).update(next_node_id=self.pk)
+            if next_id:
+                Article.objects.filter(pk=next_id).update(prev_node_id=self.pk)
+        elif old_slug_full and old_slug_full != self.slug_full:
+            # Descendants' slugs all start with this node's slug.
+            self.rewrite_descendant_slugs(old_slug_full)
 
-        # Check if the node's children need to be updated.
-        children = self.get_children()
-        if not children:
-            return
-        for child in children:
-            if child.slug_full != self.slug_full + "/" + child.slug_section:
-                child.save()
+    def _slug_is_taken(self):
+        return (
+            Article.objects.filter(slug_full=self.slug_full)
+            .exclude(pk=self.pk)
+            .exists()
+        )
+
+    def move(self, target, pos=None):
+        """Moving a subtree changes the reading order and TOC of both books involved."""
+        old_root_path = self.path[: self.steplen]
+        super().move(target, pos)
+        new_path = (
+            Article.objects.filter(pk=self.pk).values_list("path", flat=True).get()
+        )
+        new_root_path = new_path[: self.steplen]
+        if new_root_path != old_root_path:
+            book = Article.objects.get(path=new_root_path)
+            Article.objects.filter(path__startswith=new_path).update(book=book)
+            for model in (Annotation, Comment):
+                model.objects.filter(article__path__startswith=new_path).update(
+                    book=book
+                )
+            # One bookmark per user and book: the ones that moved along are dropped
+            # where their user has a bookmark in the new book already.
+            bookmarks = Bookmark.objects.filter(article__path__startswith=new_path)
+            bookmarks.filter(
+                user__in=Bookmark.objects.filter(book=book).values("user")
+            ).delete()
+            bookmarks.update(book=book)
+        for root_path in {old_root_path, new_root_path}:
+            Article.rebuild_navigation(root_path)
+            bump_book_version(root_path)
+
+    def move_subtree(self, target, position):
+        """
+        Move this node and everything under it "before" or "after" `target`, or make
+        it the "first-child" or "last-child" of `target`, within the same book.
+
+        Unlike move() (treebeard's), which shifts siblings and then saves node by node,
+        the subtree takes a free path (see get_free_sibling_path()) and path, depth and
+        slug_full of all its nodes are rewritten in one UPDATE. The reading order is
+        spliced rather than rebuilt, so the number of queries doesn't depend on the
+        size of the subtree or the book. Annotations and bookmarks point at the rows,
+        which stay the same.
+        """
+        if position not in ("before", "after", "first-child", "last-child"):
+            raise InvalidPosition(f"Invalid position: {position}")
+        if self.is_root():
+            raise InvalidPosition("Books can't be moved.")
+        root_path = self.path[: self.steplen]
+        if not target.path.startswith(root_path):
+            raise InvalidPosition("Sections can only be moved within their book.")
+        if target.path.startswith(self.path):
+            raise InvalidMoveToDescendant("Can't move a section into itself.")
+        as_child = position.endswith("child")
+        if not as_child and target.is_root():
+            raise InvalidPosition("Books can't have siblings.")
+
+        with transaction.atomic():
+            # Moves within a book take turns, and so do inserts under the new parent.
+            parent_path = target.path if as_child else target.path[: -self.steplen]
+            locked = dict(
+                Article.objects.select_for_update()
+                .filter(path__in={root_path, parent_path})
+                .order_by("path")
+                .values_list("path", "slug_full")
+            )
+            target.refresh_from_db(fields=["path", "depth"])
+            new_path = self._free_path_at(target, position)
+            # Making room may have moved this node as well.
+            self.refresh_from_db(
+                fields=["path", "depth", "slug_section", "slug_full", "prev_node"]
+            )
+            old_path, old_depth, old_slug_full = self.path, self.depth, self.slug_full
+            new_depth = len(new_path) // self.steplen
+            subtree = Article.objects.filter(path__startswith=old_path)
+
+            # Keep the slug unless one of the new siblings has it already.
+            slug = slugify(self.title, max_length=50)
+            taken = set(
+                Article.objects.filter(depth=new_depth, path__startswith=parent_path)
+                .exclude(pk=self.pk)
+                .filter(
+                    Q(slug_section__in=[self.slug_section, slug])
+                    | Q(slug_section__startswith=f"{slug}-")
+                )
+                .values_list("slug_section", flat=True)
+            )
+            slug_section = (
+                self.slug_section
+                if self.slug_section not in taken
+                else next_free_slug(slug, taken)
+            )
+            slug_full = f"{locked[parent_path]}/{slug_section}"
+
+            # Take the subtree out of the reading order...
+            last_pk, next_id = (
+                subtree.order_by("-path").values_list("pk", "next_node_id").first()
+            )
+            prev_id = self.prev_node_id
+            Article.objects.filter(pk=prev_id).update(next_node_id=next_id)
+            if next_id:
+                Article.objects.filter(pk=next_id).update(prev_node_id=prev_id)
+
+            subtree.update(
+                path=Concat(Value(new_path), Substr("path", len(old_path) + 1)),
+                depth=F("depth") + (new_depth - old_depth),
+                slug_full=Concat(
+                    Value(slug_full), Substr("slug_full", len(old_slug_full) + 1)
+                ),
+                slug_section=Case(
+                    When(pk=self.pk, then=Value(slug_section)),
+                    default=F("slug_section"),
+                    output_field=models.TextField(),
+                ),
+            )
+
+            # ...and put it back after whatever now precedes it in path order.
+            prev_id, next_id = (
+                Article.objects.filter(path__startswith=root_path, path__lt=new_path)
+                .order_by("-path")
+                .values_list("pk", "next_node_id")
+                .first()
+            )
+            Article.objects.filter(pk=prev_id).update(next_node_id=self.pk)
+            Article.objects.filter(pk=self.pk).update(prev_node_id=prev_id)
+            Article.objects.filter(pk=last_pk).update(next_node_id=next_id)
+            if next_id:
+                Article.objects.filter(pk=next_id).update(prev_node_id=last_pk)
+
+            if old_path[: -self.steplen] != parent_path:
+                Article.objects.filter(path=old_path[: -self.steplen]).update(
+                    numchild=F("numchild") - 1
+                )
+                Article.objects.filter(path=parent_path).update(
+                    numchild=F("numchild") + 1
+                )
+        bump_book_version(root_path)
+        self.refresh_from_db()
+
+    def _free_path_at(self, target, position):
+        """Free path for a node placed at `position` relative to `target`."""
+        if position in ("before", "after"):
+            return target.get_free_sibling_path(position)
+        children = Article.objects.filter(
+            depth=target.depth + 1, path__startswith=target.path
+        )
+        if position == "first-child":
+            neighbour = children.order_by("path").first()
+            return (
+                neighbour.get_free_sibling_path("before")
+                if neighbour
+                else self._get_path(target.path, target.depth + 1, SIBLING_GAP)
+            )
+        neighbour = children.order_by("-path").first()
+        return (
+            neighbour.get_free_sibling_path("after")
+            if neighbour
+            else self._get_path(target.path, target.depth + 1, SIBLING_GAP)
+        )
 
     def __str__(self):
         return self.title + " by " + self.user.username
@@ -173,16 +664,58 @@ class Annotation(models.Model):
     uuid = models.UUIDField(db_index=True, default=uuid.uuid4, unique=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     article = models.ForeignKey(Article, on_delete=models.CASCADE)
+    # Book of `article`, see Article.book
+    book = models.ForeignKey(
+        Article,
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
     created_on = models.DateTimeField(auto_now_add=True)
     updated_on = models.DateTimeField(auto_now=True)
     highlight_start = models.PositiveIntegerField()
     highlight_end = models.PositiveIntegerField()
     highlight_backward = models.BooleanField(default=False)
     is_public = models.BooleanField(default=False)
+    # All comments on the annotation, and those that start a thread. Changes are
+    # recorded as CommentCountDeltas and added in later, see core/counters.py.
+    comment_count = models.IntegerField(default=0, editable=False)
+    thread_count = models.IntegerField(default=0, editable=False)
 
+    class Meta:
+        indexes = [
+            # Annotations overlapping a range of characters of an article, i.e.
+            # article = ? AND highlight_start < end AND highlight_end > start.
+            models.Index(
+                fields=["article", "highlight_start", "highlight_end"],
+                name="annotation_article_range_idx",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.book_id = self.article.book_id
+        if not self._state.adding:
+            kwargs.setdefault(
+                "update_fields", fields_except(self, ["comment_count", "thread_count"])
+            )
+        super().save(*args, **kwargs)
 
-class Comment(MP_Node):
-    """Comments: Can be either main post or replies."""
+
+class Comment(models.Model):
+    """
+    Comments: Can be either main post or replies.
+
+    Replies point at their `parent` and at the first comment of their `thread`. Their
+    `path` is the parent's path and a step of their own (see comment_path_step()),
+    so a thread reads in path order, and writing a reply reads and locks nothing:
+    concurrent replies to the same comment don't wait on each other.
+    """
+
+    # Length of one step of `path`, and the deepest a reply can be so that it fits.
+    steplen = COMMENT_TIME_DIGITS + COMMENT_RANDOM_DIGITS
+    max_depth = 1020 // steplen
 
     uuid = models.UUIDField(db_index=True, default=uuid.uuid4, unique=True)
     user = models.ForeignKey(
@@ -192,6 +725,36 @@ class Comment(MP_Node):
     annotation = models.ForeignKey(
         Annotation, on_delete=models.CASCADE, related_name="comments"
     )
+    # Book of `article`, see Article.book
+    book = models.ForeignKey(
+        Article,
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    parent = models.ForeignKey(
+        "self",
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.CASCADE,
+        related_name="replies",
+    )
+    # The comment that started the thread; itself for the first one.
+    thread = models.ForeignKey(
+        "self",
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    path = models.CharField(max_length=1020, unique=True, editable=False)
+    depth = models.PositiveIntegerField(editable=False)
+    # Direct replies, see Annotation.comment_count.
+    reply_count = models.IntegerField(default=0, editable=False)
     created_on = models.DateTimeField(auto_now=True)
     updated_on = models.DateTimeField(auto_now=True)
     comment_html = models.TextField(
@@ -203,19 +766,129 @@ class Comment(MP_Node):
     comment_text = models.TextField(
         blank=True, help_text="Plain-text output from rich-text editor.", default=""
     )
+    # Sanitized copy of comment_html, see core/sanitization.py
+    comment_html_sanitized = models.TextField(blank=True, editable=False)
+    comment_html_hash = models.CharField(max_length=64, blank=True, editable=False)
+    sanitizer_version = models.CharField(max_length=16, blank=True, editable=False)
 
-    @property
-    def parent(self):
-        return self.get_parent()
+    @classmethod
+    def add_root(cls, **kwargs):
+        """Start a thread."""
+        comment = cls(**kwargs)
+        comment.save()
+        return comment
+
+    def add_child(self, **kwargs):
+        """Reply to this comment."""
+        comment = type(self)(parent=self, **kwargs)
+        comment.save()
+        return comment
+
+    @classmethod
+    def stitch(cls, comments):
+        """
+        Link `comments`, fetched in path order, to their parents and children in
+        memory, so that walking the threads (e.g. CommentSerializer) doesn't query
+        per node. A parent is found by the path prefix of its children. Returns
+        `comments`.
+        """
+        by_path = {}
+        for comment in comments:
+            comment._stitched_children = []
+            parent = by_path.get(comment.path[: -cls.steplen])
+            if parent is not None:
+                comment.parent = parent
+                parent._stitched_children.append(comment)
+            by_path[comment.path] = comment
+        return comments
+
+    def save(self, *args, **kwargs):
+        update_sanitized_html(self, "comment_html")
+        self.book_id = self.article.book_id
+        if not self._state.adding:
+            kwargs.setdefault("update_fields", fields_except(self, ["reply_count"]))
+            return super().save(*args, **kwargs)
+        if self.parent_id is None:
+            self.depth = 1
+            prefix = ""
+        else:
+            self.depth = self.parent.depth + 1
+            self.thread_id = self.parent.thread_id
+            prefix = self.parent.path
+        for attempt in range(1, COMMENT_PATH_ATTEMPTS + 1):
+            self.path = prefix + comment_path_step()
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                    if self.parent_id is None:
+                        Comment.objects.filter(pk=self.pk).update(thread=self.pk)
+                        self.thread_id = self.pk
+                    CommentCountDelta.objects.create(
+                        annotation_id=self.annotation_id,
+                        parent_id=self.parent_id,
+                        comments=1,
+                        replies=1,
+                    )
+                break
+            except IntegrityError:
+                # Two replies in the same microsecond with the same random digits.
+                if (
+                    attempt == COMMENT_PATH_ATTEMPTS
+                    or not Comment.objects.filter(path=self.path).exists()
+                ):
+                    raise
+
+    def delete(self, *args, **kwargs):
+        # Replies are deleted with the comment (on_delete=CASCADE).
+        with transaction.atomic():
+            CommentCountDelta.objects.create(
+                annotation_id=self.annotation_id,
+                parent_id=self.parent_id,
+                comments=-Comment.objects.filter(path__startswith=self.path).count(),
+                replies=-1,
+            )
+            return super().delete(*args, **kwargs)
 
     @property
     def children(self):
-        return self.get_children()
+        if hasattr(self, "_stitched_children"):
+            return self._stitched_children
+        return self.replies.order_by("path")
 
     def __str__(self):
         return self.comment_html
 
 
+class CommentCountDelta(models.Model):
+    """
+    A change to Annotation.comment_count and thread_count, and to the reply_count of
+    the comment replied to (`parent`), that hasn't been added to them yet. Adding a
+    comment inserts one of these instead of updating a counter that every other
+    reply to the same thread would wait on. See core/counters.py.
+    """
+
+    # No database constraints: this table is only ever appended to and compacted,
+    # and the deltas of deleted rows are dropped when it is.
+    annotation = models.ForeignKey(
+        Annotation,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="+",
+    )
+    parent = models.ForeignKey(
+        Comment,
+        null=True,
+        blank=True,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="+",
+    )
+    # Change to Annotation.comment_count
+    comments = models.IntegerField()
+    # Change to the parent's reply_count, or to Annotation.thread_count
+    replies = models.IntegerField()
+
+
 class Bookmark(models.Model):
     """Bookmark: Keeps track of user's location in book usng range"""
 
@@ -231,3 +904,29 @@ class Bookmark(models.Model):
     updated_on = models.DateTimeField(auto_now=True)
     highlight_start = models.PositiveIntegerField()
     highlight_end = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            # One bookmark per user and book; saving one is an upsert on these, see
+            # core/bookmarks.py.
+            models.UniqueConstraint(
+                fields=["user", "book"], name="unique_bookmark_per_user_book"
+            ),
+        ]
+
+
+class BookDeletion(models.Model):
+    """BookDeletion: Progress of a book that is being deleted in the background."""
+
+    uuid = models.UUIDField(db_index=True, default=uuid.uuid4, unique=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Not a ForeignKey since the book is gone once this is finished.
+    book_uuid = models.UUIDField()
+    book_path = models.CharField(max_length=255)
+    title = models.CharField(max_length=1000)
+    created_on = models.DateTimeField(auto_now_add=True)
+    started_on = models.DateTimeField(null=True, blank=True)
+    finished_on = models.DateTimeField(null=True, blank=True)
+    # Articles, annotations, comments and bookmarks; counted when the purge starts.
+    total_rows = models.PositiveIntegerField(null=True, blank=True)
+    deleted_rows = models.PositiveIntegerField(default=0)
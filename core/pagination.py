@@ -0,0 +1,146 @@
+import json
+from base64 import b64decode, b64encode
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .threads import limit_threads, stitch_threads
+
+
+class LibraryCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the library, most recently updated books first.
+
+    Pages are fetched with `WHERE updated_on < cursor` (DRF's CursorPagination keys
+    on the first ordering field only, and skips the books that share its value with
+    an offset), so a page costs the same no matter how deep into the library it is.
+    The response includes an opaque `next` cursor. Pagination only applies when
+    `cursor` or `page_size` is passed, so clients that expect the whole library as a
+    plain list keep working.
+    """
+
+    ordering = ("-updated_on", "-id")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (
+            self.cursor_query_param not in request.query_params
+            and self.page_size_query_param not in request.query_params
+        ):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class BookAnnotationPagination(BasePagination):
+    """
+    Keyset pagination for the annotations of a book, in reading order.
+
+    Annotations are ordered by `(article path, id)` and the `next` cursor holds the
+    last pair of the page, so the next page is `WHERE (path, id) > cursor` and costs
+    the same however far into the book it is.
+    """
+
+    cursor_query_param = "cursor"
+    page_size = 200
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            path, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(article__path__gt=path) | Q(article__path=path, pk__gt=pk)
+            )
+        page = list(queryset.order_by("article__path", "pk")[: self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[: self.page_size]
+        self.last = page[-1] if page else None
+        return page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def encode_cursor(self, annotation):
+        position = json.dumps([annotation.article.path, annotation.pk])
+        return b64encode(position.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            path, pk = json.loads(b64decode(cursor.encode()))
+            return str(path), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.last)
+        )
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "chapters": data})
+
+
+class CommentThreadPagination(BasePagination):
+    """
+    Pages of comment threads: the comments of an annotation or the replies to one.
+
+    Threads are in path order and the `next` cursor is the path of the last thread of
+    the page, so the next page is `WHERE path > cursor`, less the replies of that
+    thread. Every thread comes with its first replies (see core/threads.py) and
+    `count` is how many threads there are in all. The view says whose threads they
+    are with get_thread_parent() (None for an annotation) and get_thread_count().
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = view.get_thread_count()
+        parent = view.get_thread_parent()
+        depth = parent.depth + 1 if parent else 1
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(path__gt=cursor).exclude(path__startswith=cursor)
+        comments = list(limit_threads(queryset, depth, self.page_size + 1))
+        threads = stitch_threads(comments, depth, parent)
+        self.has_next = len(threads) > self.page_size
+        page = threads[: self.page_size]
+        self.last = page[-1] if page else None
+        return page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return settings.COMMENT_THREAD_PAGE_SIZE
+        return min(max(page_size, 1), settings.COMMENT_THREAD_MAX_PAGE_SIZE)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.last.path)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {"count": self.count, "next": self.get_next_link(), "results": data}
+        )
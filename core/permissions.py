@@ -42,5 +42,7 @@ class IsOwnerOfParentArticle(permissions.BasePermission):
 
     def has_permission(self, request, view):
         parent_path = view.kwargs.get("parent_path")
-        parent = get_object_or_404(Article, slug_full=parent_path)
+        parent = get_object_or_404(
+            Article, slug_full=parent_path, pending_deletion=False
+        )
         return parent.user == request.user
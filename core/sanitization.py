@@ -0,0 +1,90 @@
+import hashlib
+import json
+
+from bleach import clean
+
+
+"""
+HTML is sanitized when it is written rather than on every read. A model with an HTML
+field `<field>` stores the sanitized copy in `<field>_sanitized`, together with a hash
+of the source in `<field>_hash` and the `sanitizer_version` (allow-list version) used.
+The copy is recomputed whenever either of those no longer match.
+"""
+
+
+allowed_tags = [
+    "a",
+    "b",
+    "blockquote",
+    "br",
+    "code",
+    "em",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "img",
+    "li",
+    "mark",
+    "ol",
+    "p",
+    "pre",
+    "strong",
+    "sup",
+    "table",
+    "tbody",
+    "td",
+    "th",
+    "tr",
+    "ul",
+]
+
+allowed_attributes = [
+    "class",
+    "href",
+    "src",
+    "target",
+]
+
+# Derived from the allow-lists, so editing them makes every stored copy stale.
+ALLOWLIST_VERSION = hashlib.sha256(
+    json.dumps([sorted(allowed_tags), sorted(allowed_attributes)]).encode()
+).hexdigest()[:16]
+
+
+def sanitize_html(html):
+    return clean(html, attributes=allowed_attributes, tags=allowed_tags, strip=True)
+
+
+def hash_html(html):
+    return hashlib.sha256(html.encode()).hexdigest()
+
+
+def update_sanitized_html(instance, field):
+    """Recompute the sanitized copy if it's stale. Returns whether it was."""
+    html = getattr(instance, field)
+    html_hash = hash_html(html)
+    if (
+        getattr(instance, f"{field}_hash") == html_hash
+        and instance.sanitizer_version == ALLOWLIST_VERSION
+    ):
+        return False
+    setattr(instance, f"{field}_sanitized", sanitize_html(html))
+    setattr(instance, f"{field}_hash", html_hash)
+    instance.sanitizer_version = ALLOWLIST_VERSION
+    return True
+
+
+def get_sanitized_html(instance, field):
+    """Return the stored sanitized copy, bringing it up to date first if needed."""
+    if update_sanitized_html(instance, field) and instance.pk:
+        type(instance).objects.filter(pk=instance.pk).update(
+            **{
+                f"{field}_sanitized": getattr(instance, f"{field}_sanitized"),
+                f"{field}_hash": getattr(instance, f"{field}_hash"),
+                "sanitizer_version": instance.sanitizer_version,
+            }
+        )
+    return getattr(instance, f"{field}_sanitized")
@@ -1,47 +1,18 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 
 from rest_framework_recursive.fields import RecursiveField
 
-from bleach import clean
-
-from .models import Article, Annotation, Bookmark, Comment
-
-allowed_tags = [
-    "a",
-    "b",
-    "blockquote",
-    "br",
-    "code",
-    "em",
-    "h1",
-    "h2",
-    "h3",
-    "h4",
-    "h5",
-    "h6",
-    "img",
-    "li",
-    "mark",
-    "ol",
-    "p",
-    "pre",
-    "strong",
-    "sup",
-    "table",
-    "tbody",
-    "td",
-    "th",
-    "tr",
-    "ul",
-]
-
-allowed_attributes = [
-    "class",
-    "href",
-    "src",
-    "target",
-]
+from .models import Article, Annotation, Bookmark, BookDeletion, Comment
+from .sanitization import get_sanitized_html
+from .counters import add_pending_replies, comment_counts, reply_count
+from .threads import (
+    limit_threads,
+    prefetched_comments,
+    stitch_threads,
+    thread_link,
+)
 
 
 class ArticleListSerializer(serializers.ModelSerializer):
@@ -71,6 +42,9 @@ class ArticleListSerializer(serializers.ModelSerializer):
     def get_bookmark_path(self, obj):
         if not self.context["request"].user.is_authenticated:
             return None
+        # The list view annotates the bookmark so it isn't queried per book.
+        if hasattr(obj, "bookmark_slug_full"):
+            return obj.bookmark_slug_full
         bookmark = obj.bookmarks.filter(user=self.context["request"].user.id).first()
         if not bookmark:
             return None
@@ -117,31 +91,53 @@ class ArticleSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         rep = super().to_representation(instance)
 
-        rep["article_html"] = clean(
-            instance.article_html,
-            attributes=allowed_attributes,
-            tags=allowed_tags,
-            strip=True,
-        )
+        rep["article_html"] = get_sanitized_html(instance, "article_html")
         return rep
 
     def get_next(self, obj):
+        # Views annotate the neighbours' slugs so they don't have to be fetched.
+        if hasattr(obj, "next_slug_full"):
+            return obj.next_slug_full
         next_node = obj.next
         if next_node:
             return next_node.slug_full
         return None
 
     def get_prev(self, obj):
+        if hasattr(obj, "prev_slug_full"):
+            return obj.prev_slug_full
         prev_node = obj.prev
         if prev_node:
             return prev_node.slug_full
         return None
 
 
+class BookSectionSerializer(serializers.ModelSerializer):
+    """Serializer for a section and its subsections, to create a whole book at once."""
+
+    children = RecursiveField(many=True, required=False)
+
+    class Meta:
+        model = Article
+        fields = [
+            "title",
+            "author",
+            "article_html",
+            "article_json",
+            "article_text",
+            "hidden",
+            "children",
+        ]
+
+
 class TableOfContentsSerializer(serializers.ModelSerializer):
-    """Serializer for Table of Contents. Includes children but the bare-minimum data."""
+    """
+    Serializer for Table of Contents. Includes children but the bare-minimum data.
 
-    children = RecursiveField(many=True, read_only=True)
+    The whole subtree is fetched with one query ordered by path (i.e. depth-first)
+    and nested in memory, instead of querying the children of every node. Set
+    `exclude_hidden` in the context to leave out hidden sections and their children.
+    """
 
     class Meta:
         model = Article
@@ -154,6 +150,39 @@ class TableOfContentsSerializer(serializers.ModelSerializer):
         ]
         read_only = ["uuid", "slug_full", "title", "level", "children"]
 
+    def to_representation(self, instance):
+        exclude_hidden = self.context.get("exclude_hidden", False)
+        nodes = (
+            Article.objects.filter(path__startswith=instance.path)
+            .order_by("path")
+            .values_list("uuid", "slug_full", "title", "depth", "path", "hidden")
+        )
+        toc = None
+        # Ancestors of the current node as (path, representation) pairs.
+        stack = []
+        for uuid, slug_full, title, depth, path, hidden in nodes:
+            while stack and not path.startswith(stack[-1][0]):
+                stack.pop()
+            if stack and stack[-1][1] is None:
+                # Inside a hidden section that has been left out.
+                continue
+            if exclude_hidden and hidden and stack:
+                stack.append((path, None))
+                continue
+            rep = {
+                "uuid": str(uuid),
+                "slug_full": slug_full,
+                "title": title,
+                "level": depth,
+                "children": [],
+            }
+            if stack:
+                stack[-1][1]["children"].append(rep)
+            else:
+                toc = rep
+            stack.append((path, rep))
+        return toc
+
 
 class CommentSerializer(serializers.ModelSerializer):
     """Serializer for Comment model."""
@@ -162,15 +191,17 @@ class CommentSerializer(serializers.ModelSerializer):
         queryset=get_user_model().objects.all(), read_only=False, slug_field="username"
     )
     article = serializers.SlugRelatedField(
-        queryset=Article.objects.all(), read_only=False, slug_field="slug_full"
+        queryset=Article.objects.filter(pending_deletion=False),
+        read_only=False,
+        slug_field="slug_full",
     )
     annotation = serializers.SlugRelatedField(
         queryset=Annotation.objects.all(), read_only=False, slug_field="uuid"
     )
 
     """
-    Since parent field is read-only in MP_Tree, we have to use a
-    custom field parent_uuid that can do both read and write.
+    Since the parent field is read-only (it is set once, when the comment is added),
+    we have to use a custom field parent_uuid that can do both read and write.
 
     If we didn't use custom field and tried to use built-in parent field,
     we would have access to the parent field when deciding whether to
@@ -179,12 +210,14 @@ class CommentSerializer(serializers.ModelSerializer):
 
     Notes:
     - In custom `.create()` method, we only use parent_uuid for deciding
-      which django-treebeard method to call,
+      whether to start a thread or reply,
     - In custom `.to_representation()` method, we fetch uuid to include
       in json response.
     """
     parent_uuid = serializers.UUIDField(required=True, allow_null=True)
     children = RecursiveField(many=True, read_only=True)
+    reply_count = serializers.SerializerMethodField()
+    more_replies = serializers.SerializerMethodField()
 
     class Meta:
         model = Comment
@@ -195,6 +228,8 @@ class CommentSerializer(serializers.ModelSerializer):
             "annotation",
             "parent_uuid",
             "children",
+            "reply_count",
+            "more_replies",
             "created_on",
             "updated_on",
             "comment_html",
@@ -203,25 +238,54 @@ class CommentSerializer(serializers.ModelSerializer):
         ]
         read_only = ["uuid", "created_on", "updated_on"]
 
+    def get_reply_count(self, instance):
+        return reply_count(instance)
+
+    def get_more_replies(self, instance):
+        # Only threads from core/threads.py are cut short, others have all children.
+        children = getattr(instance, "_stitched_children", None)
+        if children is None or self.get_reply_count(instance) <= len(children):
+            return None
+        return thread_link(
+            self.context.get("request"),
+            "comment-replies",
+            instance.uuid,
+            children[-1].path if children else None,
+        )
+
     def create(self, validated_data):
         parent_uuid = validated_data.pop("parent_uuid", None)
         if parent_uuid is not None:
             parent = Comment.objects.get(uuid=parent_uuid)
+            if parent.depth >= Comment.max_depth:
+                raise serializers.ValidationError(
+                    {"parent_uuid": "Replies can't be nested any deeper."}
+                )
             return parent.add_child(**validated_data)
         return Comment.add_root(**validated_data)
 
     def to_representation(self, instance):
         rep = super().to_representation(instance)
-        rep["parent_uuid"] = instance.parent.uuid if instance.parent else None
-        rep["comment_html"] = clean(
-            instance.comment_html,
-            attributes=allowed_attributes,
-            tags=allowed_tags,
-            strip=True,
-        )
+        rep["parent_uuid"] = instance.parent.uuid if instance.parent_id else None
+        rep["comment_html"] = get_sanitized_html(instance, "comment_html")
         return rep
 
 
+class AnnotationListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # The replies of the threads of every annotation are counted in one query.
+        annotations = list(data)
+        add_pending_replies(
+            [
+                comment
+                for annotation in annotations
+                if hasattr(annotation, "comment_threads")
+                for comment in prefetched_comments(annotation)
+            ]
+        )
+        return super().to_representation(annotations)
+
+
 class AnnotationSerializer(serializers.ModelSerializer):
     """Serializer for Annotation model."""
 
@@ -229,9 +293,47 @@ class AnnotationSerializer(serializers.ModelSerializer):
         queryset=get_user_model().objects.all(), read_only=False, slug_field="username"
     )
     article = serializers.SlugRelatedField(
-        queryset=Article.objects.all(), read_only=False, slug_field="slug_full"
+        queryset=Article.objects.filter(pending_deletion=False),
+        read_only=False,
+        slug_field="slug_full",
     )
-    comments = CommentSerializer(many=True, read_only=True)
+    comments = serializers.SerializerMethodField()
+    comment_count = serializers.SerializerMethodField()
+    thread_count = serializers.SerializerMethodField()
+    more_comments = serializers.SerializerMethodField()
+
+    def get_threads(self, instance):
+        # The views prefetch these, see core/threads.py.
+        if hasattr(instance, "comment_threads"):
+            comments = prefetched_comments(instance)
+        else:
+            comments = limit_threads(
+                instance.comments.select_related("user", "article"),
+                1,
+                settings.COMMENT_THREAD_REPLIES,
+            )
+        return stitch_threads(comments, 1)
+
+    def get_comments(self, instance):
+        threads = self.get_threads(instance)
+        return CommentSerializer(threads, many=True, context=self.context).data
+
+    def get_comment_count(self, instance):
+        return comment_counts(instance)[0]
+
+    def get_thread_count(self, instance):
+        return comment_counts(instance)[1]
+
+    def get_more_comments(self, instance):
+        threads = self.get_threads(instance)
+        if self.get_thread_count(instance) <= len(threads):
+            return None
+        return thread_link(
+            self.context.get("request"),
+            "annotation-comments",
+            instance.uuid,
+            threads[-1].path if threads else None,
+        )
 
     def validate(self, attrs):
         """Ensure highlight contains at least one character"""
@@ -241,6 +343,7 @@ class AnnotationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Annotation
+        list_serializer_class = AnnotationListSerializer
         fields = [
             "uuid",
             "user",
@@ -251,11 +354,62 @@ class AnnotationSerializer(serializers.ModelSerializer):
             "highlight_end",
             "highlight_backward",
             "comments",
+            "comment_count",
+            "thread_count",
+            "more_comments",
             "is_public",
         ]
         read_only = ["uuid", "created_on", "updated_on"]
 
 
+class AnnotationCountSerializer(AnnotationSerializer):
+    """Annotation with how many comments it has but not the comments themselves."""
+
+    comments = None
+    more_comments = None
+
+    class Meta(AnnotationSerializer.Meta):
+        list_serializer_class = serializers.ListSerializer
+        fields = [
+            field
+            for field in AnnotationSerializer.Meta.fields
+            if field not in ("comments", "more_comments")
+        ]
+
+
+class BookAnnotationSerializer(serializers.ModelSerializer):
+    """Read-only Annotation without comments, for listing a whole book."""
+
+    user = serializers.SlugRelatedField(read_only=True, slug_field="username")
+
+    class Meta:
+        model = Annotation
+        fields = [
+            "uuid",
+            "user",
+            "created_on",
+            "updated_on",
+            "highlight_start",
+            "highlight_end",
+            "highlight_backward",
+            "is_public",
+        ]
+        read_only_fields = fields
+
+
+class BookmarkArticleField(serializers.SlugRelatedField):
+    """
+    The bookmarked article, by path. Taken from context["articles"] (articles by
+    path) when the view has fetched it already.
+    """
+
+    def to_internal_value(self, data):
+        articles = self.context.get("articles", {})
+        if isinstance(data, str) and data in articles:
+            return articles[data]
+        return super().to_internal_value(data)
+
+
 class BookmarkSerializer(serializers.ModelSerializer):
     """Serializer for Bookmark model."""
 
@@ -274,8 +428,10 @@ class BookmarkSerializer(serializers.ModelSerializer):
         read_only_fields = ["uuid", "user", "book", "created_on", "updated_on"]
 
     user = serializers.SlugRelatedField(read_only=True, slug_field="username")
-    article = serializers.SlugRelatedField(
-        queryset=Article.objects.all(), read_only=False, slug_field="slug_full"
+    article = BookmarkArticleField(
+        queryset=Article.objects.filter(pending_deletion=False),
+        read_only=False,
+        slug_field="slug_full",
     )
     book = serializers.SlugRelatedField(read_only=True, slug_field="slug_full")
 
@@ -316,3 +472,21 @@ class BookmarkSerializer(serializers.ModelSerializer):
                 }
             ],
         }
+
+
+class BookDeletionSerializer(serializers.ModelSerializer):
+    """Serializer for the progress of a book deletion."""
+
+    class Meta:
+        model = BookDeletion
+        fields = [
+            "uuid",
+            "book_uuid",
+            "title",
+            "created_on",
+            "started_on",
+            "finished_on",
+            "total_rows",
+            "deleted_rows",
+        ]
+        read_only_fields = fields
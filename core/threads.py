@@ -0,0 +1,126 @@
+from operator import attrgetter
+
+from django.conf import settings
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
+from django.urls import reverse
+from rest_framework.utils.urls import replace_query_param
+
+from .counters import add_pending_replies
+from .models import Comment
+
+
+"""
+Comment threads, a few replies at a time.
+
+A popular annotation can have thousands of comments, and every reader of its chapter
+would pay for serializing all of them. Instead, only the first COMMENT_THREAD_REPLIES
+comments of every level are sent, COMMENT_THREAD_MAX_DEPTH levels deep, along with
+how many there are in total (see core/counters.py). The rest is paged through by
+path, see CommentThreadPagination.
+
+The limit is applied in the database with ROW_NUMBER() over the siblings of every
+comment (comments with the same parent), one query per level: the replies fetched are
+only those to the comments kept at the level above, so what a thread costs doesn't
+depend on its size. The rows are threaded in memory with Comment.stitch().
+"""
+
+
+def first_siblings(queryset, limit):
+    """
+    Narrow `queryset` down to the first `limit` comments of every parent (the first
+    threads of every annotation, for comments that start one), in path order.
+    """
+    siblings = [F("annotation_id"), F("parent_id")]
+    return (
+        queryset.annotate(
+            sibling_rank=Window(RowNumber(), partition_by=siblings, order_by="path")
+        )
+        .filter(sibling_rank__lte=limit)
+        .order_by("path")
+    )
+
+
+def limit_threads(queryset, depth, limit, replies=None, max_depth=None):
+    """
+    The first `limit` comments of `queryset` at `depth`, the first `replies` replies
+    to each of those, and so on, `max_depth` levels deep in all, as a list in path
+    order. Every level is one query, for the replies to the comments kept at the
+    level above only.
+    """
+    replies = replies or settings.COMMENT_THREAD_REPLIES
+    max_depth = max_depth or settings.COMMENT_THREAD_MAX_DEPTH
+    level = list(first_siblings(queryset.filter(depth=depth), limit))
+    comments = list(level)
+    for _ in range(max_depth - 1):
+        if not level:
+            break
+        level = list(first_siblings(queryset.filter(parent__in=level), replies))
+        comments += level
+    comments.sort(key=attrgetter("path"))
+    return comments
+
+
+def stitch_threads(comments, depth, parent=None):
+    """
+    Thread `comments` (from limit_threads()) and return the ones at `depth`, with
+    their replies as `children`. `parent` is the comment they reply to, if any.
+    """
+    Comment.stitch(add_pending_replies(comments))
+    threads = [comment for comment in comments if comment.depth == depth]
+    if parent is not None:
+        for comment in threads:
+            comment.parent = parent
+    return threads
+
+
+def prefetch_comment_threads():
+    """
+    Prefetches for the comment threads of annotations, as limit_threads() would
+    fetch them for each: the first threads of every annotation in one query
+    (`Annotation.comment_threads`), then the first replies to those in one query per
+    level (`Comment.first_replies`). See prefetched_comments().
+    """
+    queryset = Comment.objects.select_related("user", "article")
+    replies = first_siblings(queryset, settings.COMMENT_THREAD_REPLIES)
+    lookups = [
+        Prefetch(
+            "comments",
+            queryset=first_siblings(
+                queryset.filter(depth=1), settings.COMMENT_THREAD_REPLIES
+            ),
+            to_attr="comment_threads",
+        )
+    ]
+    path = "comment_threads"
+    for _ in range(settings.COMMENT_THREAD_MAX_DEPTH - 1):
+        lookups.append(
+            Prefetch(f"{path}__replies", queryset=replies, to_attr="first_replies")
+        )
+        path += "__first_replies"
+    return lookups
+
+
+def prefetched_comments(annotation):
+    """The comments prefetched with prefetch_comment_threads(), in path order."""
+    comments = []
+    level = annotation.comment_threads
+    while level:
+        comments += level
+        level = [
+            reply
+            for comment in level
+            for reply in getattr(comment, "first_replies", [])
+        ]
+    comments.sort(key=attrgetter("path"))
+    return comments
+
+
+def thread_link(request, view_name, uuid, after=None):
+    """URL of the page of threads of `view_name` that comes after path `after`."""
+    url = reverse(view_name, args=[uuid])
+    if request is not None:
+        url = request.build_absolute_uri(url)
+    if after is not None:
+        url = replace_query_param(url, "cursor", after)
+    return url
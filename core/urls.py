@@ -15,27 +15,54 @@ urlpatterns = [
         name="article-add-sibling",
     ),
     path("articles/add-root/", views.article_create_root_view, name="article-add-root"),
+    path("articles/add-book/", views.article_create_book_view, name="article-add-book"),
     path("articles/", views.article_list_view, name="articles"),
     path("toc/<slug_full>/", views.table_of_contents_retrieve_view, name="toc"),
     path(
-        "articles/<path:slug_full>/",
-        views.article_retrieve_update_destroy_view,
-        name="article",
+        "articles/<path:slug_full>/move/",
+        views.article_move_view,
+        name="article-move",
     ),
     path(
         "articles/<path:slug_full>/annotations/",
         views.annotation_list_create_view,
         name="annotations",
     ),
+    path(
+        "articles/<path:slug_full>/",
+        views.article_retrieve_update_destroy_view,
+        name="article",
+    ),
+    path("books/<slug_full>/export/", views.book_export_view, name="book-export"),
+    path(
+        "books/<slug_full>/annotations/",
+        views.book_annotation_list_view,
+        name="book-annotations",
+    ),
     path(
         "annotations/<uuid>/",
         views.annotation_retrieve_update_destroy_view,
         name="annotation",
     ),
+    path(
+        "annotations/<uuid>/comments/",
+        views.annotation_comment_list_view,
+        name="annotation-comments",
+    ),
+    path(
+        "deletions/<uuid>/",
+        views.book_deletion_retrieve_view,
+        name="book-deletion",
+    ),
     path("comments/", views.comment_create_view, name="comments"),
     path(
         "comments/<uuid>/", views.comment_retrieve_update_destroy_view, name="comment"
     ),
+    path(
+        "comments/<uuid>/replies/",
+        views.comment_reply_list_view,
+        name="comment-replies",
+    ),
     path("bookmarks/", views.bookmark_list_view, name="bookmarks"),
     path(
         "bookmark/<path:book>/",
@@ -1,32 +1,81 @@
 import uuid
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Q
-from django.http import Http404, HttpResponse
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Sum
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_datetime
+from django.urls import reverse
 
 from rest_framework import generics, status
 from rest_framework.authentication import TokenAuthentication, SessionAuthentication
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import (
     AllowAny,
     IsAuthenticated,
     IsAuthenticatedOrReadOnly,
 )
 from rest_framework.response import Response
+from treebeard.exceptions import (
+    InvalidMoveToDescendant,
+    InvalidPosition,
+    PathOverflow,
+)
 
 from accounts.serializers import UserSerializer
-from .mixins import AllowPUTAsCreateMixin, MultipleFieldLookupMixin
-from .models import Annotation, Article, Bookmark, Comment
+from .bookmarks import (
+    buffer_bookmark,
+    get_buffered_bookmark,
+    remember_bookmark,
+    save_bookmark,
+    with_buffered_paths,
+    with_buffered_positions,
+)
+from .cache import get_book_version, get_cached_toc
+from .deletion import mark_for_deletion
+from .export import INCLUDE_CHOICES, export_book
+from .ingest import BookImporter, read_tree, walk_tree
+from .mixins import (
+    AllowPUTAsCreateMixin,
+    ConditionalGetMixin,
+    MultipleFieldLookupMixin,
+)
+from .models import (
+    SLUG_ATTEMPTS,
+    Annotation,
+    Article,
+    BookDeletion,
+    Bookmark,
+    Comment,
+)
+from .pagination import (
+    BookAnnotationPagination,
+    CommentThreadPagination,
+    LibraryCursorPagination,
+)
 from .permissions import IsOwnerOnly, IsOwnerOfParentArticle, IsOwnerOrReadOnly
+from .sanitization import ALLOWLIST_VERSION
 from .serializers import (
+    AnnotationCountSerializer,
     AnnotationSerializer,
     ArticleSerializer,
+    BookAnnotationSerializer,
     ArticleListSerializer,
+    BookDeletionSerializer,
     BookmarkSerializer,
+    BookSectionSerializer,
     CommentSerializer,
     TableOfContentsSerializer,
 )
+from .counters import annotate_comment_counts, comment_counts, reply_count
+from .threads import (
+    limit_threads,
+    prefetch_comment_threads,
+    stitch_threads,
+)
 
 
 def index(request):
@@ -39,8 +88,41 @@ class ArticleListAPIView(generics.ListAPIView):
     authentication_classes = [TokenAuthentication]
     permission_classes = [AllowAny]
 
-    queryset = Article.get_root_nodes().filter(hidden=False)
+    queryset = Article.get_root_nodes().filter(hidden=False, pending_deletion=False)
     serializer_class = ArticleListSerializer
+    pagination_class = LibraryCursorPagination
+
+    def get_queryset(self):
+        qs = super().get_queryset().select_related("user")
+        # e.g. /api/articles/?author=Nietzsche&owner=testuser&title=thus
+        params = self.request.query_params
+        if params.get("author"):
+            qs = qs.filter(author=params["author"])
+        if params.get("owner"):
+            qs = qs.filter(user__username=params["owner"])
+        if params.get("title"):
+            qs = qs.filter(title__istartswith=params["title"])
+        if self.request.user.is_authenticated:
+            # Fetch the user's bookmark in each book in the same query.
+            bookmarks = Bookmark.objects.filter(
+                book=OuterRef("pk"), user=self.request.user
+            )
+            qs = qs.annotate(
+                bookmark_slug_full=Subquery(bookmarks.values("article__slug_full")[:1])
+            )
+        return qs
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        books = queryset if page is None else page
+        if settings.BOOKMARK_WRITE_BEHIND and request.user.is_authenticated:
+            # The database can be behind on bookmarks, see core/bookmarks.py.
+            books = with_buffered_paths(request.user, list(books))
+        serializer = self.get_serializer(books, many=True)
+        if page is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
 
 article_list_view = ArticleListAPIView.as_view()
@@ -80,6 +162,53 @@ class ArticleCreateRootAPIView(generics.CreateAPIView):
 article_create_root_view = ArticleCreateRootAPIView.as_view()
 
 
+class ArticleCreateBookAPIView(generics.CreateAPIView):
+    """
+    Create a book with all of its sections in one request, from a nested tree of
+    sections (`children`). Responds with the book's table of contents.
+    """
+
+    serializer_class = BookSectionSerializer
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def create(self, request, *args, **kwargs):
+        # Before the (recursive) validation of every section.
+        for count, depth in enumerate(walk_tree(request.data), start=1):
+            if count > settings.BOOK_CREATE_MAX_SECTIONS:
+                raise ValidationError(
+                    {
+                        "children": f"A book can have at most "
+                        f"{settings.BOOK_CREATE_MAX_SECTIONS} sections."
+                    }
+                )
+            if depth > settings.BOOK_CREATE_MAX_DEPTH:
+                raise ValidationError(
+                    {
+                        "children": f"A book can be at most "
+                        f"{settings.BOOK_CREATE_MAX_DEPTH} levels deep."
+                    }
+                )
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        records = list(read_tree(serializer.validated_data))
+        for attempt in range(1, SLUG_ATTEMPTS + 1):
+            try:
+                book = BookImporter(user=request.user).import_book(records)
+                break
+            except DjangoValidationError as e:
+                raise ValidationError(e.messages)
+            except IntegrityError:
+                # A book created at the same time took our path or slug.
+                if attempt == SLUG_ATTEMPTS:
+                    raise
+        toc = TableOfContentsSerializer(book, context=self.get_serializer_context())
+        return Response(toc.data, status=status.HTTP_201_CREATED)
+
+
+article_create_book_view = ArticleCreateBookAPIView.as_view()
+
+
 class ArticleCreateChildAPIView(generics.CreateAPIView):
     """Create a child article"""
 
@@ -112,7 +241,7 @@ class ArticleCreateChildAPIView(generics.CreateAPIView):
             return Article.create_child(
                 self.kwargs["parent_path"],
                 **serializer.validated_data,
-                user=self.request.user
+                user=self.request.user,
             )
         except Article.DoesNotExist:
             raise NotFound(detail="Parent article not found.", code=404)
@@ -122,21 +251,103 @@ article_create_child_view = ArticleCreateChildAPIView.as_view()
 
 
 class ArticleCreateSiblingAPIView(generics.CreateAPIView):
-    pass
+    """
+    Create an article right before or after another one, depending on `position`
+    ("before" or "after", the default).
+    """
+
+    serializer_class = ArticleSerializer
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated, IsOwnerOfParentArticle]
+
+    def create(self, request, *args, **kwargs):
+        """See ArticleCreateChildAPIView.create()."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        instance = self.perform_create(serializer)
+        serializer = self.get_serializer(instance)
+        headers = self.get_success_headers(serializer.data)
+        return Response(
+            serializer.data, status=status.HTTP_201_CREATED, headers=headers
+        )
+
+    def perform_create(self, serializer):
+        position = self.request.data.get("position", "after")
+        try:
+            return Article.create_sibling(
+                self.kwargs["parent_path"],
+                position,
+                **serializer.validated_data,
+                user=self.request.user,
+            )
+        except Article.DoesNotExist:
+            raise NotFound(detail="Sibling article not found.", code=404)
+        except (InvalidPosition, PathOverflow) as e:
+            raise ValidationError({"position": str(e)})
 
 
 article_create_sibling_view = ArticleCreateSiblingAPIView.as_view()
 
 
-class ArticleRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class ArticleMoveAPIView(generics.GenericAPIView):
+    """
+    Move an article, and everything under it, to another place in its book.
+    `target` is the slug_full of another article and `position` one of "before",
+    "after" (the default), "first-child" or "last-child" of it. See
+    Article.move_subtree().
+    """
+
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated, IsOwnerOnly]
+
+    queryset = Article.objects.filter(pending_deletion=False)
+    serializer_class = ArticleSerializer
+    lookup_field = "slug_full"
+
+    def post(self, request, *args, **kwargs):
+        article = self.get_object()
+        position = request.data.get("position", "after")
+        try:
+            target = self.get_queryset().get(slug_full=request.data.get("target"))
+        except Article.DoesNotExist:
+            raise ValidationError({"target": "Target article not found."})
+        try:
+            article.move_subtree(target, position)
+        except (InvalidMoveToDescendant, InvalidPosition, PathOverflow) as e:
+            raise ValidationError({"position": str(e)})
+        return Response(self.get_serializer(article).data)
+
+
+article_move_view = ArticleMoveAPIView.as_view()
+
+
+class ArticleRetrieveUpdateDestroyAPIView(
+    ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView
+):
     """View one article"""
 
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsOwnerOrReadOnly]
 
-    queryset = Article.objects.all()
+    queryset = Article.objects.filter(pending_deletion=False)
     serializer_class = ArticleSerializer
     lookup_field = "slug_full"
+    # Hidden articles are only visible to their owner.
+    etag_vary = ["Authorization"]
+
+    def get_etag_parts(self):
+        # Neighbours are linked without touching updated_on, so include them too.
+        parts = (
+            self.get_queryset()
+            .filter(slug_full=self.kwargs["slug_full"])
+            .values_list(
+                "uuid", "updated_on", "depth", "prev_slug_full", "next_slug_full"
+            )
+            .first()
+        )
+        if parts is None:
+            return None
+        return (*parts, ALLOWLIST_VERSION)
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -145,37 +356,196 @@ class ArticleRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView)
             qs = qs.filter(Q(hidden=False) | Q(user=self.request.user))
         else:
             qs = qs.filter(hidden=False)
+        # Fetch prev/next slugs in the same query instead of loading both neighbours.
+        qs = qs.select_related("user").annotate(
+            prev_slug_full=F("prev_node__slug_full"),
+            next_slug_full=F("next_node__slug_full"),
+        )
         return qs
 
     def perform_update(self, serializer):
         serializer.save(user=self.request.user)
 
+    def destroy(self, request, *args, **kwargs):
+        instance = self.get_object()
+        if not instance.is_root():
+            return super().destroy(request, *args, **kwargs)
+        # Books can be too big to delete within a request, see core/deletion.py.
+        deletion = mark_for_deletion(instance, request.user)
+        response = Response(status=status.HTTP_204_NO_CONTENT)
+        response["Location"] = reverse("book-deletion", args=[deletion.uuid])
+        return response
+
 
 article_retrieve_update_destroy_view = ArticleRetrieveUpdateDestroyAPIView.as_view()
 
 
-class TableOfContentsRetrieveView(generics.RetrieveAPIView):
+class TableOfContentsRetrieveView(ConditionalGetMixin, generics.RetrieveAPIView):
     """Get table of contents of an article"""
 
-    queryset = Article.objects.all()
+    # Only the path is needed, for the ETag and to fetch the subtree, so the article
+    # itself (e.g. its HTML) isn't loaded.
+    queryset = Article.objects.filter(pending_deletion=False).only("path")
     serializer_class = TableOfContentsSerializer
     lookup_field = "slug_full"
 
+    def get_object(self):
+        # Looked up once for the ETag and reused if the TOC has to be sent.
+        if not hasattr(self, "_object"):
+            self._object = super().get_object()
+        return self._object
+
+    def get_etag_parts(self):
+        try:
+            path = self.get_object().path
+        except Http404:
+            return None
+        # The book version changes whenever anything in the book's tree does.
+        return (
+            path,
+            get_book_version(path[: Article.steplen]),
+            self.get_serializer_context()["exclude_hidden"],
+        )
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        # e.g. /api/toc/<slug_full>/?exclude_hidden=true
+        exclude_hidden = self.request.query_params.get("exclude_hidden", "")
+        context["exclude_hidden"] = exclude_hidden.lower() in ("true", "1")
+        return context
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        serializer = self.get_serializer(instance)
+        toc = get_cached_toc(
+            instance,
+            serializer.context["exclude_hidden"],
+            lambda: dict(serializer.data),
+        )
+        return Response(toc)
+
 
 table_of_contents_retrieve_view = TableOfContentsRetrieveView.as_view()
 
 
-class AnnotationListCreateAPIView(generics.ListCreateAPIView):
+class BookExportAPIView(generics.GenericAPIView):
+    """
+    Stream a whole book as newline-delimited JSON, see core/export.py.
+
+    e.g. /api/books/<slug_full>/export/?include=annotations,comments,bookmarks
+    """
+
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    queryset = Article.objects.filter(depth=1, pending_deletion=False)
+    lookup_field = "slug_full"
+
+    def get_queryset(self):
+        # Hidden books can only be exported by their owner.
+        return (
+            super().get_queryset().filter(Q(hidden=False) | Q(user=self.request.user))
+        )
+
+    def get(self, request, *args, **kwargs):
+        book = self.get_object()
+        include = request.query_params.get("include", "").split(",")
+        include = [name for name in include if name in INCLUDE_CHOICES]
+        response = StreamingHttpResponse(
+            export_book(book, include=include, user=request.user),
+            content_type="application/x-ndjson",
+        )
+        response[
+            "Content-Disposition"
+        ] = f'attachment; filename="{book.slug_full}.ndjson"'
+        return response
+
+
+book_export_view = BookExportAPIView.as_view()
+
+
+class BookDeletionRetrieveAPIView(generics.RetrieveAPIView):
+    """Progress of a book that is being deleted, see core/deletion.py"""
+
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated, IsOwnerOnly]
+
+    queryset = BookDeletion.objects.all()
+    serializer_class = BookDeletionSerializer
+    lookup_field = "uuid"
+
+
+book_deletion_retrieve_view = BookDeletionRetrieveAPIView.as_view()
+
+
+class AnnotationListCreateAPIView(ConditionalGetMixin, generics.ListCreateAPIView):
     """View annotations with a article"""
 
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsOwnerOrReadOnly]
     serializer_class = AnnotationSerializer
+    etag_vary = ["Authorization"]
+
+    def get_etag_parts(self):
+        # Counts catch deletes, maxes catch edits (comments are nested in the list).
+        # The user is part of the tag since they also see their private annotations.
+        if self.counts_only():
+            # Only the counters are sent, see core/counters.py.
+            comments = {
+                "comments": Sum(F("comment_count") + F("pending_comments")),
+                "threads": Sum(F("thread_count") + F("pending_threads")),
+            }
+        else:
+            comments = {
+                "comments": Count("comments", distinct=True),
+                "comment_updated_on": Max("comments__updated_on"),
+            }
+        aggregates = self.get_queryset().aggregate(
+            count=Count("id", distinct=True),
+            updated_on=Max("updated_on"),
+            **comments,
+        )
+        return (
+            self.kwargs["slug_full"],
+            self.request.user.pk,
+            self.get_viewport(),
+            self.counts_only(),
+            ALLOWLIST_VERSION,
+            *aggregates.values(),
+        )
+
+    def counts_only(self):
+        # e.g. ?comments=count for how many comments there are, for badges.
+        return self.request.query_params.get("comments") == "count"
+
+    def get_serializer_class(self):
+        if self.request.method == "GET" and self.counts_only():
+            return AnnotationCountSerializer
+        return super().get_serializer_class()
+
+    def get_viewport(self):
+        """`start` and `end` query parameters, each an offset or None."""
+        viewport = []
+        for name in ("start", "end"):
+            value = self.request.query_params.get(name)
+            if value is not None:
+                try:
+                    value = int(value)
+                except ValueError:
+                    value = -1
+                if value < 0:
+                    raise ValidationError({name: "Must be a non-negative integer."})
+            viewport.append(value)
+        start, end = viewport
+        if start is not None and end is not None and end <= start:
+            raise ValidationError({"end": "Must be greater than start."})
+        return start, end
 
     def get_queryset(self):
         # SELECT Annotations for a specific Article
         qs = Annotation.objects.filter(
             article__slug_full=self.kwargs["slug_full"],
+            article__pending_deletion=False,
         )
         # SELECT public annotations or user's annotations
         # Need conditional depending on whether user is logged in or not
@@ -183,8 +553,18 @@ class AnnotationListCreateAPIView(generics.ListCreateAPIView):
             qs = qs.filter(Q(is_public=True) | Q(user=self.request.user))
         else:
             qs = qs.filter(is_public=True)
+        # e.g. ?start=1000&end=3000 for only the annotations overlapping characters
+        # 1000 to 3000, i.e. what's on screen. See Annotation's index.
+        start, end = self.get_viewport()
+        if end is not None:
+            qs = qs.filter(highlight_start__lt=end)
+        if start is not None:
+            qs = qs.filter(highlight_end__gt=start)
         # SELECT Article info as well to remove duplicate query (for SlugRelatedField)
-        qs = qs.select_related("article")
+        qs = annotate_comment_counts(qs.select_related("article", "user"))
+        if not self.counts_only():
+            # Only the first comments of every thread, see core/threads.py.
+            qs = qs.prefetch_related(*prefetch_comment_threads())
         return qs
 
     def create(self, request, *args, **kwargs):
@@ -197,16 +577,98 @@ class AnnotationListCreateAPIView(generics.ListCreateAPIView):
 annotation_list_create_view = AnnotationListCreateAPIView.as_view()
 
 
+class BookAnnotationListAPIView(generics.ListAPIView):
+    """
+    All annotations of a book that the user can see, grouped by chapter in reading
+    order, e.g. /api/books/<slug_full>/annotations/?updated_since=2024-01-01T00:00Z
+    """
+
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [AllowAny]
+    serializer_class = BookAnnotationSerializer
+    pagination_class = BookAnnotationPagination
+
+    def get_book(self):
+        books = Article.objects.filter(depth=1, pending_deletion=False)
+        if self.request.user.is_authenticated:
+            books = books.filter(Q(hidden=False) | Q(user=self.request.user))
+        else:
+            books = books.filter(hidden=False)
+        return get_object_or_404(books, slug_full=self.kwargs["slug_full"])
+
+    def get_queryset(self):
+        # One query over the book's annotations, joined to their chapter and user.
+        qs = Annotation.objects.filter(book=self.get_book())
+        if self.request.user.is_authenticated:
+            qs = qs.filter(Q(is_public=True) | Q(user=self.request.user))
+            qs = qs.filter(
+                Q(article__hidden=False) | Q(article__user=self.request.user)
+            )
+        else:
+            qs = qs.filter(is_public=True, article__hidden=False)
+        updated_since = self.request.query_params.get("updated_since")
+        if updated_since:
+            try:
+                updated_since = parse_datetime(updated_since)
+            except ValueError:
+                updated_since = None
+            if updated_since is None:
+                raise ValidationError({"updated_since": "Not a valid datetime."})
+            qs = qs.filter(updated_on__gte=updated_since)
+        return (
+            qs.select_related("user")
+            .select_related("article")
+            .only(
+                *BookAnnotationSerializer.Meta.fields,
+                "user__username",
+                "article__path",
+                "article__depth",
+                "article__slug_full",
+                "article__title",
+            )
+        )
+
+    def list(self, request, *args, **kwargs):
+        annotations = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(annotations, many=True)
+        # Annotations come in path order, so each chapter's are next to each other.
+        chapters = []
+        for annotation, data in zip(annotations, serializer.data):
+            article = annotation.article
+            if not chapters or chapters[-1]["slug_full"] != article.slug_full:
+                chapters.append(
+                    {
+                        "slug_full": article.slug_full,
+                        "title": article.title,
+                        "level": article.depth,
+                        "annotations": [],
+                    }
+                )
+            chapters[-1]["annotations"].append(data)
+        return self.get_paginated_response(chapters)
+
+
+book_annotation_list_view = BookAnnotationListAPIView.as_view()
+
+
 class AnnotationRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
     """Retrive, Update, or Delete an annotation"""
 
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsOwnerOrReadOnly]
 
-    queryset = Annotation.objects.all()
+    queryset = Annotation.objects.filter(
+        article__pending_deletion=False
+    ).select_related("article", "user")
     serializer_class = AnnotationSerializer
     lookup_field = "uuid"
 
+    def get_queryset(self):
+        # Prefetches built per request, since they depend on the settings.
+        return annotate_comment_counts(super().get_queryset()).prefetch_related(
+            *prefetch_comment_threads()
+        )
+
     def update(self, request, *args, **kwargs):
         request.data["user"] = request.user
         return super().update(request, *args, **kwargs)
@@ -217,6 +679,40 @@ annotation_retrieve_update_destroy_view = (
 )
 
 
+class AnnotationCommentListAPIView(generics.ListAPIView):
+    """
+    Page through the comments of an annotation, each with its first replies, e.g.
+    the `more_comments` link of an annotation.
+    """
+
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [AllowAny]
+    serializer_class = CommentSerializer
+    pagination_class = CommentThreadPagination
+
+    def get_annotation(self):
+        if not hasattr(self, "annotation"):
+            qs = Annotation.objects.filter(article__pending_deletion=False)
+            if self.request.user.is_authenticated:
+                qs = qs.filter(Q(is_public=True) | Q(user=self.request.user))
+            else:
+                qs = qs.filter(is_public=True)
+            self.annotation = get_object_or_404(qs, uuid=self.kwargs["uuid"])
+        return self.annotation
+
+    def get_thread_parent(self):
+        return None
+
+    def get_thread_count(self):
+        return comment_counts(self.get_annotation())[1]
+
+    def get_queryset(self):
+        return self.get_annotation().comments.select_related("user", "article")
+
+
+annotation_comment_list_view = AnnotationCommentListAPIView.as_view()
+
+
 class UserListAPIView(generics.ListAPIView):
     """View all users"""
 
@@ -235,7 +731,9 @@ class CommentCreateAPIView(generics.CreateAPIView):
     serializer_class = CommentSerializer
 
     def get_queryset(self):
-        qs = Comment.objects.filter(user=self.request.user)
+        qs = Comment.objects.filter(
+            user=self.request.user, article__pending_deletion=False
+        )
         return qs
 
     def create(self, request, *args, **kwargs):
@@ -252,10 +750,25 @@ class CommentRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView)
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsOwnerOrReadOnly]
 
-    queryset = Comment.objects.all()
+    queryset = Comment.objects.filter(article__pending_deletion=False).select_related(
+        "parent"
+    )
     serializer_class = CommentSerializer
     lookup_field = "uuid"
 
+    def get_object(self):
+        comment = super().get_object()
+        # The first replies under the comment in one query, see core/threads.py.
+        thread = Comment.objects.filter(path__startswith=comment.path).select_related(
+            "user", "article", "annotation"
+        )
+        (comment,) = stitch_threads(
+            list(limit_threads(thread, comment.depth, 1)),
+            comment.depth,
+            comment.parent,
+        )
+        return comment
+
     def update(self, request, *args, **kwargs):
         request.data["user"] = request.user
         return super().update(request, *args, **kwargs)
@@ -264,6 +777,43 @@ class CommentRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView)
 comment_retrieve_update_destroy_view = CommentRetrieveUpdateDestroyAPIView.as_view()
 
 
+class CommentReplyListAPIView(generics.ListAPIView):
+    """
+    Page through the replies to a comment, each with its first replies, e.g. the
+    `more_replies` link of a comment.
+    """
+
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [AllowAny]
+    serializer_class = CommentSerializer
+    pagination_class = CommentThreadPagination
+
+    def get_thread_parent(self):
+        if not hasattr(self, "parent"):
+            qs = Comment.objects.filter(article__pending_deletion=False)
+            if self.request.user.is_authenticated:
+                qs = qs.filter(
+                    Q(annotation__is_public=True)
+                    | Q(annotation__user=self.request.user)
+                )
+            else:
+                qs = qs.filter(annotation__is_public=True)
+            self.parent = get_object_or_404(qs, uuid=self.kwargs["uuid"])
+        return self.parent
+
+    def get_thread_count(self):
+        return reply_count(self.get_thread_parent())
+
+    def get_queryset(self):
+        parent = self.get_thread_parent()
+        return Comment.objects.filter(
+            path__startswith=parent.path, depth__gt=parent.depth
+        ).select_related("user", "article")
+
+
+comment_reply_list_view = CommentReplyListAPIView.as_view()
+
+
 class BookmarkListAPIView(generics.ListAPIView):
     """List and create Bookmarks"""
 
@@ -273,7 +823,16 @@ class BookmarkListAPIView(generics.ListAPIView):
     serializer_class = BookmarkSerializer
 
     def get_queryset(self):
-        return Bookmark.objects.filter(user=self.request.user)
+        return Bookmark.objects.filter(
+            user=self.request.user, book__pending_deletion=False
+        )
+
+    def list(self, request, *args, **kwargs):
+        if not settings.BOOKMARK_WRITE_BEHIND:
+            return super().list(request, *args, **kwargs)
+        # The database can be behind on positions, see core/bookmarks.py.
+        bookmarks = with_buffered_positions(self.get_queryset())
+        return Response(self.get_serializer(bookmarks, many=True).data)
 
 
 bookmark_list_view = BookmarkListAPIView.as_view()
@@ -293,17 +852,23 @@ class BookmarkRetrieveUpdateAPIView(
     serializer_class = BookmarkSerializer
     lookup_field = "book"
 
-    def get_book(self):
-        article = get_object_or_404(Article, slug_full=self.kwargs.get("book"))
-        book = article.get_root()
-        return book
+    def get_book_id(self):
+        queryset = Article.objects.filter(
+            slug_full=self.kwargs.get("book"), pending_deletion=False
+        )
+        return get_object_or_404(queryset.only("book_id")).book_id
 
     def get_object(self):
-        queryset = self.get_queryset()
-        # Need the .id: https://stackoverflow.com/a/71108056
-        queryset = queryset.filter(user=self.request.user.id)
-        queryset = queryset.filter(book=self.get_book())
-        obj = get_object_or_404(queryset)  # Lookup the object
+        book_id = self.get_book_id()
+        obj = None
+        if settings.BOOKMARK_WRITE_BEHIND:
+            obj = get_buffered_bookmark(self.request.user, book_id)
+        if obj is None:
+            queryset = self.get_queryset()
+            # Need the .id: https://stackoverflow.com/a/71108056
+            queryset = queryset.filter(user=self.request.user.id)
+            queryset = queryset.filter(book_id=book_id)
+            obj = get_object_or_404(queryset)  # Lookup the object
         self.check_object_permissions(self.request, obj)
         return obj
 
@@ -317,20 +882,63 @@ class BookmarkRetrieveUpdateAPIView(
         except Book.DoesNotExist:
             return Response({"book": "Not found."}, status=status.HTTP_404_NOT_FOUND)
 
-    def perform_create(self, serializer):
-        extra_kwargs = {}
-        # This checks that Article exists before creating a bookmark for it.
-        # Can't just do Article.objects.get() because that throws an error.
-        # Note: This is different from check in get_object()
-        #       that checks whether a bookmark exists.
-        queryset = Article.objects.all().filter(slug_full=self.kwargs.get("book"))
-        article = get_object_or_404(queryset)
+    def get_articles(self, *paths):
+        """The articles at `paths` with their books, by path, in one query."""
+        articles = (
+            Article.objects.filter(slug_full__in=paths, pending_deletion=False)
+            .select_related("book")
+            .only("slug_full", "book", "book__slug_full")
+        )
+        return {article.slug_full: article for article in articles}
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["articles"] = getattr(self, "articles", {})
+        return context
+
+    def update(self, request, *args, **kwargs):
+        if kwargs.get("partial"):
+            return super().update(request, *args, **kwargs)
+        # Both the book (from any of its articles) and the bookmarked article.
+        path = self.kwargs.get("book")
+        self.articles = self.get_articles(path, request.data.get("article"))
+        if path not in self.articles:
+            raise Http404
         # Important that we identify a bookmark by its root (not a specific chapter)
-        book = article.get_root()
-        extra_kwargs["book"] = book
-        serializer.save(user=self.request.user, **extra_kwargs)
+        book = self.articles[path].book
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        bookmark = None
+        if settings.BOOKMARK_WRITE_BEHIND:
+            bookmark = get_buffered_bookmark(request.user, book.pk)
+        if bookmark is not None:
+            buffer_bookmark(bookmark, **serializer.validated_data)
+            created = False
+        else:
+            bookmark, created = save_bookmark(
+                request.user, book, **serializer.validated_data
+            )
+            if settings.BOOKMARK_WRITE_BEHIND:
+                remember_bookmark(bookmark)
+        return Response(
+            self.get_serializer(bookmark).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
 
     def perform_update(self, serializer):
+        if settings.BOOKMARK_WRITE_BEHIND:
+            # Only written to the cache, see core/bookmarks.py. A PATCH can leave
+            # the article out.
+            bookmark = serializer.instance
+            position = {
+                "article": bookmark.article,
+                "highlight_start": bookmark.highlight_start,
+                "highlight_end": bookmark.highlight_end,
+                **serializer.validated_data,
+            }
+            buffer_bookmark(bookmark, **position)
+            return
         serializer.save(user=self.request.user)
 
 
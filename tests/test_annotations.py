@@ -0,0 +1,377 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from core.models import Annotation, Comment, CommentCountDelta
+from core.threads import limit_threads, prefetch_comment_threads, prefetched_comments
+
+BASE_URL = "http://localhost:8000"
+
+AUTH_BASE_URL = f"{BASE_URL}/auth"
+REGISTRATION_URL = f"{AUTH_BASE_URL}/registration/"
+
+API_BASE_URL = f"{BASE_URL}/api"
+ARTICLE_CREATE_ROOT_URL = f"{API_BASE_URL}/articles/add-root/"
+ARTICLE_DETAIL_URL = f"{API_BASE_URL}/articles"
+COMMENT_CREATE_URL = f"{API_BASE_URL}/comments/"
+
+valid_user_payload = {
+    "username": "testuser",
+    "email": "test@email.com",
+    "password1": "testpassword",
+    "password2": "testpassword",
+}
+
+valid_article_payload = {
+    "title": "Book",
+    "articleHtml": "<p>Book</p>",
+    "articleJson": "{}",
+    "articleText": "Book",
+    "hidden": False,
+}
+
+
+def generate_annotation_payload(article, start, end):
+    return {
+        "article": article,
+        "highlightStart": start,
+        "highlightEnd": end,
+        "highlightBackward": False,
+        "isPublic": True,
+    }
+
+
+class AnnotationViewportTest(APITestCase):
+    def setUp(self):
+        response = self.client.post(REGISTRATION_URL, valid_user_payload)
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + response.data["key"])
+        self.book = self.client.post(
+            ARTICLE_CREATE_ROOT_URL, valid_article_payload
+        ).data["slug_full"]
+        self.url = f"{ARTICLE_DETAIL_URL}/{self.book}/annotations/"
+        for start, end in [(0, 10), (5, 20), (20, 30), (25, 100), (100, 110)]:
+            self.client.post(
+                self.url,
+                generate_annotation_payload(self.book, start, end),
+                format="json",
+            )
+
+    def get_ranges(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return sorted((a["highlight_start"], a["highlight_end"]) for a in response.data)
+
+    def test_successful_list_annotations_overlapping_viewport(self):
+        self.assertEqual(
+            self.get_ranges(start=10, end=26), [(5, 20), (20, 30), (25, 100)]
+        )
+        # Ranges are half-open, so touching isn't overlapping.
+        self.assertEqual(self.get_ranges(start=30, end=100), [(25, 100)])
+
+    def test_successful_list_annotations_with_open_ended_viewport(self):
+        self.assertEqual(self.get_ranges(start=100), [(100, 110)])
+        self.assertEqual(self.get_ranges(end=5), [(0, 10)])
+        self.assertEqual(len(self.get_ranges()), 5)
+
+    def test_successful_viewport_is_part_of_etag(self):
+        first = self.client.get(self.url, {"start": 0, "end": 10})
+        second = self.client.get(self.url, {"start": 100, "end": 200})
+        self.assertNotEqual(first["ETag"], second["ETag"])
+
+    def test_unsuccessful_list_annotations_with_invalid_viewport(self):
+        for params in ({"start": "a"}, {"end": -1}, {"start": 10, "end": 10}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400)
+
+
+class CommentThreadTestCase(APITestCase):
+    def setUp(self):
+        response = self.client.post(REGISTRATION_URL, valid_user_payload)
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + response.data["key"])
+        self.book = self.client.post(
+            ARTICLE_CREATE_ROOT_URL, valid_article_payload
+        ).data["slug_full"]
+        self.url = f"{ARTICLE_DETAIL_URL}/{self.book}/annotations/"
+        self.first = self.annotate(0, 10)
+        self.second = self.annotate(20, 30)
+        # First annotation:
+        #   one
+        #   └── one-reply
+        #       └── one-reply-reply
+        #   two
+        self.one = self.comment(self.first, "one")
+        self.one_reply = self.comment(self.first, "one-reply", self.one)
+        self.one_reply_reply = self.comment(
+            self.first, "one-reply-reply", self.one_reply
+        )
+        self.two = self.comment(self.first, "two")
+        self.comment(self.second, "three")
+
+    def annotate(self, start, end):
+        response = self.client.post(
+            self.url,
+            generate_annotation_payload(self.book, start, end),
+            format="json",
+        )
+        return response.data["uuid"]
+
+    def comment(self, annotation, text, parent=None):
+        response = self.client.post(
+            COMMENT_CREATE_URL,
+            {
+                "article": self.book,
+                "annotation": annotation,
+                "parentUuid": parent,
+                "commentHtml": f"<p>{text}</p>",
+                "commentJson": {},
+                "commentText": text,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data["uuid"]
+
+    def get_annotation(self, annotation):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return next(a for a in response.data if a["uuid"] == annotation)
+
+    def get_comments(self, annotation):
+        return self.get_annotation(annotation)["comments"]
+
+
+class CommentThreadTest(CommentThreadTestCase):
+    def test_successful_list_annotations_with_threads(self):
+        comments = self.get_comments(self.first)
+        # The threads of the annotation, each with its replies.
+        self.assertEqual([c["comment_text"] for c in comments], ["one", "two"])
+        one, two = comments
+        self.assertIsNone(one["parent_uuid"])
+        self.assertEqual(one["reply_count"], 1)
+        (one_reply,) = one["children"]
+        self.assertEqual(one_reply["uuid"], self.one_reply)
+        self.assertEqual(str(one_reply["parent_uuid"]), self.one)
+        (one_reply_reply,) = one_reply["children"]
+        self.assertEqual(one_reply_reply["uuid"], self.one_reply_reply)
+        self.assertEqual(str(one_reply_reply["parent_uuid"]), self.one_reply)
+        self.assertEqual(two["children"], [])
+        self.assertEqual(two["reply_count"], 0)
+        self.assertIsNone(one["more_replies"])
+        self.assertEqual(len(self.get_comments(self.second)), 1)
+
+    def test_successful_list_annotations_in_constant_queries(self):
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(self.url)
+        parent = self.one_reply_reply
+        for i in range(5):
+            parent = self.comment(self.first, f"deeper {i}", parent)
+            self.comment(self.second, f"more {i}")
+        self.annotate(40, 50)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(self.url)
+        self.assertEqual(len(small), len(large))
+
+    def test_successful_reply_points_at_parent_and_thread(self):
+        one = Comment.objects.get(uuid=self.one)
+        reply = Comment.objects.get(uuid=self.one_reply_reply)
+        self.assertEqual(str(reply.parent.uuid), self.one_reply)
+        self.assertEqual(reply.thread, one)
+        self.assertEqual(one.thread, one)
+        self.assertEqual(reply.depth, 3)
+        self.assertTrue(reply.path.startswith(reply.parent.path))
+        # Replies sort in the order they were made.
+        later = [self.comment(self.first, f"later {i}", self.one) for i in range(3)]
+        self.assertEqual(
+            [str(c.uuid) for c in one.replies.order_by("path")],
+            [self.one_reply, *later],
+        )
+
+    def test_successful_delete_comment_deletes_replies(self):
+        response = self.client.delete(f"{COMMENT_CREATE_URL}{self.one}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            list(Comment.objects.values_list("comment_text", flat=True)),
+            ["two", "three"],
+        )
+
+    def test_successful_retrieve_comment_with_thread_in_constant_queries(self):
+        url = f"{COMMENT_CREATE_URL}{self.one_reply}/"
+        with CaptureQueriesContext(connection) as small:
+            response = self.client.get(url)
+        self.assertEqual(str(response.data["parent_uuid"]), self.one)
+        self.assertEqual(
+            [c["uuid"] for c in response.data["children"]], [self.one_reply_reply]
+        )
+        parent = self.one_reply_reply
+        for i in range(5):
+            parent = self.comment(self.first, f"deeper {i}", parent)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+        self.assertEqual(len(small), len(large))
+        depth = 0
+        node = response.data
+        while node["children"]:
+            node = node["children"][0]
+            depth += 1
+        # COMMENT_THREAD_MAX_DEPTH levels, then a link to the rest.
+        self.assertEqual(depth, 2)
+        self.assertEqual(node["reply_count"], 1)
+        self.assertIsNotNone(node["more_replies"])
+
+
+@override_settings(COMMENT_THREAD_REPLIES=2, COMMENT_THREAD_MAX_DEPTH=2)
+class CommentThreadPaginationTest(CommentThreadTestCase):
+    def setUp(self):
+        super().setUp()
+        # one gets 5 replies in all, two 3 more threads after it.
+        self.replies = [self.one_reply] + [
+            self.comment(self.first, f"reply {i}", self.one) for i in range(4)
+        ]
+        self.threads = [self.one, self.two] + [
+            self.comment(self.first, f"thread {i}") for i in range(3)
+        ]
+
+    def test_successful_list_annotations_with_threads(self):
+        annotation = self.get_annotation(self.first)
+        self.assertEqual(annotation["comment_count"], 11)
+        self.assertEqual(annotation["thread_count"], 5)
+        one, two = annotation["comments"]
+        self.assertEqual([one["uuid"], two["uuid"]], self.threads[:2])
+        self.assertEqual(one["reply_count"], 5)
+        self.assertEqual(two["children"], [])
+        self.assertEqual([c["uuid"] for c in one["children"]], self.replies[:2])
+        # Too deep for COMMENT_THREAD_MAX_DEPTH.
+        self.assertEqual(one["children"][0]["children"], [])
+        self.assertIsNotNone(one["children"][0]["more_replies"])
+        self.assertIsNotNone(one["more_replies"])
+        self.assertIsNotNone(annotation["more_comments"])
+        self.assertIsNone(self.get_annotation(self.second)["more_comments"])
+
+    def test_successful_threads_skip_replies_to_comments_left_out(self):
+        # Replies to a thread and a reply that don't make the cut.
+        for i in range(10):
+            self.comment(self.first, f"under thread {i}", self.threads[2])
+            self.comment(self.first, f"under reply {i}", self.replies[3])
+        kept = {self.one, self.two, *self.replies[:2]}
+        comments = limit_threads(
+            Comment.objects.filter(annotation__uuid=self.first), 1, 2
+        )
+        self.assertEqual({str(c.uuid) for c in comments}, kept)
+        annotation = Annotation.objects.prefetch_related(
+            *prefetch_comment_threads()
+        ).get(uuid=self.first)
+        comments = prefetched_comments(annotation)
+        self.assertEqual({str(c.uuid) for c in comments}, kept)
+
+    def page_through(self, url):
+        uuids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            uuids.extend(c["uuid"] for c in response.data["results"])
+            url = response.data["next"]
+        return response.data["count"], uuids
+
+    def test_successful_page_through_replies(self):
+        one = self.get_comments(self.first)[0]
+        count, uuids = self.page_through(one["more_replies"])
+        # Picks up after the replies already sent.
+        self.assertEqual(count, 5)
+        self.assertEqual(uuids, self.replies[2:])
+
+        count, uuids = self.page_through(
+            f"{COMMENT_CREATE_URL}{self.one}/replies/?page_size=2"
+        )
+        self.assertEqual(uuids, self.replies)
+
+    def test_successful_page_through_replies_with_their_replies(self):
+        response = self.client.get(
+            f"{COMMENT_CREATE_URL}{self.one}/replies/", {"page_size": 1}
+        )
+        (reply,) = response.data["results"]
+        self.assertEqual(str(reply["parent_uuid"]), self.one)
+        self.assertEqual([c["uuid"] for c in reply["children"]], [self.one_reply_reply])
+        self.assertEqual(reply["reply_count"], 1)
+
+    def test_successful_page_through_annotation_comments(self):
+        annotation = self.get_annotation(self.first)
+        count, uuids = self.page_through(annotation["more_comments"])
+        self.assertEqual(count, 5)
+        self.assertEqual(uuids, self.threads[2:])
+
+        count, uuids = self.page_through(
+            f"{API_BASE_URL}/annotations/{self.first}/comments/?page_size=2"
+        )
+        self.assertEqual(uuids, self.threads)
+
+    def test_unsuccessful_page_through_replies_of_private_annotation(self):
+        Annotation.objects.filter(uuid=self.first).update(is_public=False)
+        self.client.credentials()
+        response = self.client.get(f"{COMMENT_CREATE_URL}{self.one}/replies/")
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(f"{API_BASE_URL}/annotations/{self.first}/comments/")
+        self.assertEqual(response.status_code, 404)
+
+
+class CommentCountTest(CommentThreadTestCase):
+    def assertCounts(self, comments, threads, one_replies):
+        annotation = self.get_annotation(self.first)
+        self.assertEqual(annotation["comment_count"], comments)
+        self.assertEqual(annotation["thread_count"], threads)
+        self.assertEqual(annotation["comments"][0]["reply_count"], one_replies)
+        response = self.client.get(f"{COMMENT_CREATE_URL}{self.one}/")
+        self.assertEqual(response.data["reply_count"], one_replies)
+
+    def test_successful_counts_follow_comments(self):
+        self.assertCounts(comments=4, threads=2, one_replies=1)
+        self.comment(self.first, "another", self.one)
+        self.comment(self.first, "thread")
+        self.assertCounts(comments=6, threads=3, one_replies=2)
+        # Replies go with the comment they reply to.
+        response = self.client.delete(f"{COMMENT_CREATE_URL}{self.one_reply}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertCounts(comments=4, threads=3, one_replies=1)
+
+    def test_successful_update_comment_counts(self):
+        self.comment(self.first, "another", self.one)
+        self.client.delete(f"{COMMENT_CREATE_URL}{self.one_reply}/")
+        self.assertTrue(CommentCountDelta.objects.exists())
+        out = StringIO()
+        call_command("update_comment_counts", batch_size=2, stdout=out)
+        self.assertIn("Added 7 pending changes", out.getvalue())
+        self.assertFalse(CommentCountDelta.objects.exists())
+        annotation = Annotation.objects.get(uuid=self.first)
+        self.assertEqual((annotation.comment_count, annotation.thread_count), (3, 2))
+        self.assertEqual(Comment.objects.get(uuid=self.one).reply_count, 1)
+        self.assertCounts(comments=3, threads=2, one_replies=1)
+
+    def test_successful_repair_comment_counts(self):
+        call_command("update_comment_counts", stdout=StringIO())
+        Annotation.objects.update(comment_count=100, thread_count=100)
+        Comment.objects.update(reply_count=100)
+        call_command("update_comment_counts", repair=True, stdout=StringIO())
+        self.assertCounts(comments=4, threads=2, one_replies=1)
+        second = Annotation.objects.get(uuid=self.second)
+        self.assertEqual((second.comment_count, second.thread_count), (1, 1))
+
+    def test_successful_saving_annotation_keeps_counts(self):
+        annotation = Annotation.objects.get(uuid=self.first)
+        call_command("update_comment_counts", stdout=StringIO())
+        annotation.is_public = False
+        annotation.save()
+        annotation.refresh_from_db()
+        self.assertEqual(annotation.comment_count, 4)
+
+    def test_successful_list_annotations_counts_only(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {"comments": "count"})
+        self.assertEqual(response.status_code, 200)
+        annotation = next(a for a in response.data if a["uuid"] == self.first)
+        self.assertNotIn("comments", annotation)
+        self.assertEqual(annotation["comment_count"], 4)
+        self.assertEqual(annotation["thread_count"], 2)
+        self.assertNotIn('"core_comment"', " ".join(q["sql"] for q in queries))
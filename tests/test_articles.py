@@ -1,8 +1,19 @@
 import copy
 import itertools
-
+from importlib import import_module
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 
+from core.ingest import RootAllocator
+from core.models import Annotation, Article, Bookmark, Comment
+from core.serializers import BookSectionSerializer
+
 BASE_URL = "http://localhost:8000"
 
 AUTH_BASE_URL = f"{BASE_URL}/auth"
@@ -11,6 +22,7 @@ LOGIN_URL = f"{AUTH_BASE_URL}/login/"
 
 API_BASE_URL = f"{BASE_URL}/api"
 ARTICLE_CREATE_ROOT_URL = f"{API_BASE_URL}/articles/add-root/"
+ARTICLE_CREATE_BOOK_URL = f"{API_BASE_URL}/articles/add-book/"
 ARTICLE_LIST_URL = f"{API_BASE_URL}/articles/"
 ARTICLE_DETAIL_URL = f"{API_BASE_URL}/articles"
 
@@ -338,6 +350,76 @@ class ArticleCreateChildTest(APITestCase):
         self.assertEqual(root_articles.status_code, 200)
         self.assertEqual(len(root_articles.data), 1)
 
+    def test_successful_create_child_articles_with_same_title_get_next_free_suffix(
+        self,
+    ):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        slugs = [
+            self.client.post(self.ARTICLE_CREATE_CHILD_URL, valid_article_payload).data[
+                "slug_full"
+            ]
+            for i in range(3)
+        ]
+        parent_slug = self.parent_slug
+        self.assertEqual(
+            slugs,
+            [
+                f"{parent_slug}/test-article",
+                f"{parent_slug}/test-article-2",
+                f"{parent_slug}/test-article-3",
+            ],
+        )
+
+    def test_successful_create_child_article_when_slug_is_taken_concurrently(self):
+        parent = Article.objects.get(slug_full=self.parent_slug)
+        parent.add_child(user=parent.user, title="Test Article", article_html="<p/>")
+        update_slug = Article.update_slug
+
+        def stale_update_slug(article, keep_current=False):
+            # First attempt behaves as if the sibling above didn't exist yet.
+            if not article.slug_section:
+                article.slug_section = "test-article"
+            else:
+                update_slug(article, keep_current)
+
+        with mock.patch.object(Article, "update_slug", stale_update_slug):
+            child = parent.add_child(
+                user=parent.user, title="Test Article", article_html="<p/>"
+            )
+        self.assertEqual(child.slug_section, "test-article-2")
+
+    def test_successful_create_child_article_with_reserved_slug(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        payload = {**valid_article_payload, "title": "Annotations"}
+        response = self.client.post(self.ARTICLE_CREATE_CHILD_URL, payload)
+        self.assertEqual(response.status_code, 201)
+        slug_full = f"{self.parent_slug}/annotations-2"
+        self.assertEqual(response.data["slug_full"], slug_full)
+        response = self.client.get(f"{API_BASE_URL}/articles/{slug_full}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["title"], "Annotations")
+
+    def test_successful_rename_reserved_slugs(self):
+        rename = import_module("core.migrations.0040_reserve_annotations_slug")
+        parent = Article.objects.get(slug_full=self.parent_slug)
+        section = parent.add_child(
+            user=parent.user, title="Annotations", article_html="<p/>"
+        )
+        child = section.add_child(user=parent.user, title="Notes", article_html="<p/>")
+        # As saved before the slug was reserved.
+        Article.objects.filter(pk=section.pk).update(
+            slug_section="annotations", slug_full=f"{self.parent_slug}/annotations"
+        )
+        Article.objects.filter(pk=child.pk).update(
+            slug_full=f"{self.parent_slug}/annotations/notes"
+        )
+        rename.rename_annotations_sections(apps, None)
+        section.refresh_from_db()
+        child.refresh_from_db()
+        self.assertEqual(section.slug_section, "annotations-2")
+        self.assertEqual(section.slug_full, f"{self.parent_slug}/annotations-2")
+        self.assertEqual(child.slug_full, f"{self.parent_slug}/annotations-2/notes")
+
     # add child to a non-existent parent node
     def test_unsuccessful_create_child_article_of_nonexistent_parent(self):
         self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
@@ -356,6 +438,520 @@ class ArticleCreateChildTest(APITestCase):
         self.assertEqual(response.status_code, 403)
 
 
+def generate_section_payload(title, children=()):
+    return {
+        "title": title,
+        "articleHtml": f"<p>{title}</p>",
+        "articleJson": {},
+        "articleText": title,
+        "hidden": False,
+        "children": list(children),
+    }
+
+
+class ArticleCreateBookTest(APITestCase):
+    def setUp(self):
+        response = self.client.post(REGISTRATION_URL, valid_user_payload)
+        self.token = response.data["key"]
+
+    def test_successful_create_book(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        payload = generate_section_payload(
+            "Book",
+            [
+                generate_section_payload("Part", [generate_section_payload("Chapter")]),
+                generate_section_payload("Part"),
+            ],
+        )
+        response = self.client.post(ARTICLE_CREATE_BOOK_URL, payload, format="json")
+        self.assertEqual(response.status_code, 201)
+        toc = response.json()
+        self.assertEqual(toc["slugFull"], "book")
+        self.assertEqual(
+            [child["slugFull"] for child in toc["children"]],
+            ["book/part", "book/part-2"],
+        )
+        self.assertEqual(
+            toc["children"][0]["children"][0]["slugFull"], "book/part/chapter"
+        )
+        response = self.client.get(f"{ARTICLE_DETAIL_URL}/book/part/chapter/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["user"], "testuser")
+        self.assertEqual(response.data["prev"], "book/part")
+        self.assertEqual(response.data["next"], "book/part-2")
+
+    def test_successful_create_book_with_500_sections_in_one_request(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        payload = generate_section_payload(
+            "Book",
+            [
+                generate_section_payload(
+                    f"Part {i}",
+                    [generate_section_payload(f"Chapter {j}") for j in range(24)],
+                )
+                for i in range(20)
+            ],
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(ARTICLE_CREATE_BOOK_URL, payload, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Article.objects.count(), 501)
+        # Not one (or several) per section.
+        self.assertLess(len(queries), 50)
+
+    def test_successful_create_book_when_path_is_taken_concurrently(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        payload = generate_section_payload("Book")
+        self.client.post(ARTICLE_CREATE_BOOK_URL, payload, format="json")
+        allocate = RootAllocator.__call__
+        attempts = []
+
+        def stale_allocate(allocator, article):
+            # The first attempt behaves as if the book above didn't exist yet.
+            attempts.append(article)
+            if len(attempts) == 1:
+                article.path = Article._get_path(None, 1, 1)
+                article.slug_section = "book"
+            else:
+                allocate(allocator, article)
+
+        with mock.patch.object(RootAllocator, "__call__", stale_allocate):
+            response = self.client.post(ARTICLE_CREATE_BOOK_URL, payload, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["slugFull"], "book-2")
+        self.assertEqual(len(attempts), 2)
+
+    def test_unsuccessful_create_book_with_invalid_section(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        payload = generate_section_payload("Book", [generate_section_payload("")])
+        response = self.client.post(ARTICLE_CREATE_BOOK_URL, payload, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("children", response.data)
+        self.assertEqual(Article.objects.count(), 0)
+
+    @override_settings(BOOK_CREATE_MAX_SECTIONS=3)
+    def test_unsuccessful_create_book_with_too_many_sections(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        payload = generate_section_payload(
+            "Book", [generate_section_payload(f"Part {i}") for i in range(3)]
+        )
+        with mock.patch.object(BookSectionSerializer, "is_valid") as is_valid:
+            response = self.client.post(ARTICLE_CREATE_BOOK_URL, payload, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("children", response.data)
+        # Rejected before the sections are validated.
+        is_valid.assert_not_called()
+
+    @override_settings(BOOK_CREATE_MAX_DEPTH=3)
+    def test_unsuccessful_create_book_too_deep(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        payload = generate_section_payload("Level 4")
+        for level in range(3, 0, -1):
+            payload = generate_section_payload(f"Level {level}", [payload])
+        with mock.patch.object(BookSectionSerializer, "is_valid") as is_valid:
+            response = self.client.post(ARTICLE_CREATE_BOOK_URL, payload, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("children", response.data)
+        is_valid.assert_not_called()
+        self.assertEqual(Article.objects.count(), 0)
+
+    def test_unsuccessful_create_book_missing_token(self):
+        payload = generate_section_payload("Book")
+        response = self.client.post(ARTICLE_CREATE_BOOK_URL, payload, format="json")
+        self.assertEqual(response.status_code, 401)
+
+
+class ArticleCreateSiblingTest(APITestCase):
+    def setUp(self):
+        response = self.client.post(REGISTRATION_URL, valid_user_payload)
+        self.token = response.data["key"]
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        self.book = self.create_article(ARTICLE_CREATE_ROOT_URL, "Book")
+        self.one = self.create_article(self.child_url(self.book), "One")
+        self.two = self.create_article(self.child_url(self.book), "Two")
+        self.create_article(self.child_url(self.one), "One A")
+
+    def child_url(self, parent):
+        return f"{API_BASE_URL}/articles/{parent}/add-child/"
+
+    def sibling_url(self, sibling):
+        return f"{API_BASE_URL}/articles/{sibling}/add-sibling/"
+
+    def create_article(self, url, title, **extra):
+        payload = copy.deepcopy(valid_article_payload)
+        payload["title"] = title
+        return self.client.post(url, {**payload, **extra}).data["slug_full"]
+
+    def get_chapters(self):
+        book = Article.objects.get(slug_full=self.book)
+        return [child.slug_full for child in book.get_children()]
+
+    def test_successful_create_sibling_before_and_after(self):
+        response = self.client.post(
+            self.sibling_url(self.two),
+            {**valid_article_payload, "title": "Between", "position": "before"},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["prev"], "book/one/one-a")
+        self.assertEqual(response.data["next"], self.two)
+        self.create_article(self.sibling_url(self.two), "Last", position="after")
+        self.create_article(self.sibling_url(self.one), "First", position="before")
+        self.assertEqual(
+            self.get_chapters(),
+            ["book/first", "book/one", "book/between", "book/two", "book/last"],
+        )
+        self.assertEqual(Article.objects.get(slug_full=self.book).numchild, 5)
+        self.assertEqual(Article.find_problems(), ([], [], [], [], []))
+
+    def test_successful_create_sibling_defaults_to_after(self):
+        self.create_article(self.sibling_url(self.one), "Between")
+        self.assertEqual(self.get_chapters(), ["book/one", "book/between", "book/two"])
+
+    def test_successful_create_sibling_does_not_move_later_siblings(self):
+        self.create_article(self.sibling_url(self.one), "Between")
+        paths = dict(Article.objects.values_list("slug_full", "path"))
+        self.create_article(
+            self.sibling_url("book/between"), "Again", position="before"
+        )
+        for slug_full, path in Article.objects.values_list("slug_full", "path"):
+            if slug_full in paths:
+                self.assertEqual(paths[slug_full], path)
+
+    def test_successful_create_many_siblings_at_head(self):
+        titles = [f"Head {i}" for i in range(20)]
+        for title in titles:
+            first = self.get_chapters()[0]
+            self.create_article(self.sibling_url(first), title, position="before")
+        expected = [f"book/head-{i}" for i in reversed(range(20))]
+        self.assertEqual(self.get_chapters(), expected + [self.one, self.two])
+        # Subtrees moved along when the siblings had to be spread out.
+        self.assertTrue(
+            Article.objects.get(slug_full="book/one/one-a").path.startswith(
+                Article.objects.get(slug_full=self.one).path
+            )
+        )
+        self.assertEqual(Article.find_problems(), ([], [], [], [], []))
+        response = self.client.get(f"{ARTICLE_DETAIL_URL}/{self.one}/")
+        self.assertEqual(response.data["prev"], "book/head-0")
+
+    def test_unsuccessful_create_sibling_of_root_article(self):
+        response = self.client.post(self.sibling_url(self.book), valid_article_payload)
+        self.assertEqual(response.status_code, 400)
+
+    def test_unsuccessful_create_sibling_with_invalid_position(self):
+        response = self.client.post(
+            self.sibling_url(self.one), {**valid_article_payload, "position": "under"}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("position", response.data)
+
+    def test_unsuccessful_create_sibling_missing_token(self):
+        self.client.credentials()
+        response = self.client.post(self.sibling_url(self.one), valid_article_payload)
+        self.assertEqual(response.status_code, 401)
+
+
+class ArticleMoveTest(APITestCase):
+    def setUp(self):
+        response = self.client.post(REGISTRATION_URL, valid_user_payload)
+        self.token = response.data["key"]
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        # Book:
+        #   book
+        #   ├── one
+        #   │   ├── one-a
+        #   │   └── one-b
+        #   └── two
+        #       └── one
+        self.book = self.create_article(ARTICLE_CREATE_ROOT_URL, "Book")
+        self.one = self.create_article(self.child_url(self.book), "One")
+        self.one_a = self.create_article(self.child_url(self.one), "One A")
+        self.create_article(self.child_url(self.one), "One B")
+        self.two = self.create_article(self.child_url(self.book), "Two")
+        self.create_article(self.child_url(self.two), "One")
+
+    def child_url(self, parent):
+        return f"{API_BASE_URL}/articles/{parent}/add-child/"
+
+    def move_url(self, slug_full):
+        return f"{API_BASE_URL}/articles/{slug_full}/move/"
+
+    def create_article(self, url, title):
+        payload = copy.deepcopy(valid_article_payload)
+        payload["title"] = title
+        return self.client.post(url, payload).data["slug_full"]
+
+    def move(self, slug_full, target, position):
+        return self.client.post(
+            self.move_url(slug_full), {"target": target, "position": position}
+        )
+
+    def get_reading_order(self):
+        article = Article.objects.get(slug_full=self.book)
+        order = []
+        while article is not None:
+            order.append(article.slug_full)
+            article = article.next_node
+        return order
+
+    def assertTreeIsValid(self):
+        self.assertEqual(Article.find_problems(), ([], [], [], [], []))
+        self.assertEqual(
+            self.get_reading_order(),
+            list(Article.objects.order_by("path").values_list("slug_full", flat=True)),
+        )
+
+    def test_successful_move_subtree_into_another_chapter(self):
+        response = self.move(self.one, self.two, "last-child")
+        self.assertEqual(response.status_code, 200)
+        # "book/two/one" exists already.
+        self.assertEqual(response.data["slug_full"], "book/two/one-2")
+        self.assertEqual(response.data["level"], 3)
+        self.assertEqual(
+            self.get_reading_order(),
+            [
+                "book",
+                "book/two",
+                "book/two/one",
+                "book/two/one-2",
+                "book/two/one-2/one-a",
+                "book/two/one-2/one-b",
+            ],
+        )
+        self.assertEqual(Article.objects.get(slug_full="book/two/one-2/one-a").depth, 4)
+        self.assertEqual(Article.objects.get(slug_full=self.book).numchild, 1)
+        self.assertEqual(Article.objects.get(slug_full=self.two).numchild, 2)
+        self.assertTreeIsValid()
+
+    def test_successful_move_subtree_before_and_after(self):
+        self.move(self.one, self.two, "after")
+        self.assertEqual(
+            [
+                a.slug_full
+                for a in Article.objects.get(slug_full=self.book).get_children()
+            ],
+            [self.two, self.one],
+        )
+        self.move("book/two/one", self.one_a, "before")
+        self.assertEqual(
+            self.get_reading_order(),
+            [
+                "book",
+                "book/two",
+                "book/one",
+                "book/one/one",
+                "book/one/one-a",
+                "book/one/one-b",
+            ],
+        )
+        self.assertTreeIsValid()
+
+    def test_successful_move_subtree_to_first_child(self):
+        self.move(self.two, self.one, "first-child")
+        self.assertEqual(
+            self.get_reading_order(),
+            [
+                "book",
+                "book/one",
+                "book/one/two",
+                "book/one/two/one",
+                "book/one/one-a",
+                "book/one/one-b",
+            ],
+        )
+        self.assertTreeIsValid()
+
+    def test_successful_move_subtree_keeps_annotations_and_bookmarks(self):
+        self.client.post(
+            f"{ARTICLE_DETAIL_URL}/{self.one_a}/annotations/",
+            {
+                "article": self.one_a,
+                "highlightStart": 0,
+                "highlightEnd": 5,
+                "highlightBackward": False,
+                "isPublic": True,
+            },
+            format="json",
+        )
+        self.client.put(
+            f"{API_BASE_URL}/bookmark/{self.book}/",
+            {
+                "article": self.one_a,
+                "highlight": [{"characterRange": {"start": 0, "end": 0}}],
+            },
+            format="json",
+        )
+        self.move(self.one, self.two, "last-child")
+        response = self.client.get(
+            f"{ARTICLE_DETAIL_URL}/book/two/one-2/one-a/annotations/"
+        )
+        self.assertEqual(len(response.data), 1)
+        response = self.client.get(f"{API_BASE_URL}/bookmark/{self.book}/")
+        self.assertEqual(response.data["article"], "book/two/one-2/one-a")
+
+    def test_successful_move_subtree_in_constant_queries(self):
+        with CaptureQueriesContext(connection) as small:
+            self.move(self.one, self.two, "last-child")
+        # Back to where it was, but as "book/one-2" now.
+        chapter = self.move("book/two/one-2", self.two, "before").data["slug_full"]
+        for i in range(30):
+            self.create_article(self.child_url(f"{chapter}/one-a"), f"Deep {i}")
+        with CaptureQueriesContext(connection) as large:
+            self.move(chapter, self.two, "last-child")
+        self.assertEqual(len(small), len(large))
+        self.assertTreeIsValid()
+
+    def test_successful_retrieve_section_titled_move(self):
+        section = self.create_article(self.child_url(self.book), "Move")
+        self.assertEqual(section, "book/move-2")
+        response = self.client.get(f"{ARTICLE_DETAIL_URL}/{section}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["title"], "Move")
+
+    def test_successful_rename_move_sections(self):
+        rename = import_module("core.migrations.0041_reserve_move_slug")
+        two = Article.objects.get(slug_full=self.two)
+        # As saved before the slug was reserved.
+        Article.objects.filter(pk=two.pk).update(
+            slug_section="move", slug_full="book/move"
+        )
+        Article.objects.filter(slug_full="book/two/one").update(
+            slug_full="book/move/one"
+        )
+        rename.rename_move_sections(apps, None)
+        two.refresh_from_db()
+        self.assertEqual(two.slug_full, "book/move-2")
+        self.assertTrue(Article.objects.filter(slug_full="book/move-2/one").exists())
+
+    def test_unsuccessful_move_subtree_into_itself(self):
+        response = self.move(self.one, self.one_a, "last-child")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("position", response.data)
+
+    def test_unsuccessful_move_subtree_to_another_book(self):
+        other = self.create_article(ARTICLE_CREATE_ROOT_URL, "Other")
+        response = self.move(self.one, other, "last-child")
+        self.assertEqual(response.status_code, 400)
+
+    def test_unsuccessful_move_root_article(self):
+        response = self.move(self.book, self.two, "after")
+        self.assertEqual(response.status_code, 400)
+
+    def test_unsuccessful_move_to_missing_target(self):
+        response = self.move(self.one, "book/missing", "after")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("target", response.data)
+
+    def test_unsuccessful_move_by_another_user(self):
+        response = self.client.post(REGISTRATION_URL, valid_second_user_payload)
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + response.data["key"])
+        response = self.move(self.one, self.two, "after")
+        self.assertEqual(response.status_code, 403)
+
+
+class ArticleBookTest(APITestCase):
+    def setUp(self):
+        response = self.client.post(REGISTRATION_URL, valid_user_payload)
+        self.token = response.data["key"]
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        self.book = self.create_article(ARTICLE_CREATE_ROOT_URL, "Book")
+        self.chapter = self.create_article(self.child_url(self.book), "Chapter")
+        self.section = self.create_article(self.child_url(self.chapter), "Section")
+        self.client.post(
+            f"{ARTICLE_DETAIL_URL}/{self.section}/annotations/",
+            {
+                "article": self.section,
+                "highlightStart": 0,
+                "highlightEnd": 5,
+                "highlightBackward": False,
+                "isPublic": True,
+            },
+            format="json",
+        )
+        annotation = Annotation.objects.get()
+        Comment.add_root(
+            user=annotation.user, article=annotation.article, annotation=annotation
+        )
+
+    def child_url(self, parent):
+        return f"{API_BASE_URL}/articles/{parent}/add-child/"
+
+    def create_article(self, url, title, **extra):
+        payload = copy.deepcopy(valid_article_payload)
+        payload["title"] = title
+        return self.client.post(url, {**payload, **extra}).data["slug_full"]
+
+    def get_book(self, slug_full):
+        return Article.objects.get(slug_full=slug_full).book.slug_full
+
+    def test_successful_create_sets_book(self):
+        self.create_article(
+            f"{API_BASE_URL}/articles/{self.chapter}/add-sibling/", "Sibling"
+        )
+        for article in Article.objects.all():
+            self.assertEqual(article.book.slug_full, self.book)
+        self.assertEqual(Annotation.objects.get().book.slug_full, self.book)
+        self.assertEqual(Comment.objects.get().book.slug_full, self.book)
+
+    def test_successful_create_book_sets_book(self):
+        self.client.post(
+            ARTICLE_CREATE_BOOK_URL,
+            generate_section_payload("Tree", [generate_section_payload("Leaf")]),
+            format="json",
+        )
+        self.assertEqual(self.get_book("tree"), "tree")
+        self.assertEqual(self.get_book("tree/leaf"), "tree")
+
+    def test_successful_move_to_another_book_updates_book(self):
+        other = self.create_article(ARTICLE_CREATE_ROOT_URL, "Other")
+        chapter = Article.objects.get(slug_full=self.chapter)
+        chapter.move(Article.objects.get(slug_full=other), "last-child")
+        section = Article.objects.get(title="Section")
+        self.assertEqual(section.book.slug_full, other)
+        self.assertEqual(Annotation.objects.get().book.slug_full, other)
+        self.assertEqual(Comment.objects.get().book.slug_full, other)
+
+    def test_successful_move_to_another_book_moves_bookmarks(self):
+        other = self.create_article(ARTICLE_CREATE_ROOT_URL, "Other")
+        user = Annotation.objects.get().user
+        self.client.post(REGISTRATION_URL, valid_second_user_payload)
+        user_2 = get_user_model().objects.get(
+            username=valid_second_user_payload["username"]
+        )
+        book, section, other_book = (
+            Article.objects.get(slug_full=slug_full)
+            for slug_full in (self.book, self.section, other)
+        )
+        for bookmark_user in (user, user_2):
+            Bookmark.objects.create(
+                user=bookmark_user,
+                book=book,
+                article=section,
+                highlight_start=0,
+                highlight_end=0,
+            )
+        # The second user is reading the other book already.
+        kept = Bookmark.objects.create(
+            user=user_2,
+            book=other_book,
+            article=other_book,
+            highlight_start=0,
+            highlight_end=0,
+        )
+        Article.objects.get(slug_full=self.chapter).move(other_book, "last-child")
+        self.assertEqual(Bookmark.objects.get(user=user).book, other_book)
+        self.assertEqual(list(Bookmark.objects.filter(user=user_2)), [kept])
+
+    def test_successful_backfill_books(self):
+        backfill = import_module("core.migrations.0034_book_foreign_keys")
+        for model in (Article, Annotation, Comment):
+            model.objects.update(book=None)
+        backfill.backfill_books(apps, None)
+        self.assertEqual(self.get_book(self.section), self.book)
+        self.assertEqual(Annotation.objects.get().book.slug_full, self.book)
+        self.assertEqual(Comment.objects.get().book.slug_full, self.book)
+
+
 class ArticleListTest(APITestCase):
     def setUp(self):
         # Create first user and store token.
@@ -405,6 +1001,97 @@ class ArticleListTest(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.data), 2)
 
+    def add_bookmarked_book(self):
+        book = self.client.post(ARTICLE_CREATE_ROOT_URL, valid_article_payload).data
+        chapter = self.client.post(
+            f"{API_BASE_URL}/articles/{book['slug_full']}/add-child/",
+            valid_article_payload,
+        ).data
+        self.client.put(
+            f"{API_BASE_URL}/bookmark/{book['slug_full']}/",
+            {
+                "article": chapter["slug_full"],
+                "highlight": [{"characterRange": {"start": 0, "end": 0}}],
+            },
+            format="json",
+        )
+        return book["slug_full"], chapter["slug_full"]
+
+    def test_successful_list_articles_includes_bookmark_path(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        book, chapter = self.add_bookmarked_book()
+        response = self.client.get(ARTICLE_LIST_URL)
+        bookmarks = {a["slugFull"]: a["bookmarkPath"] for a in response.json()}
+        self.assertEqual(bookmarks[book], chapter)
+        self.assertIsNone(bookmarks["test-article"])
+
+    def test_successful_list_articles_takes_constant_queries(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        self.add_bookmarked_book()
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(ARTICLE_LIST_URL)
+        for _ in range(5):
+            self.add_bookmarked_book()
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(ARTICLE_LIST_URL)
+        self.assertEqual(len(response.data), 8)
+        self.assertEqual(len(small), len(large))
+
+
+class ArticleLibraryTest(APITestCase):
+    def setUp(self):
+        response = self.client.post(REGISTRATION_URL, valid_user_payload)
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + response.data["key"])
+        for i in range(5):
+            payload = copy.deepcopy(valid_article_payload)
+            payload["title"] = f"Book {i}"
+            self.client.post(ARTICLE_CREATE_ROOT_URL, payload)
+        Article.objects.filter(slug_full__in=["book-1", "book-3"]).update(
+            author="Nietzsche"
+        )
+        response = self.client.post(REGISTRATION_URL, valid_second_user_payload)
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + response.data["key"])
+        payload = copy.deepcopy(valid_article_payload)
+        payload["title"] = "Other Book"
+        self.client.post(ARTICLE_CREATE_ROOT_URL, payload)
+        self.client.credentials()
+
+    def test_successful_paginate_library_with_cursor(self):
+        response = self.client.get(ARTICLE_LIST_URL, {"page_size": 4})
+        self.assertEqual(response.status_code, 200)
+        first_page = response.json()
+        self.assertEqual(
+            [a["title"] for a in first_page["results"]],
+            ["Other Book", "Book 4", "Book 3", "Book 2"],
+        )
+        self.assertIsNotNone(first_page["next"])
+        second_page = self.client.get(first_page["next"]).json()
+        self.assertEqual(
+            [a["title"] for a in second_page["results"]], ["Book 1", "Book 0"]
+        )
+        self.assertIsNone(second_page["next"])
+
+    def test_successful_paginate_library_updated_book_moves_to_front(self):
+        Article.objects.get(slug_full="book-0").save()
+        response = self.client.get(ARTICLE_LIST_URL, {"page_size": 1})
+        self.assertEqual(response.json()["results"][0]["slugFull"], "book-0")
+
+    def test_successful_filter_library_by_author(self):
+        response = self.client.get(ARTICLE_LIST_URL, {"author": "Nietzsche"})
+        self.assertEqual(
+            sorted(a["title"] for a in response.json()), ["Book 1", "Book 3"]
+        )
+
+    def test_successful_filter_library_by_owner(self):
+        response = self.client.get(ARTICLE_LIST_URL, {"owner": "anotheruser"})
+        self.assertEqual([a["title"] for a in response.json()], ["Other Book"])
+
+    def test_successful_filter_library_by_title_prefix(self):
+        response = self.client.get(ARTICLE_LIST_URL, {"title": "oth"})
+        self.assertEqual([a["title"] for a in response.json()], ["Other Book"])
+        response = self.client.get(ARTICLE_LIST_URL, {"title": "book", "page_size": 10})
+        self.assertEqual(len(response.json()["results"]), 5)
+
 
 class ArticleRetrieveTest(APITestCase):
     # test that article returns if logged in
@@ -638,6 +1325,28 @@ class ArticleUpdateTest(APITestCase):
             grandchild.json()["slugFull"], "test-article/new-article/test-article"
         )
 
+    def test_successful_update_title_recomputes_numbered_slug(self):
+        parent = Article.objects.get(slug_full=self.parent["slug_full"])
+        chapter = parent.add_child(
+            user=parent.user, title="Chapter 2", article_html="<p/>"
+        )
+        self.assertEqual(chapter.slug_section, "chapter-2")
+        chapter = Article.objects.get(pk=chapter.pk)
+        chapter.title = "Chapter"
+        chapter.save()
+        self.assertEqual(chapter.slug_full, f"{self.parent['slug_full']}/chapter")
+
+    def test_successful_update_content_keeps_slug(self):
+        parent = Article.objects.get(slug_full=self.parent["slug_full"])
+        first = parent.add_child(user=parent.user, title="Chapter", article_html="")
+        second = parent.add_child(user=parent.user, title="Chapter", article_html="")
+        self.assertEqual(second.slug_section, "chapter-2")
+        first.delete()
+        second = Article.objects.get(pk=second.pk)
+        second.article_html = "<p>Edited</p>"
+        second.save()
+        self.assertEqual(second.slug_section, "chapter-2")
+
     def test_unsuccesful_update_of_non_existent_article(self):
         # Login.
         self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
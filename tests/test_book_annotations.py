@@ -0,0 +1,178 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from core.models import Annotation
+
+BASE_URL = "http://localhost:8000"
+
+AUTH_BASE_URL = f"{BASE_URL}/auth"
+REGISTRATION_URL = f"{AUTH_BASE_URL}/registration/"
+
+API_BASE_URL = f"{BASE_URL}/api"
+ARTICLE_CREATE_ROOT_URL = f"{API_BASE_URL}/articles/add-root/"
+ARTICLE_DETAIL_URL = f"{API_BASE_URL}/articles"
+BOOK_ANNOTATIONS_URL = f"{API_BASE_URL}/books"
+
+valid_user_payload = {
+    "username": "testuser",
+    "email": "test@email.com",
+    "password1": "testpassword",
+    "password2": "testpassword",
+}
+
+valid_second_user_payload = {
+    "username": "anotheruser",
+    "email": "another@email.com",
+    "password1": "testpassword",
+    "password2": "testpassword",
+}
+
+
+def generate_article_payload(title, hidden=False):
+    return {
+        "title": title,
+        "articleHtml": f"<p>{title}</p>",
+        "articleJson": "{}",
+        "articleText": title,
+        "hidden": hidden,
+    }
+
+
+def generate_annotation_payload(article, is_public):
+    return {
+        "article": article,
+        "highlightStart": 0,
+        "highlightEnd": 5,
+        "highlightBackward": False,
+        "isPublic": is_public,
+    }
+
+
+class BookAnnotationListTest(APITestCase):
+    def setUp(self):
+        response = self.client.post(REGISTRATION_URL, valid_user_payload)
+        self.token = response.data["key"]
+        response = self.client.post(REGISTRATION_URL, valid_second_user_payload)
+        self.token_2 = response.data["key"]
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        # Book:
+        #   book
+        #   ├── one
+        #   │   └── one-a
+        #   └── two (hidden)
+        self.book = self.create_article(ARTICLE_CREATE_ROOT_URL, "Book")
+        self.one = self.create_child(self.book, "One")
+        self.one_a = self.create_child(self.one, "One A")
+        self.two = self.create_child(self.book, "Two", hidden=True)
+        # Created out of reading order on purpose.
+        self.annotate(self.two, True)
+        self.annotate(self.one_a, True)
+        self.annotate(self.one, True)
+        self.annotate(self.one, False)
+        self.annotate(self.book, True)
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token_2)
+        self.annotate(self.one_a, False)
+
+    def create_article(self, url, title, hidden=False):
+        return self.client.post(url, generate_article_payload(title, hidden)).data[
+            "slug_full"
+        ]
+
+    def create_child(self, parent, title, hidden=False):
+        return self.create_article(
+            f"{ARTICLE_DETAIL_URL}/{parent}/add-child/", title, hidden
+        )
+
+    def annotate(self, article, is_public):
+        self.client.post(
+            f"{ARTICLE_DETAIL_URL}/{article}/annotations/",
+            generate_annotation_payload(article, is_public),
+            format="json",
+        )
+
+    def get_annotations(self, token=None, **params):
+        self.client.credentials()
+        if token:
+            self.client.credentials(HTTP_AUTHORIZATION="Token " + token)
+        response = self.client.get(
+            f"{BOOK_ANNOTATIONS_URL}/{self.book}/annotations/", params
+        )
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def count(self, chapters):
+        return {c["slug_full"]: len(c["annotations"]) for c in chapters}
+
+    def test_successful_list_book_annotations_grouped_in_reading_order(self):
+        response = self.get_annotations(self.token)
+        chapters = response.data["chapters"]
+        self.assertEqual(
+            [(c["slug_full"], c["level"]) for c in chapters],
+            [(self.book, 1), (self.one, 2), (self.one_a, 3), (self.two, 2)],
+        )
+        self.assertEqual(
+            self.count(chapters),
+            {self.book: 1, self.one: 2, self.one_a: 1, self.two: 1},
+        )
+        self.assertIsNone(response.data["next"])
+
+    def test_successful_list_book_annotations_visible_to_another_user(self):
+        chapters = self.get_annotations(self.token_2).data["chapters"]
+        # Not the private annotation on "one", nothing in the hidden chapter.
+        self.assertEqual(
+            self.count(chapters), {self.book: 1, self.one: 1, self.one_a: 2}
+        )
+        chapters = self.get_annotations().data["chapters"]
+        self.assertEqual(
+            self.count(chapters), {self.book: 1, self.one: 1, self.one_a: 1}
+        )
+
+    def test_successful_list_book_annotations_in_pages(self):
+        response = self.get_annotations(self.token, page_size=2)
+        uuids = []
+        pages = 0
+        while True:
+            pages += 1
+            for chapter in response.data["chapters"]:
+                uuids.extend(a["uuid"] for a in chapter["annotations"])
+            if response.data["next"] is None:
+                break
+            response = self.client.get(response.data["next"])
+        self.assertEqual(pages, 3)
+        self.assertEqual(len(uuids), 5)
+        self.assertEqual(len(set(uuids)), 5)
+
+    def test_successful_list_book_annotations_updated_since(self):
+        since = timezone.now()
+        annotation = Annotation.objects.get(
+            article__slug_full=self.one_a, user__username="testuser"
+        )
+        annotation.is_public = False
+        annotation.save()
+        chapters = self.get_annotations(
+            self.token, updated_since=since.isoformat()
+        ).data["chapters"]
+        self.assertEqual(self.count(chapters), {self.one_a: 1})
+
+    def test_successful_list_book_annotations_in_constant_queries(self):
+        with CaptureQueriesContext(connection) as small:
+            self.get_annotations(self.token)
+        for i in range(5):
+            chapter = self.create_child(self.book, f"Chapter {i}")
+            self.annotate(chapter, True)
+        with CaptureQueriesContext(connection) as large:
+            self.get_annotations(self.token)
+        self.assertEqual(len(small), len(large))
+
+    def test_unsuccessful_list_book_annotations_with_invalid_updated_since(self):
+        response = self.client.get(
+            f"{BOOK_ANNOTATIONS_URL}/{self.book}/annotations/",
+            {"updated_since": "yesterday"},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_unsuccessful_list_annotations_of_non_root_article(self):
+        response = self.client.get(f"{BOOK_ANNOTATIONS_URL}/{self.one}/annotations/")
+        self.assertEqual(response.status_code, 404)
@@ -1,7 +1,16 @@
 import copy
+from io import StringIO
 
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 
+from core.bookmarks import flush_bookmarks
+from core.models import Bookmark
+
 BASE_URL = "http://localhost:8000"
 
 AUTH_BASE_URL = f"{BASE_URL}/auth"
@@ -229,6 +238,45 @@ class BookmarkUpdateTest(APITestCase):
         self.assertEqual(response.data["highlight"][0]["characterRange"]["start"], 5)
         self.assertEqual(response.data["highlight"][0]["characterRange"]["end"], 5)
 
+    def test_successful_bookmark_update_is_one_statement(self):
+        # Login.
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        for index, status_code in ((5, 201), (9, 200)):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.put(
+                    self.BOOKMARK_UPDATE_URL,
+                    generate_bookmark_payload(self.child_path, index),
+                    format="json",
+                )
+            self.assertEqual(response.status_code, status_code)
+            self.assertEqual(response.data["book"], "test-article")
+            self.assertEqual(response.data["article"], "test-article/another-article")
+            # The token, the two articles, then the upsert.
+            self.assertEqual(len(queries), 3)
+            self.assertIn("ON CONFLICT", queries[-1]["sql"])
+        bookmark = Bookmark.objects.get()
+        self.assertEqual(str(bookmark.uuid), str(response.data["uuid"]))
+        self.assertEqual(bookmark.highlight_start, 9)
+
+    def test_unsuccessful_second_bookmark_in_same_book(self):
+        # Login.
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        response = self.client.put(
+            self.BOOKMARK_UPDATE_URL,
+            generate_bookmark_payload(self.book_path, 5),
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        bookmark = Bookmark.objects.get()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Bookmark.objects.create(
+                user=bookmark.user,
+                book=bookmark.book,
+                article=bookmark.article,
+                highlight_start=9,
+                highlight_end=9,
+            )
+
     def test_unsuccessful_bookmark_update_by_nonuser(self):
         valid_bookmark_payload = generate_bookmark_payload(self.book_path, 5)
         response = self.client.put(
@@ -483,3 +531,112 @@ class ArticleListWithBookmarkTest(APITestCase):
         self.assertEqual(response.status_code, 200)
         book_data = response.data[0]
         self.assertEqual(book_data["bookmark_path"], None)
+
+
+@override_settings(BOOKMARK_WRITE_BEHIND=True, BOOKMARK_FLUSH_IN_BACKGROUND=False)
+class BookmarkWriteBehindTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        # Create user.
+        response = self.client.post(REGISTRATION_URL, valid_user_payload)
+        self.token = response.data["key"]
+        # Login.
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        # Create article.
+        self.book = self.client.post(
+            ARTICLE_CREATE_ROOT_URL, valid_article_payload
+        ).data
+        self.book_path = self.book["slug_full"]
+        # Create child article.
+        self.child = self.client.post(
+            f"{API_BASE_URL}/articles/{self.book_path}/add-child/",
+            valid_article_payload_2,
+        ).data
+        self.child_path = self.child["slug_full"]
+        self.BOOKMARK_URL = f"{BOOKMARK_DETAIL_URL}/{self.book_path}/"
+        # Create bookmark, which is written right away.
+        response = self.client.put(
+            self.BOOKMARK_URL,
+            generate_bookmark_payload(self.book_path, 5),
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Bookmark.objects.get().highlight_start, 5)
+
+    def move_bookmark(self, article_path, index):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(
+                self.BOOKMARK_URL,
+                generate_bookmark_payload(article_path, index),
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(
+            [q for q in queries if q["sql"].startswith(("UPDATE", "INSERT"))]
+        )
+        return response
+
+    def test_successful_bookmark_update_is_buffered(self):
+        response = self.move_bookmark(self.child_path, 9)
+        self.assertEqual(response.data["article"], self.child_path)
+        self.move_bookmark(self.child_path, 12)
+        # The database is behind, reads aren't.
+        self.assertEqual(Bookmark.objects.get().highlight_start, 5)
+        response = self.client.get(self.BOOKMARK_URL)
+        self.assertEqual(response.data["article"], self.child_path)
+        self.assertEqual(response.data["highlight"][0]["characterRange"]["start"], 12)
+        response = self.client.get(BOOKMARK_CREATE_URL)
+        self.assertEqual(response.data[0]["highlight"][0]["characterRange"]["end"], 12)
+        response = self.client.get(ARTICLE_LIST_URL)
+        self.assertEqual(response.data[0]["bookmark_path"], self.child_path)
+
+    def test_successful_bookmark_partial_update_is_buffered(self):
+        self.move_bookmark(self.child_path, 9)
+        payload = generate_bookmark_payload(self.child_path, 12)
+        payload.pop("article")
+        response = self.client.patch(self.BOOKMARK_URL, payload, format="json")
+        self.assertEqual(response.status_code, 200)
+        # The article stays where it was.
+        self.assertEqual(response.data["article"], self.child_path)
+        self.assertEqual(response.data["highlight"][0]["characterRange"]["start"], 12)
+        self.assertEqual(flush_bookmarks(), 1)
+        bookmark = Bookmark.objects.get()
+        self.assertEqual(bookmark.article.slug_full, self.child_path)
+        self.assertEqual(bookmark.highlight_start, 12)
+
+    def test_successful_flush_writes_latest_positions(self):
+        self.move_bookmark(self.child_path, 9)
+        self.move_bookmark(self.child_path, 12)
+        self.assertEqual(flush_bookmarks(), 1)
+        bookmark = Bookmark.objects.get()
+        self.assertEqual(bookmark.article.slug_full, self.child_path)
+        self.assertEqual(bookmark.highlight_start, 12)
+        self.assertEqual(bookmark.highlight_end, 12)
+        # Nothing left to flush.
+        self.assertEqual(flush_bookmarks(), 0)
+        # Still read from the cache after the flush, and also once it's gone.
+        response = self.client.get(self.BOOKMARK_URL)
+        self.assertEqual(response.data["highlight"][0]["characterRange"]["start"], 12)
+        cache.clear()
+        response = self.client.get(self.BOOKMARK_URL)
+        self.assertEqual(response.data["highlight"][0]["characterRange"]["start"], 12)
+
+    def test_successful_flush_skips_log_entry_that_never_arrives(self):
+        self.move_bookmark(self.child_path, 9)
+        # Take a number without logging, like a process that died in between.
+        cache.incr("bookmark:log:last")
+        self.move_bookmark(self.child_path, 12)
+        # The missing entry could still be being written, so it waits for it...
+        self.assertEqual(flush_bookmarks(), 1)
+        self.assertEqual(Bookmark.objects.get().highlight_start, 12)
+        self.move_bookmark(self.book_path, 3)
+        # ...but only until the next flush.
+        self.assertEqual(flush_bookmarks(), 1)
+        self.assertEqual(Bookmark.objects.get().highlight_start, 3)
+
+    def test_successful_flush_bookmarks_command(self):
+        self.move_bookmark(self.child_path, 9)
+        out = StringIO()
+        call_command("flush_bookmarks", batch_size=1, stdout=out)
+        self.assertIn("Flushed 1 bookmarks", out.getvalue())
+        self.assertEqual(Bookmark.objects.get().highlight_start, 9)
@@ -0,0 +1,145 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from core.models import Article
+
+BASE_URL = "http://localhost:8000"
+
+AUTH_BASE_URL = f"{BASE_URL}/auth"
+REGISTRATION_URL = f"{AUTH_BASE_URL}/registration/"
+
+API_BASE_URL = f"{BASE_URL}/api"
+ARTICLE_CREATE_ROOT_URL = f"{API_BASE_URL}/articles/add-root/"
+ARTICLE_DETAIL_URL = f"{API_BASE_URL}/articles"
+TOC_URL = f"{API_BASE_URL}/toc"
+
+valid_user_payload = {
+    "username": "testuser",
+    "email": "test@email.com",
+    "password1": "testpassword",
+    "password2": "testpassword",
+}
+
+valid_second_user_payload = {
+    "username": "anotheruser",
+    "email": "another@email.com",
+    "password1": "testpassword",
+    "password2": "testpassword",
+}
+
+
+def generate_article_payload(title):
+    return {
+        "title": title,
+        "articleHtml": f"<p>{title}</p>",
+        "articleJson": "{}",
+        "articleText": title,
+        "hidden": False,
+    }
+
+
+def generate_annotation_payload(article, is_public):
+    return {
+        "article": article,
+        "highlightStart": 0,
+        "highlightEnd": 5,
+        "highlightBackward": False,
+        "isPublic": is_public,
+    }
+
+
+class ConditionalGetTest(APITestCase):
+    def setUp(self):
+        response = self.client.post(REGISTRATION_URL, valid_user_payload)
+        self.token = response.data["key"]
+        response = self.client.post(REGISTRATION_URL, valid_second_user_payload)
+        self.token_2 = response.data["key"]
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        self.book = self.client.post(
+            ARTICLE_CREATE_ROOT_URL, generate_article_payload("Book")
+        ).data["slug_full"]
+        self.chapter = self.client.post(
+            f"{ARTICLE_DETAIL_URL}/{self.book}/add-child/",
+            generate_article_payload("Chapter"),
+        ).data["slug_full"]
+        self.client.credentials()
+
+    def assertNotModified(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        return etag
+
+    def test_successful_article_not_modified(self):
+        self.assertNotModified(f"{ARTICLE_DETAIL_URL}/{self.chapter}/")
+
+    def test_successful_article_etag_changes_on_update(self):
+        url = f"{ARTICLE_DETAIL_URL}/{self.chapter}/"
+        etag = self.assertNotModified(url)
+        article = Article.objects.get(slug_full=self.chapter)
+        article.article_html = "<p>Edited</p>"
+        article.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["articleHtml"], "<p>Edited</p>")
+
+    def test_successful_article_etag_changes_with_new_neighbour(self):
+        url = f"{ARTICLE_DETAIL_URL}/{self.chapter}/"
+        etag = self.assertNotModified(url)
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        self.client.post(
+            f"{ARTICLE_DETAIL_URL}/{self.book}/add-child/",
+            generate_article_payload("Next Chapter"),
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["next"], "book/next-chapter")
+
+    def test_successful_toc_etag_changes_with_new_section(self):
+        url = f"{TOC_URL}/{self.book}/"
+        etag = self.assertNotModified(url)
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        self.client.post(
+            f"{ARTICLE_DETAIL_URL}/{self.chapter}/add-child/",
+            generate_article_payload("Section"),
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_successful_toc_not_modified_without_loading_article(self):
+        url = f"{TOC_URL}/{self.book}/"
+        etag = self.client.get(url)["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([q for q in queries if "article_html" in q["sql"]])
+
+    def test_successful_annotations_etag_changes_with_new_annotation(self):
+        url = f"{ARTICLE_DETAIL_URL}/{self.chapter}/annotations/"
+        etag = self.assertNotModified(url)
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        response = self.client.post(
+            url, generate_annotation_payload(self.chapter, True), format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.client.credentials()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+
+    def test_successful_annotations_etag_is_not_shared_between_users(self):
+        url = f"{ARTICLE_DETAIL_URL}/{self.chapter}/annotations/"
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        self.client.post(
+            url, generate_annotation_payload(self.chapter, False), format="json"
+        )
+        owner_etag = self.assertNotModified(url)
+        self.assertIn("Authorization", self.client.get(url)["Vary"])
+        # Another user mustn't be told their copy is current with the owner's tag.
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token_2)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=owner_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [])
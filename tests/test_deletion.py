@@ -0,0 +1,201 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from core.models import Annotation, Article, BookDeletion, Bookmark, Comment
+
+BASE_URL = "http://localhost:8000"
+
+AUTH_BASE_URL = f"{BASE_URL}/auth"
+REGISTRATION_URL = f"{AUTH_BASE_URL}/registration/"
+
+API_BASE_URL = f"{BASE_URL}/api"
+ARTICLE_CREATE_ROOT_URL = f"{API_BASE_URL}/articles/add-root/"
+ARTICLE_LIST_URL = f"{API_BASE_URL}/articles/"
+ARTICLE_DETAIL_URL = f"{API_BASE_URL}/articles"
+BOOKMARK_DETAIL_URL = f"{API_BASE_URL}/bookmark"
+BOOKMARK_LIST_URL = f"{API_BASE_URL}/bookmarks/"
+TOC_URL = f"{API_BASE_URL}/toc"
+
+valid_user_payload = {
+    "username": "testuser",
+    "email": "test@email.com",
+    "password1": "testpassword",
+    "password2": "testpassword",
+}
+
+valid_second_user_payload = {
+    "username": "anotheruser",
+    "email": "another@email.com",
+    "password1": "testpassword",
+    "password2": "testpassword",
+}
+
+
+def generate_article_payload(title):
+    return {
+        "title": title,
+        "articleHtml": f"<p>{title}</p>",
+        "articleJson": "{}",
+        "articleText": title,
+        "hidden": False,
+    }
+
+
+def generate_annotation_payload(article):
+    return {
+        "article": article,
+        "highlightStart": 0,
+        "highlightEnd": 5,
+        "highlightBackward": False,
+        "isPublic": True,
+    }
+
+
+class BookDeletionTest(APITestCase):
+    def setUp(self):
+        response = self.client.post(REGISTRATION_URL, valid_user_payload)
+        self.token = response.data["key"]
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        self.book = self.create_article(ARTICLE_CREATE_ROOT_URL, "Book")
+        self.chapter = self.create_child(self.book, "Chapter")
+        self.create_child(self.chapter, "Section")
+        self.other_book = self.create_article(ARTICLE_CREATE_ROOT_URL, "Other")
+        self.other_chapter = self.create_child(self.other_book, "Chapter")
+        for article in [self.chapter, self.other_chapter]:
+            for _ in range(3):
+                self.annotate(article)
+            self.client.put(
+                f"{BOOKMARK_DETAIL_URL}/{article}/",
+                {
+                    "article": article,
+                    "highlight": [{"characterRange": {"start": 0, "end": 0}}],
+                },
+                format="json",
+            )
+
+    def create_article(self, url, title):
+        return self.client.post(url, generate_article_payload(title)).data["slug_full"]
+
+    def create_child(self, parent, title):
+        return self.create_article(f"{ARTICLE_DETAIL_URL}/{parent}/add-child/", title)
+
+    def annotate(self, article):
+        response = self.client.post(
+            f"{ARTICLE_DETAIL_URL}/{article}/annotations/",
+            generate_annotation_payload(article),
+            format="json",
+        )
+        annotation = Annotation.objects.get(uuid=response.data["uuid"])
+        comment = Comment.add_root(
+            user=annotation.user,
+            article=annotation.article,
+            annotation=annotation,
+            comment_html="<p>Comment</p>",
+        )
+        comment.add_child(
+            user=annotation.user,
+            article=annotation.article,
+            annotation=annotation,
+            comment_html="<p>Reply</p>",
+        )
+
+    def delete_book(self):
+        response = self.client.delete(f"{ARTICLE_DETAIL_URL}/{self.book}/")
+        self.assertEqual(response.status_code, 204)
+        return response
+
+    def test_successful_delete_book_hides_it_at_once(self):
+        self.delete_book()
+        response = self.client.get(ARTICLE_LIST_URL)
+        self.assertEqual([a["slug_full"] for a in response.data], [self.other_book])
+        response = self.client.get(f"{ARTICLE_DETAIL_URL}/{self.chapter}/")
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(f"{TOC_URL}/{self.book}/")
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(f"{ARTICLE_DETAIL_URL}/{self.chapter}/annotations/")
+        self.assertEqual(response.data, [])
+        response = self.client.get(BOOKMARK_LIST_URL)
+        self.assertEqual(len(response.data), 1)
+        response = self.client.post(
+            f"{ARTICLE_DETAIL_URL}/{self.chapter}/add-child/",
+            generate_article_payload("Late"),
+        )
+        self.assertEqual(response.status_code, 404)
+        # Nothing has been deleted yet.
+        self.assertEqual(Article.objects.filter(pending_deletion=True).count(), 3)
+
+    def test_successful_delete_book_does_not_load_annotations(self):
+        with CaptureQueriesContext(connection) as queries, mock.patch(
+            "core.deletion.start_purge"
+        ) as start_purge, self.captureOnCommitCallbacks(execute=True):
+            self.delete_book()
+        # The purge starts once the request commits.
+        start_purge.assert_called_once()
+        tables = " ".join(query["sql"] for query in queries)
+        self.assertNotIn("core_annotation", tables)
+        self.assertNotIn("core_comment", tables)
+
+    def test_successful_purge_book_in_batches(self):
+        response = self.delete_book()
+        response = self.client.get(response["Location"])
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data["finished_on"])
+        self.assertEqual(response.data["deleted_rows"], 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command("purge_book_deletions", batch_size=2, stdout=StringIO())
+        deletes = [q for q in queries if q["sql"].startswith("DELETE")]
+        # 3 articles, 3 annotations, 6 comments and 1 bookmark, at most 2 at a time.
+        self.assertEqual(len(deletes), 2 + 2 + 3 + 1)
+
+        deletion = BookDeletion.objects.get()
+        self.assertIsNotNone(deletion.finished_on)
+        self.assertEqual(deletion.total_rows, 13)
+        self.assertEqual(deletion.deleted_rows, 13)
+        self.assertFalse(Article.objects.filter(path__startswith=deletion.book_path))
+        # The other book is untouched.
+        self.assertEqual(Article.objects.count(), 2)
+        self.assertEqual(Annotation.objects.count(), 3)
+        self.assertEqual(Comment.objects.count(), 6)
+        self.assertEqual(Bookmark.objects.count(), 1)
+        response = self.client.get(f"{ARTICLE_DETAIL_URL}/{self.other_chapter}/")
+        self.assertEqual(response.data["prev"], self.other_book)
+
+    def test_successful_purge_book_deletions_resumes(self):
+        self.delete_book()
+        call_command("purge_book_deletions", stdout=StringIO())
+        out = StringIO()
+        call_command("purge_book_deletions", stdout=out)
+        self.assertEqual(out.getvalue(), "")
+
+    def test_successful_purge_book_deletions_resumes_after_book_is_gone(self):
+        self.delete_book()
+        call_command("purge_book_deletions", stdout=StringIO())
+        # As if the purge had died right after deleting the book, while another book
+        # is between its INSERT and setting its own book.
+        BookDeletion.objects.update(finished_on=None)
+        Article.objects.filter(slug_full=self.other_book).update(book=None)
+        with CaptureQueriesContext(connection) as queries:
+            call_command("purge_book_deletions", stdout=StringIO())
+        self.assertFalse([q for q in queries if q["sql"].startswith("DELETE")])
+        self.assertIsNotNone(BookDeletion.objects.get().finished_on)
+        self.assertTrue(Article.objects.filter(slug_full=self.other_book).exists())
+
+    def test_successful_delete_chapter_is_immediate(self):
+        response = self.client.delete(f"{ARTICLE_DETAIL_URL}/{self.chapter}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertNotIn("Location", response)
+        self.assertEqual(Annotation.objects.count(), 3)
+        self.assertFalse(BookDeletion.objects.exists())
+
+    def test_unsuccessful_get_deletion_progress_by_another_user(self):
+        location = self.delete_book()["Location"]
+        response = self.client.post(REGISTRATION_URL, valid_second_user_payload)
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + response.data["key"])
+        response = self.client.get(location)
+        self.assertEqual(response.status_code, 403)
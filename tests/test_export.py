@@ -0,0 +1,160 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from rest_framework.test import APITestCase
+
+BASE_URL = "http://localhost:8000"
+
+AUTH_BASE_URL = f"{BASE_URL}/auth"
+REGISTRATION_URL = f"{AUTH_BASE_URL}/registration/"
+
+API_BASE_URL = f"{BASE_URL}/api"
+ARTICLE_CREATE_ROOT_URL = f"{API_BASE_URL}/articles/add-root/"
+ARTICLE_DETAIL_URL = f"{API_BASE_URL}/articles"
+BOOK_DETAIL_URL = f"{API_BASE_URL}/books"
+BOOKMARK_DETAIL_URL = f"{API_BASE_URL}/bookmark"
+
+valid_user_payload = {
+    "username": "testuser",
+    "email": "test@email.com",
+    "password1": "testpassword",
+    "password2": "testpassword",
+}
+
+valid_second_user_payload = {
+    "username": "anotheruser",
+    "email": "another@email.com",
+    "password1": "testpassword",
+    "password2": "testpassword",
+}
+
+
+def generate_article_payload(title, hidden=False):
+    return {
+        "title": title,
+        "articleHtml": f"<p>{title}</p>",
+        "articleJson": "{}",
+        "articleText": title,
+        "hidden": hidden,
+    }
+
+
+def generate_annotation_payload(article, is_public):
+    return {
+        "article": article,
+        "highlightStart": 0,
+        "highlightEnd": 5,
+        "highlightBackward": False,
+        "isPublic": is_public,
+    }
+
+
+def parse_ndjson(content):
+    return [json.loads(line) for line in content.decode().splitlines()]
+
+
+class BookExportTest(APITestCase):
+    def setUp(self):
+        response = self.client.post(REGISTRATION_URL, valid_user_payload)
+        self.token = response.data["key"]
+        response = self.client.post(REGISTRATION_URL, valid_second_user_payload)
+        self.token_2 = response.data["key"]
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        # Book:
+        #   book
+        #   ├── one
+        #   │   └── one-a
+        #   └── two (hidden)
+        #       └── two-a
+        self.book = self.create_article(ARTICLE_CREATE_ROOT_URL, "Book")
+        one = self.create_child(self.book, "One")
+        self.create_child(one, "One A")
+        two = self.create_child(self.book, "Two", hidden=True)
+        self.two_a = self.create_child(two, "Two A")
+        self.client.post(
+            f"{ARTICLE_DETAIL_URL}/{one}/annotations/",
+            generate_annotation_payload(one, True),
+            format="json",
+        )
+        self.client.post(
+            f"{ARTICLE_DETAIL_URL}/{one}/annotations/",
+            generate_annotation_payload(one, False),
+            format="json",
+        )
+        self.client.put(
+            f"{BOOKMARK_DETAIL_URL}/{self.book}/",
+            {
+                "article": one,
+                "highlight": [{"characterRange": {"start": 0, "end": 0}}],
+            },
+            format="json",
+        )
+        self.client.credentials()
+
+    def create_article(self, url, title, hidden=False):
+        return self.client.post(url, generate_article_payload(title, hidden)).data[
+            "slug_full"
+        ]
+
+    def create_child(self, parent, title, hidden=False):
+        return self.create_article(
+            f"{ARTICLE_DETAIL_URL}/{parent}/add-child/", title, hidden
+        )
+
+    def export(self, token, include=""):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + token)
+        response = self.client.get(
+            f"{BOOK_DETAIL_URL}/{self.book}/export/", {"include": include}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        return parse_ndjson(b"".join(response.streaming_content))
+
+    def test_successful_export_book_in_depth_first_order(self):
+        records = self.export(self.token)
+        self.assertEqual(records[0]["type"], "book")
+        self.assertEqual(
+            [(r["depth"], r["data"]["title"]) for r in records[1:]],
+            [(1, "Book"), (2, "One"), (3, "One A"), (2, "Two"), (3, "Two A")],
+        )
+        self.assertEqual(records[1]["data"]["user"], "testuser")
+
+    def test_successful_export_book_with_annotations_and_bookmarks(self):
+        records = self.export(self.token, "annotations,bookmarks")
+        types = [r["type"] for r in records]
+        self.assertEqual(types.count("annotation"), 2)
+        self.assertEqual(types.count("bookmark"), 1)
+
+    def test_successful_export_book_by_another_user_leaves_out_private_data(self):
+        records = self.export(self.token_2, "annotations,bookmarks")
+        titles = [r["data"]["title"] for r in records if r["type"] == "article"]
+        self.assertEqual(titles, ["Book", "One", "One A"])
+        annotations = [r for r in records if r["type"] == "annotation"]
+        self.assertEqual(len(annotations), 1)
+        self.assertTrue(annotations[0]["data"]["is_public"])
+        self.assertNotIn("bookmark", [r["type"] for r in records])
+
+    def test_unsuccessful_export_book_without_token(self):
+        response = self.client.get(f"{BOOK_DETAIL_URL}/{self.book}/export/")
+        self.assertEqual(response.status_code, 401)
+
+    def test_unsuccessful_export_of_non_root_article(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        response = self.client.get(f"{BOOK_DETAIL_URL}/{self.two_a}/export/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_successful_retrieve_section_slugged_export(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        export = self.create_child(self.book, "Export")
+        self.assertEqual(export, f"{self.book}/export")
+        response = self.client.get(f"{ARTICLE_DETAIL_URL}/{export}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["slug_full"], export)
+
+    def test_successful_export_book_command(self):
+        out = StringIO()
+        call_command("export_book", self.book, include=["annotations"], stdout=out)
+        records = parse_ndjson(out.getvalue().encode())
+        self.assertEqual(len([r for r in records if r["type"] == "article"]), 5)
+        self.assertEqual(len([r for r in records if r["type"] == "annotation"]), 2)
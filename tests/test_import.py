@@ -0,0 +1,178 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, TransactionTestCase
+
+from core.export import export_book
+from core.ingest import BookImporter, read_records
+from core.models import Article
+from core.sanitization import ALLOWLIST_VERSION
+
+RAW_BOOKS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "raw_books")
+
+
+def walk_dump(nodes, depth=1):
+    for node in nodes:
+        yield depth, node["data"]
+        yield from walk_dump(node.get("children", []), depth + 1)
+
+
+def generate_node(title, children=()):
+    return {
+        "data": {"title": title, "article_html": f"<p>{title}</p>", "user": 1},
+        "children": list(children),
+    }
+
+
+class BookImportTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="testuser", email="test@email.com", password="testpassword"
+        )
+
+    def import_dump(self, dump, **kwargs):
+        importer = BookImporter(user=self.user, **kwargs)
+        return importer.import_book(read_records(StringIO(json.dumps(dump))))
+
+    def test_successful_read_dump_incrementally(self):
+        path = os.path.join(RAW_BOOKS_DIR, "zarathustra_mp.txt")
+        with open(path) as dump_file:
+            expected = list(walk_dump(json.load(dump_file)))
+        with open(path) as dump_file:
+            # Tiny chunks, so values are cut off at every possible place.
+            records = list(read_records(dump_file, chunk_size=7))
+        self.assertEqual(records, expected)
+
+    def test_successful_import_computes_tree(self):
+        book = self.import_dump(
+            [
+                generate_node(
+                    "Book",
+                    [
+                        generate_node("Part", [generate_node("Chapter")]),
+                        generate_node("Part"),
+                    ],
+                )
+            ]
+        )
+        self.assertEqual(
+            list(
+                Article.objects.filter(path__startswith=book.path).values_list(
+                    "slug_full", "depth", "numchild"
+                )
+            ),
+            [
+                ("book", 1, 2),
+                ("book/part", 2, 1),
+                ("book/part/chapter", 3, 0),
+                ("book/part-2", 2, 0),
+            ],
+        )
+        self.assertEqual(
+            Article.objects.get(slug_full="book/part").next.slug_full,
+            "book/part/chapter",
+        )
+        # The tree is consistent as far as treebeard is concerned.
+        self.assertEqual(Article.find_problems(), ([], [], [], [], []))
+
+    def test_successful_import_next_to_existing_book(self):
+        Article.create_root(user=self.user, title="Book", article_html="<p></p>")
+        book = self.import_dump([generate_node("Book")])
+        self.assertEqual(book.slug_full, "book-2")
+        self.assertEqual(len(Article.get_root_nodes()), 2)
+
+    def test_successful_import_round_trips_export(self):
+        book = self.import_dump([generate_node("Book", [generate_node("Chapter")])])
+        exported = "".join(export_book(book))
+        copy = BookImporter(user=self.user).import_book(
+            read_records(StringIO(exported))
+        )
+        self.assertEqual(copy.slug_full, "book-2")
+        self.assertEqual([a.title for a in Article.get_tree(copy)], ["Book", "Chapter"])
+
+    def test_successful_dry_run_writes_nothing(self):
+        self.import_dump([generate_node("Book")], dry_run=True)
+        self.assertEqual(Article.objects.count(), 0)
+
+    def test_unsuccessful_import_of_node_without_title(self):
+        with self.assertRaises(ValidationError):
+            self.import_dump([generate_node("Book", [generate_node("")])])
+        self.assertEqual(Article.objects.count(), 0)
+
+    def test_successful_import_book_command(self):
+        out = StringIO()
+        call_command(
+            "import_book",
+            os.path.join(RAW_BOOKS_DIR, "ydkjs_1.txt"),
+            user="testuser",
+            stdout=out,
+            stderr=StringIO(),
+        )
+        self.assertIn("Imported", out.getvalue())
+        with open(os.path.join(RAW_BOOKS_DIR, "ydkjs_1.txt")) as dump_file:
+            expected = len(list(walk_dump(json.load(dump_file))))
+        self.assertEqual(Article.objects.count(), expected)
+
+    def test_unsuccessful_import_book_command_with_invalid_file(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as dump_file:
+            dump_file.write('[{"data": {"title": "Book"}, "children": [')
+            dump_file.flush()
+            with self.assertRaises(CommandError):
+                call_command(
+                    "import_book", dump_file.name, user="testuser", stderr=StringIO()
+                )
+
+
+class BookIngestTest(TransactionTestCase):
+    def setUp(self):
+        get_user_model().objects.create_user(
+            username="testuser", email="test@email.com", password="testpassword"
+        )
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.state_file = os.path.join(self.state_dir.name, "state.json")
+
+    def tearDown(self):
+        self.state_dir.cleanup()
+
+    def ingest(self, *files):
+        out = StringIO()
+        call_command(
+            "ingest_books",
+            *files,
+            user="testuser",
+            workers=2,
+            writers=1,
+            state_file=self.state_file,
+            stdout=out,
+            stderr=StringIO(),
+        )
+        return out.getvalue()
+
+    def test_successful_ingest_books(self):
+        output = self.ingest(os.path.join(RAW_BOOKS_DIR, "*.txt"))
+        self.assertIn("Imported 3 books", output)
+        self.assertEqual(
+            sorted(Article.get_root_nodes().values_list("slug_full", flat=True)),
+            [
+                "thus-spoke-zarathustra",
+                "you-don-t-know-js-get-started-2nd-edition",
+                "you-don-t-know-js-yet-scope-closures-2nd-edition",
+            ],
+        )
+        # Sanitized in the worker processes.
+        self.assertFalse(
+            Article.objects.exclude(sanitizer_version=ALLOWLIST_VERSION).exists()
+        )
+
+    def test_successful_ingest_books_resumes(self):
+        self.ingest(os.path.join(RAW_BOOKS_DIR, "ydkjs_1.txt"))
+        output = self.ingest(os.path.join(RAW_BOOKS_DIR, "*.txt"))
+        self.assertIn("Skipping 1 books", output)
+        self.assertIn("Imported 2 books", output)
+        self.assertEqual(len(Article.get_root_nodes()), 3)
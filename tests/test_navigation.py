@@ -0,0 +1,103 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from core.models import Article
+
+BASE_URL = "http://localhost:8000"
+
+AUTH_BASE_URL = f"{BASE_URL}/auth"
+REGISTRATION_URL = f"{AUTH_BASE_URL}/registration/"
+
+API_BASE_URL = f"{BASE_URL}/api"
+ARTICLE_CREATE_ROOT_URL = f"{API_BASE_URL}/articles/add-root/"
+ARTICLE_DETAIL_URL = f"{API_BASE_URL}/articles"
+
+valid_user_payload = {
+    "username": "testuser",
+    "email": "test@email.com",
+    "password1": "testpassword",
+    "password2": "testpassword",
+}
+
+
+def generate_article_payload(title):
+    return {
+        "title": title,
+        "articleHtml": f"<p>{title}</p>",
+        "articleJson": "{}",
+        "articleText": title,
+        "hidden": False,
+    }
+
+
+class ArticleNavigationTest(APITestCase):
+    def setUp(self):
+        response = self.client.post(REGISTRATION_URL, valid_user_payload)
+        self.token = response.data["key"]
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        # Book:
+        #   book
+        #   ├── one
+        #   │   └── one-a
+        #   └── two
+        self.book = self.create_root("Book")
+        self.one = self.create_child(self.book, "One")
+        self.two = self.create_child(self.book, "Two")
+        # Added after "two" so it has to be spliced into the middle.
+        self.one_a = self.create_child(self.one, "One A")
+        # Second book shouldn't be reachable from the first one.
+        self.other_book = self.create_root("Other Book")
+        self.client.credentials()
+
+    def create_root(self, title):
+        return self.client.post(
+            ARTICLE_CREATE_ROOT_URL, generate_article_payload(title)
+        ).data["slug_full"]
+
+    def create_child(self, parent, title):
+        return self.client.post(
+            f"{API_BASE_URL}/articles/{parent}/add-child/",
+            generate_article_payload(title),
+        ).data["slug_full"]
+
+    def get_article(self, slug_full):
+        response = self.client.get(f"{ARTICLE_DETAIL_URL}/{slug_full}/")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_successful_reading_order_is_depth_first(self):
+        order = [self.book, self.one, self.one_a, self.two]
+        for i, slug_full in enumerate(order):
+            article = self.get_article(slug_full)
+            self.assertEqual(article["prev"], order[i - 1] if i > 0 else None)
+            self.assertEqual(
+                article["next"], order[i + 1] if i + 1 < len(order) else None
+            )
+
+    def test_successful_reading_order_does_not_cross_books(self):
+        self.assertIsNone(self.get_article(self.two)["next"])
+        self.assertIsNone(self.get_article(self.other_book)["prev"])
+        self.assertIsNone(self.get_article(self.other_book)["next"])
+
+    def test_successful_reading_order_after_delete(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        response = self.client.delete(f"{ARTICLE_DETAIL_URL}/{self.one}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get_article(self.book)["next"], self.two)
+        self.assertEqual(self.get_article(self.two)["prev"], self.book)
+
+    def test_successful_reading_order_after_move(self):
+        two = Article.objects.get(slug_full=self.two)
+        two.move(Article.objects.get(slug_full=self.one), "first-sibling")
+        self.assertEqual(self.get_article(self.book)["next"], self.two)
+        self.assertEqual(self.get_article(self.two)["next"], self.one)
+        self.assertIsNone(self.get_article(self.one_a)["next"])
+
+    def test_successful_retrieve_takes_constant_queries(self):
+        with CaptureQueriesContext(connection) as shallow:
+            self.get_article(self.one)
+        with CaptureQueriesContext(connection) as deep:
+            self.get_article(self.one_a)
+        self.assertEqual(len(shallow), len(deep))
+        self.assertLessEqual(len(deep), 2)
@@ -0,0 +1,68 @@
+from io import StringIO
+
+from django.core.management import call_command
+from rest_framework.test import APITestCase
+
+from core.models import Article
+from core.sanitization import ALLOWLIST_VERSION
+
+BASE_URL = "http://localhost:8000"
+
+AUTH_BASE_URL = f"{BASE_URL}/auth"
+REGISTRATION_URL = f"{AUTH_BASE_URL}/registration/"
+
+API_BASE_URL = f"{BASE_URL}/api"
+ARTICLE_CREATE_ROOT_URL = f"{API_BASE_URL}/articles/add-root/"
+ARTICLE_DETAIL_URL = f"{API_BASE_URL}/articles"
+
+valid_user_payload = {
+    "username": "testuser",
+    "email": "test@email.com",
+    "password1": "testpassword",
+    "password2": "testpassword",
+}
+
+valid_article_payload = {
+    "title": "Book",
+    "articleHtml": '<p onclick="evil()">Hello</p><script>alert(1)</script>',
+    "articleJson": "{}",
+    "articleText": "Hello",
+    "hidden": False,
+}
+
+
+class SanitizedHtmlTest(APITestCase):
+    def setUp(self):
+        response = self.client.post(REGISTRATION_URL, valid_user_payload)
+        self.token = response.data["key"]
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        self.slug_full = self.client.post(
+            ARTICLE_CREATE_ROOT_URL, valid_article_payload
+        ).data["slug_full"]
+
+    def test_successful_sanitized_html_is_stored_on_write(self):
+        article = Article.objects.get(slug_full=self.slug_full)
+        self.assertEqual(article.article_html_sanitized, "<p>Hello</p>alert(1)")
+        self.assertEqual(article.sanitizer_version, ALLOWLIST_VERSION)
+        response = self.client.get(f"{ARTICLE_DETAIL_URL}/{self.slug_full}/")
+        self.assertEqual(response.json()["articleHtml"], "<p>Hello</p>alert(1)")
+
+    def test_successful_stale_sanitized_html_is_recomputed_on_read(self):
+        Article.objects.filter(slug_full=self.slug_full).update(
+            article_html_sanitized="stale", sanitizer_version="old"
+        )
+        response = self.client.get(f"{ARTICLE_DETAIL_URL}/{self.slug_full}/")
+        self.assertEqual(response.json()["articleHtml"], "<p>Hello</p>alert(1)")
+        article = Article.objects.get(slug_full=self.slug_full)
+        self.assertEqual(article.sanitizer_version, ALLOWLIST_VERSION)
+
+    def test_successful_backfill_command(self):
+        Article.objects.filter(slug_full=self.slug_full).update(
+            article_html_sanitized="", article_html_hash="", sanitizer_version=""
+        )
+        out = StringIO()
+        call_command("sanitize_html", model="article", workers=1, stdout=out)
+        self.assertIn("article: sanitized 1 rows", out.getvalue())
+        article = Article.objects.get(slug_full=self.slug_full)
+        self.assertEqual(article.article_html_sanitized, "<p>Hello</p>alert(1)")
+        self.assertEqual(article.sanitizer_version, ALLOWLIST_VERSION)
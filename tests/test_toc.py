@@ -0,0 +1,167 @@
+import json
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+from rest_framework.test import APITestCase
+from rest_framework_recursive.fields import RecursiveField
+
+from core.cache import get_toc_cache_stats
+from core.models import Article
+
+BASE_URL = "http://localhost:8000"
+
+AUTH_BASE_URL = f"{BASE_URL}/auth"
+REGISTRATION_URL = f"{AUTH_BASE_URL}/registration/"
+
+API_BASE_URL = f"{BASE_URL}/api"
+ARTICLE_CREATE_ROOT_URL = f"{API_BASE_URL}/articles/add-root/"
+TOC_URL = f"{API_BASE_URL}/toc"
+
+valid_user_payload = {
+    "username": "testuser",
+    "email": "test@email.com",
+    "password1": "testpassword",
+    "password2": "testpassword",
+}
+
+
+def generate_article_payload(title, hidden=False):
+    return {
+        "title": title,
+        "articleHtml": f"<p>{title}</p>",
+        "articleJson": "{}",
+        "articleText": title,
+        "hidden": hidden,
+    }
+
+
+class RecursiveTableOfContentsSerializer(serializers.ModelSerializer):
+    """Previous implementation, which queries the children of every node."""
+
+    children = RecursiveField(many=True, read_only=True)
+
+    class Meta:
+        model = Article
+        fields = ["uuid", "slug_full", "title", "level", "children"]
+
+
+class TableOfContentsTest(APITestCase):
+    def setUp(self):
+        response = self.client.post(REGISTRATION_URL, valid_user_payload)
+        self.token = response.data["key"]
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        # Book:
+        #   book
+        #   ├── one
+        #   │   ├── one-a
+        #   │   └── one-b (hidden)
+        #   │       └── one-b-i
+        #   ├── two (hidden)
+        #   └── three
+        #       └── three-a
+        self.book = self.create_root("Book")
+        one = self.create_child(self.book, "One")
+        self.create_child(self.book, "Two", hidden=True)
+        three = self.create_child(self.book, "Three")
+        self.create_child(one, "One A")
+        one_b = self.create_child(one, "One B", hidden=True)
+        self.create_child(one_b, "One B I")
+        self.create_child(three, "Three A")
+        self.create_root("Other Book")
+        self.client.credentials()
+
+    def create_root(self, title):
+        return self.client.post(
+            ARTICLE_CREATE_ROOT_URL, generate_article_payload(title)
+        ).data["slug_full"]
+
+    def create_child(self, parent, title, hidden=False):
+        return self.client.post(
+            f"{API_BASE_URL}/articles/{parent}/add-child/",
+            generate_article_payload(title, hidden),
+        ).data["slug_full"]
+
+    def test_successful_toc_matches_recursive_serializer(self):
+        response = self.client.get(f"{TOC_URL}/{self.book}/")
+        self.assertEqual(response.status_code, 200)
+        expected = RecursiveTableOfContentsSerializer(
+            Article.objects.get(slug_full=self.book)
+        ).data
+        # Round-trip through JSON so that uuids and nested dicts compare equally.
+        self.assertEqual(
+            json.loads(json.dumps(response.data)), json.loads(json.dumps(expected))
+        )
+
+    def test_successful_toc_excluding_hidden_sections(self):
+        response = self.client.get(f"{TOC_URL}/{self.book}/?exclude_hidden=true")
+        self.assertEqual(response.status_code, 200)
+        toc = response.json()
+        self.assertEqual(
+            [child["slugFull"] for child in toc["children"]],
+            ["book/one", "book/three"],
+        )
+        self.assertEqual(
+            [child["slugFull"] for child in toc["children"][0]["children"]],
+            ["book/one/one-a"],
+        )
+
+    def test_successful_toc_takes_constant_queries(self):
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(f"{TOC_URL}/other-book/")
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(f"{TOC_URL}/{self.book}/")
+        self.assertEqual(len(small), len(large))
+
+
+class TableOfContentsCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        response = self.client.post(REGISTRATION_URL, valid_user_payload)
+        self.token = response.data["key"]
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        self.book = self.create_root("Book")
+        self.create_child(self.book, "One")
+        self.other_book = self.create_root("Other Book")
+        self.client.credentials()
+
+    def create_root(self, title):
+        return self.client.post(
+            ARTICLE_CREATE_ROOT_URL, generate_article_payload(title)
+        ).data["slug_full"]
+
+    def create_child(self, parent, title):
+        return self.client.post(
+            f"{API_BASE_URL}/articles/{parent}/add-child/",
+            generate_article_payload(title),
+        ).data["slug_full"]
+
+    def test_successful_toc_is_served_from_cache(self):
+        first = self.client.get(f"{TOC_URL}/{self.book}/")
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(f"{TOC_URL}/{self.book}/")
+        self.assertEqual(first.json(), second.json())
+        # Only the lookup of the article itself.
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(get_toc_cache_stats(), {"hits": 1, "misses": 1})
+
+    def test_successful_toc_is_invalidated_by_new_section(self):
+        self.client.get(f"{TOC_URL}/{self.book}/")
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        self.create_child(self.book, "Two")
+        response = self.client.get(f"{TOC_URL}/{self.book}/")
+        self.assertEqual(len(response.json()["children"]), 2)
+
+    def test_successful_toc_is_invalidated_by_delete(self):
+        self.client.get(f"{TOC_URL}/{self.book}/")
+        Article.objects.get(slug_full=f"{self.book}/one").delete()
+        response = self.client.get(f"{TOC_URL}/{self.book}/")
+        self.assertEqual(response.json()["children"], [])
+
+    def test_successful_toc_of_other_book_stays_cached(self):
+        self.client.get(f"{TOC_URL}/{self.other_book}/")
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        self.create_child(self.book, "Two")
+        self.client.get(f"{TOC_URL}/{self.other_book}/")
+        self.assertEqual(get_toc_cache_stats(), {"hits": 1, "misses": 1})